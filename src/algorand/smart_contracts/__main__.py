@@ -1,34 +1,216 @@
+"""Builds and describes the contracts registered in config.py.
+
+    python -m smart_contracts [build] [NAME ...] [--compile] [--force] [--jobs N]
+    python -m smart_contracts list
+    python -m smart_contracts inspect NAME [--profile] [--against PROFILE]
+
+Only `build` imports PyTeal and Beaker (and loads `.env`); `list` and
+`inspect` read the registry and the built artifacts, so they start in a
+fraction of the time.
+"""
+
+import argparse
+import json
 import logging
 import sys
+import time
 from pathlib import Path
 
-from dotenv import load_dotenv
-
 from smart_contracts import config
-from smart_contracts.helpers.build import build
-
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s %(levelname)-10s: %(message)s"
-)
 logger = logging.getLogger(__name__)
-logger.info("Loading .env")
-load_dotenv()
 root_path = Path(__file__).parent
+artifact_path = root_path / "artifacts"
+# see helpers/build.py, which can't be imported without importing Beaker
+PROFILE_FILE = "approval.profile.json"
 
 
-def main(action: str) -> None:
-    artifact_path = root_path / "artifacts"
-    match action:
-        case "build":
-            for app in config.contracts:
-                logger.info(f"Building app {app.name}")
-                build(artifact_path / app.name, app)
+def build_app(
+    name: str, *, compile_with_algod: bool = False, force: bool = False
+) -> float:
+    """Builds the app in config.contracts with the given name, returning how long
+    it took. Apps are looked up by name so this can run in a worker process"""
+    from smart_contracts.helpers.build import build
 
+    start = time.perf_counter()
+    app = config.load_contract(name)
+    logger.info(f"Building app {app.name}")
+    build(
+        artifact_path / app.name,
+        app,
+        compile_with_algod=compile_with_algod,
+        force=force,
+    )
+    return time.perf_counter() - start
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        main(sys.argv[1])
+
+def build_apps(
+    names: list[str],
+    *,
+    compile_with_algod: bool = False,
+    force: bool = False,
+    jobs: int = 1,
+) -> None:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from dotenv import load_dotenv
+
+    logger.info("Loading .env")
+    load_dotenv()
+    start = time.perf_counter()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    build_app,
+                    name,
+                    compile_with_algod=compile_with_algod,
+                    force=force,
+                )
+                for name in names
+            ]
+            timings = [future.result() for future in futures]
     else:
+        timings = [
+            build_app(name, compile_with_algod=compile_with_algod, force=force)
+            for name in names
+        ]
+    total = time.perf_counter() - start
+    logger.info("Build timings:")
+    for name, elapsed in zip(names, timings, strict=True):
+        logger.info(f"  {name:<36} {elapsed:8.2f}s")
+    logger.info(f"  {'total (wall clock)':<36} {total:8.2f}s")
+
 
-        main("build")
+def list_apps() -> None:
+    for name, source in config.contracts.items():
+        built = (artifact_path / name / "application.json").exists()
+        print(f"{name:<36} {'built' if built else 'not built':<10} {source}")
+
+
+def inspect_app(
+    name: str, *, profile: bool = False, against: Path | None = None
+) -> int:
+    """Describes a built app from its ARC-32 application.json, or with `profile`
+    where its approval program's bytes and opcode budget go, optionally as the
+    changes from another build's profile"""
+    from smart_contracts.helpers.teal_profile import diff_profiles, format_profile
+
+    app_spec_path = artifact_path / name / "application.json"
+    if not app_spec_path.exists():
+        logger.error(f"{name} hasn't been built, run `python -m smart_contracts build`")
+        return 1
+    if profile or against:
+        current = json.loads((artifact_path / name / PROFILE_FILE).read_text())
+        if against:
+            changes = diff_profiles(json.loads(against.read_text()), current)
+            print("\n".join(changes) or "No changes")
+        else:
+            print(format_profile(current))
+        return 0
+    app_spec = json.loads(app_spec_path.read_text())
+    contract = app_spec["contract"]
+    print(f"{name}: {contract.get('desc') or ''}".rstrip())
+    print(f"  source: {config.contracts[name]}")
+    for scope, schema in app_spec["state"].items():
+        print(
+            f"  {scope} state: {schema['num_uints']} uints, "
+            f"{schema['num_byte_slices']} byte slices"
+        )
+    for program in ("approval", "clear"):
+        teal = (artifact_path / name / f"{program}.teal").read_text().splitlines()
+        ops = [
+            line
+            for line in teal
+            if line.strip()
+            and not line.lstrip().startswith("//")
+            and not line.rstrip().endswith(":")
+        ]
+        print(f"  {program} program: {len(ops)} ops")
+    print("  methods:")
+    for method in contract["methods"]:
+        args = ",".join(arg["type"] for arg in method["args"])
+        signature = f"{method['name']}({args}){method['returns']['type']}"
+        hints = app_spec["hints"].get(signature, {})
+        call_config = ",".join(hints.get("call_config", {}))
+        read_only = " read-only" if hints.get("read_only") else ""
+        print(f"    {signature:<72} {call_config}{read_only}")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="smart_contracts")
+    subparsers = parser.add_subparsers(dest="command")
+    build_parser = subparsers.add_parser("build", help="build apps to artifacts/")
+    build_parser.add_argument(
+        "names",
+        nargs="*",
+        metavar="NAME",
+        help="apps to build, all of them by default",
+    )
+    build_parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="also compile the TEAL with algod to verify it and emit source maps",
+    )
+    build_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild apps even if their source hasn't changed since the last build",
+    )
+    build_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="number of apps to build in parallel worker processes",
+    )
+    subparsers.add_parser("list", help="list the apps and whether they're built")
+    inspect_parser = subparsers.add_parser(
+        "inspect", help="describe a built app's state and methods"
+    )
+    inspect_parser.add_argument("name", choices=config.contracts, metavar="NAME")
+    inspect_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="show where the approval program's bytes and opcode budget go",
+    )
+    inspect_parser.add_argument(
+        "--against",
+        type=Path,
+        metavar="PROFILE",
+        help="show how the profile changed from another build's "
+        f"{PROFILE_FILE}, e.g. from `git show HEAD~1:path/to/{PROFILE_FILE}`",
+    )
+
+    argv = sys.argv[1:] if argv is None else argv
+    # build is the default, e.g. `python -m smart_contracts --force`
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["build", *argv]
+    args = parser.parse_args(argv)
+
+    match args.command:
+        case "build":
+            logging.basicConfig(
+                level=logging.DEBUG,
+                format="%(asctime)s %(levelname)-10s: %(message)s",
+            )
+            unknown = [name for name in args.names if name not in config.contracts]
+            if unknown:
+                parser.error(f"unknown apps: {', '.join(unknown)}")
+            build_apps(
+                args.names or list(config.contracts),
+                compile_with_algod=args.compile,
+                force=args.force,
+                jobs=args.jobs,
+            )
+        case "list":
+            list_apps()
+        case "inspect":
+            logging.basicConfig(level=logging.INFO, format="%(message)s")
+            return inspect_app(args.name, profile=args.profile, against=args.against)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
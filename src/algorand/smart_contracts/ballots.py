@@ -0,0 +1,119 @@
+"""Validates ballots off-chain with the same rules `vote` enforces, so a relay
+can reject a bad ballot before paying to submit it.
+
+Ballots are checked in batches as NumPy arrays, one row per ballot. The result
+is a rejection code per ballot, 0 if `vote` would accept it, otherwise the
+first of its checks that would fail, in the order `vote` makes them (which for
+VotingRoundAppPackedBallots checks the payment last, once the ballot's packed
+and its size is known). Checks that depend on the state of the round (whether
+voting is open, whether the voter is in the snapshot or has already voted)
+aren't covered; see get_preconditions for those.
+"""
+
+from collections.abc import Sequence
+from enum import IntEnum
+
+import numpy as np
+import numpy.typing as npt
+
+from smart_contracts.constants import TYPE_PARTITIONED_WEIGHTING
+from smart_contracts.vote_batch import vote_min_balance
+
+#: A row per ballot, either as a 2D array or rows that can differ in length
+BallotArray = np.ndarray | Sequence[Sequence[int]]
+
+
+class Rejection(IntEnum):
+    """Why `vote` would reject a ballot, in the order it checks"""
+
+    NONE = 0
+    #: "Number of answers incorrect"
+    ANSWER_COUNT = 1
+    #: "Number of answer weights incorrect, ..." for partitioned weighting,
+    #: otherwise "Number of answer weights should be 0, ..."
+    ANSWER_WEIGHT_COUNT = 2
+    #: "Payment must be the exact min balance requirement"
+    PAYMENT_AMOUNT = 3
+    #: "Answer option index invalid"
+    ANSWER_INDEX = 4
+    #: "Didn't partition exact voting weight across questions", or the weights
+    #: overflowing a uint64 when they're summed
+    PARTITION_SUM = 5
+
+
+def _as_matrix(
+    rows: BallotArray, dtype: type[np.integer], ballot_count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """A 2D array of the rows, padded with 0s if they differ in length, along
+    with the length of each row"""
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        matrix = rows.astype(dtype, copy=False)
+        lengths = np.full(len(rows), rows.shape[1])
+    else:
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64)
+        width = int(lengths.max()) if len(lengths) else 0
+        matrix = np.zeros((len(lengths), width), dtype=dtype)
+        for index, row in enumerate(rows):
+            matrix[index, : len(row)] = row
+    if len(matrix) != ballot_count:
+        raise ValueError(f"Expected {ballot_count} rows but got {len(matrix)}")
+    return matrix, lengths
+
+
+def validate_ballots(
+    option_counts: Sequence[int],
+    vote_type: int,
+    answer_ids: BallotArray,
+    answer_weights: BallotArray | None = None,
+    weightings: npt.ArrayLike | None = None,
+    payments: npt.ArrayLike | None = None,
+    *,
+    packed_ballots: bool = False,
+) -> np.ndarray:
+    """Returns the Rejection code of each ballot as a uint8 array.
+
+    `answer_ids` and `answer_weights` have a row per ballot, either as 2D
+    arrays or as sequences of rows that can differ in length. `weightings` is
+    each voter's snapshot weight, only needed for partitioned weighting, and
+    `payments` the amount of each ballot's payment transaction, which isn't
+    checked if omitted. `packed_ballots` is for VotingRoundAppPackedBallots."""
+    option_counts_array = np.asarray(option_counts, dtype=np.int64)
+    questions_count = len(option_counts_array)
+    ballot_count = len(answer_ids)
+    ids, id_counts = _as_matrix(answer_ids, np.int64, ballot_count)
+    partitioned = vote_type == TYPE_PARTITIONED_WEIGHTING
+    if answer_weights is None:
+        answer_weights = np.zeros((ballot_count, 0), dtype=np.uint64)
+    weights, weight_counts = _as_matrix(answer_weights, np.uint64, ballot_count)
+
+    # Checks from last to first, so each ballot ends up with its first failure
+    rejections = np.zeros(ballot_count, dtype=np.uint8)
+    unpaid = np.zeros(ballot_count, dtype=bool)
+    if payments is not None:
+        min_balance = vote_min_balance(
+            questions_count, option_counts if packed_ballots else None
+        )
+        unpaid = np.asarray(payments) != min_balance
+    if packed_ballots:
+        rejections[unpaid] = Rejection.PAYMENT_AMOUNT
+    # Ballots of the wrong shape are rejected before their answers are looked
+    # at, so only the first questions_count columns of the rest matter
+    if partitioned and weights.shape[1] >= questions_count > 0:
+        if weightings is None:
+            raise ValueError("Partitioned weighting ballots need weightings")
+        # the contract sums in uint64, failing if it overflows, which leaves a
+        # running total smaller than the one before it
+        totals = np.cumsum(weights[:, :questions_count], axis=1, dtype=np.uint64)
+        overflowed = (totals[:, 1:] < totals[:, :-1]).any(axis=1)
+        expected = np.asarray(weightings, dtype=np.uint64)
+        rejections[overflowed | (totals[:, -1] != expected)] = Rejection.PARTITION_SUM
+    if ids.shape[1] >= questions_count > 0:
+        answers = ids[:, :questions_count]
+        invalid = ((answers < 0) | (answers >= option_counts_array)).any(axis=1)
+        rejections[invalid] = Rejection.ANSWER_INDEX
+    if not packed_ballots:
+        rejections[unpaid] = Rejection.PAYMENT_AMOUNT
+    expected_weight_count = questions_count if partitioned else 0
+    rejections[weight_counts != expected_weight_count] = Rejection.ANSWER_WEIGHT_COUNT
+    rejections[id_counts != questions_count] = Rejection.ANSWER_COUNT
+    return rejections
@@ -0,0 +1,565 @@
+"""Opcode budget and fee benchmarks for the ABI methods of the voting round apps.
+
+Runs create, bootstrap, get_preconditions, vote and close for a grid of ballot
+shapes and vote types, close for a growing number of options, and the sharded
+tallies app for rounds too big for the others, against the built artifacts using
+the in-process AVM in helpers/avm.py, then compares the results with
+benchmark_baseline.json:
+
+    python -m smart_contracts.benchmark [--threshold 0.05] [--update-baseline]
+"""
+
+import argparse
+import base64
+import json
+import logging
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import nacl.signing
+from algokit_utils import replace_template_variables
+from algosdk import abi, encoding
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    EmptySigner,
+)
+
+from smart_contracts.budget import max_questions, vote_budget
+from smart_contracts.helpers.assembler import assemble
+from smart_contracts.helpers.avm import Ledger, Transaction
+from smart_contracts.helpers.avm_client import (
+    AppClient,
+    suggested_params,
+    to_avm_transaction,
+)
+from smart_contracts.vote_batch import (
+    Ballot,
+    VoteBatch,
+    add_vote_batch,
+    bootstrap_min_balance,
+    max_votes_per_group,
+    packed_ballot_size,
+    vote_min_balance,
+)
+
+logger = logging.getLogger(__name__)
+
+root_path = Path(__file__).parent
+artifact_path = root_path / "artifacts"
+baseline_path = root_path / "benchmark_baseline.json"
+
+#: Ballot shapes as option counts per question, up to the 112 question / 128
+#: option maximum the dapps allow
+SHAPES = {
+    "5q-9o": [3, 1, 1, 1, 3],
+    "20q-80o": [4] * 20,
+    "64q-128o": [2] * 64,
+    "112q-127o": [16] + [1] * 111,
+}
+#: Ballot shapes with more and more options, in questions of 4, to show how
+#: the cost of close (which renders a tally per option) scales
+CLOSE_SCALING_SHAPES = {
+    f"{options}o": [4] * (options // 4) for options in (8, 16, 32, 64, 128)
+}
+#: Weighted so that the tallies close renders are several digits long
+CLOSE_SCALING_VOTE_TYPE = 2
+#: The app with sharded tallies is also benchmarked beyond the other apps'
+#: limits: 4 questions with more and more options, which a vote's cost shouldn't
+#: grow with, and the most options and questions it allows
+SHARDED_APP = "VotingRoundAppSharded"
+SHARDED_SHAPES = {
+    "4q-8o": [2] * 4,
+    "4q-128o": [32] * 4,
+    "4q-320o": [80] * 4,
+    "4q-640o": [160] * 4,
+    "114q-640o": [6] * 70 + [5] * 44,
+}
+SHARDED_VOTE_TYPE = 2
+VOTE_TYPES = {
+    0: "no-snapshot",
+    1: "no-weighting",
+    2: "weighting",
+    3: "partitioned",
+}
+#: vote_batch is a vote in a group of as many votes as fit, sharing its opcode
+#: budget (see vote_batch.py), with its measurements per vote
+METHODS = ["create", "bootstrap", "get_preconditions", "vote", "vote_batch", "close"]
+
+
+@dataclass(frozen=True)
+class AppFeatures:
+    """How an app is built, matching what voting.py passes voting_app for it"""
+
+    #: The vote types the app supports
+    vote_types: tuple[int, ...] = (0, 1, 2, 3)
+    tally_bytes: int = 8
+    fixed_vote_type: bool = False
+    packed_ballots: bool = False
+    sharded_tallies: bool = False
+
+
+#: The apps to benchmark and how each of them is built
+APPS = {
+    "VotingRoundApp": AppFeatures(),
+    "VotingRoundAppCompact": AppFeatures((0, 1), tally_bytes=4),
+    "VotingRoundAppNoSnapshot": AppFeatures((0,), fixed_vote_type=True),
+    "VotingRoundAppNoWeighting": AppFeatures((1,), fixed_vote_type=True),
+    "VotingRoundAppWeighting": AppFeatures((2,), fixed_vote_type=True),
+    "VotingRoundAppPartitionedWeighting": AppFeatures((3,), fixed_vote_type=True),
+    "VotingRoundAppPackedBallots": AppFeatures(packed_ballots=True),
+    "VotingRoundAppSharded": AppFeatures(sharded_tallies=True),
+}
+#: The app the other apps are compared against in the variant report
+GENERIC_APP = "VotingRoundApp"
+#: The app compared with the generic app in the ballot storage report
+PACKED_APP = "VotingRoundAppPackedBallots"
+
+VOTER_WEIGHT = 200
+
+
+@dataclass
+class Measurement:
+    #: Opcode budget used by the app call, including inner app calls
+    opcode_cost: int
+    #: Number of inner transactions, i.e. OpUp calls and created apps/assets
+    inner_transactions: int
+    #: Minimum fee for the whole group, including any payment transaction
+    fee: int
+
+
+def load_app_spec(app_name: str) -> dict:
+    return dict(json.loads((artifact_path / app_name / "application.json").read_text()))
+
+
+def measure_round(
+    app_spec: dict,
+    opup_spec: dict,
+    option_counts: list[int],
+    vote_type: int,
+    features: AppFeatures,
+) -> dict[str, Measurement]:
+    """Runs a round through its lifecycle with a single voter, then a batch of
+    voters voting in one group"""
+    ledger = Ledger()
+    # the OpUp app is created by an inner transaction in bootstrap
+    AppClient(ledger, opup_spec).register_programs()
+
+    creator = b"C" * 32
+    voter = b"V" * 32
+    ledger.fund(creator, 10**12)
+    ledger.fund(voter, 10**9)
+    signing_key = nacl.signing.SigningKey(b"k" * 32)
+    results: dict[str, Measurement] = {}
+
+    def record(name: str, result: tuple) -> None:
+        _, call_result, group_result = result
+        # only the first round's create and bootstrap are recorded
+        results.setdefault(
+            name,
+            Measurement(
+                opcode_cost=call_result.opcode_cost,
+                inner_transactions=call_result.inner_transaction_count,
+                fee=group_result.total_fee,
+            ),
+        )
+
+    def deploy() -> tuple[AppClient, int]:
+        """Creates and bootstraps a round"""
+        client = AppClient(ledger, app_spec, {"DELETABLE": 1})
+        record(
+            "create",
+            client.call(
+                creator,
+                "create",
+                "benchmark",
+                vote_type,
+                bytes(signing_key.verify_key) if vote_type else b"",
+                "cid",
+                ledger.timestamp,
+                ledger.timestamp + 1000,
+                option_counts,
+                10,
+                "ipfs://image",
+                create=True,
+            ),
+        )
+        min_balance = bootstrap_min_balance(
+            option_counts,
+            features.tally_bytes,
+            sharded_tallies=features.sharded_tallies,
+        )
+        record(
+            "bootstrap",
+            client.call(
+                creator,
+                "bootstrap",
+                Transaction.payment(creator, client.address, min_balance),
+                *([option_counts] if features.sharded_tallies else []),
+            ),
+        )
+        opup_app_id = ledger.apps[client.app_id].global_state[b"ouaid"]
+        assert isinstance(opup_app_id, int)
+        return client, opup_app_id
+
+    client, opup_app_id = deploy()
+
+    def sign(voter: bytes) -> bytes:
+        if vote_type == 1:
+            return signing_key.sign(voter).signature
+        if vote_type:
+            return signing_key.sign(voter + VOTER_WEIGHT.to_bytes(8, "big")).signature
+        return b""
+
+    signature = sign(voter)
+    record(
+        "get_preconditions",
+        client.call(voter, "get_preconditions", signature, VOTER_WEIGHT, opup_app_id),
+    )
+
+    # vote for the last option of each question, splitting the weight evenly
+    # for partitioned votes with the remainder on the last question
+    answer_ids = [count - 1 for count in option_counts]
+    answer_weights = []
+    if vote_type == 3:
+        share = VOTER_WEIGHT // len(option_counts)
+        answer_weights = [share] * len(option_counts)
+        answer_weights[-1] += VOTER_WEIGHT - share * len(option_counts)
+    packed_option_counts = option_counts if features.packed_ballots else None
+    record(
+        "vote",
+        client.call(
+            voter,
+            "vote",
+            Transaction.payment(
+                voter,
+                client.address,
+                vote_min_balance(len(answer_ids), packed_option_counts),
+            ),
+            signature,
+            VOTER_WEIGHT,
+            answer_ids,
+            answer_weights,
+            opup_app_id,
+        ),
+    )
+
+    if features.sharded_tallies:
+        # for the result boxes, which are kept
+        ledger.fund(client.address, 10**7)
+    record("close", client.call(creator, "close", opup_app_id))
+
+    # then as many voters as fit in a group vote in a second round, so the
+    # measurements for close are for a single voter
+    batch_size = max_votes_per_group(
+        vote_budget(
+            vote_type,
+            len(option_counts),
+            fixed_vote_type=features.fixed_vote_type,
+            tally_bytes=features.tally_bytes,
+            packed_option_counts=packed_option_counts,
+            sharded_tallies=features.sharded_tallies,
+        )
+    )
+    if batch_size:
+        client, opup_app_id = deploy()
+        voters = [bytes([index]) * 32 for index in range(1, batch_size + 1)]
+        for batch_voter in voters:
+            ledger.fund(batch_voter, 10**9)
+        batch = VoteBatch(
+            client.app_id,
+            opup_app_id,
+            abi.Contract.undictify(app_spec["contract"]),
+            vote_type,
+            encoding.encode_address(creator),
+            EmptySigner(),
+            suggested_params(ledger),
+            fixed_vote_type=features.fixed_vote_type,
+            tally_bytes=features.tally_bytes,
+            packed_option_counts=packed_option_counts,
+            sharded_option_counts=option_counts if features.sharded_tallies else None,
+        )
+        atc = AtomicTransactionComposer()
+        add_vote_batch(
+            atc,
+            batch,
+            [
+                Ballot(
+                    encoding.encode_address(batch_voter),
+                    EmptySigner(),
+                    answer_ids,
+                    sign(batch_voter),
+                    VOTER_WEIGHT,
+                    answer_weights,
+                )
+                for batch_voter in voters
+            ],
+        )
+        group_result = ledger.execute(
+            [to_avm_transaction(txn.txn) for txn in atc.build_group()]
+        )
+        results["vote_batch"] = Measurement(
+            opcode_cost=group_result.opcode_cost // batch_size,
+            inner_transactions=sum(
+                txn.inner_transaction_count for txn in group_result.transactions
+            )
+            // batch_size,
+            fee=group_result.total_fee // batch_size,
+        )
+    return results
+
+
+def approval_size(app_spec: dict) -> int:
+    """Size in bytes of the assembled approval program"""
+    approval = base64.b64decode(app_spec["source"]["approval"]).decode()
+    approval = replace_template_variables(approval, {"UPDATABLE": 0, "DELETABLE": 0})
+    return len(assemble(approval).bytecode)
+
+
+def run_benchmarks() -> dict[str, Measurement]:
+    opup_spec = load_app_spec("OpUpApp")
+    results = {}
+    for app_name, features in APPS.items():
+        app_spec = load_app_spec(app_name)
+        for shape, option_counts in SHAPES.items():
+            for vote_type in features.vote_types:
+                type_name = VOTE_TYPES[vote_type]
+                limit = max_questions(
+                    vote_type,
+                    packed_ballots=features.packed_ballots,
+                    sharded_tallies=features.sharded_tallies,
+                )
+                if len(option_counts) > limit:
+                    logger.info(f"Skipping {app_name} {shape} {type_name}")
+                    continue
+                logger.info(f"Benchmarking {app_name} {shape} {type_name}")
+                round_results = measure_round(
+                    app_spec,
+                    opup_spec,
+                    option_counts,
+                    vote_type,
+                    features,
+                )
+                for method in METHODS:
+                    if method in round_results:
+                        key = f"{app_name}/{method}/{shape}/{type_name}"
+                        results[key] = round_results[method]
+    app_spec = load_app_spec(GENERIC_APP)
+    type_name = VOTE_TYPES[CLOSE_SCALING_VOTE_TYPE]
+    for shape, option_counts in CLOSE_SCALING_SHAPES.items():
+        logger.info(f"Benchmarking {GENERIC_APP} close {shape} {type_name}")
+        round_results = measure_round(
+            app_spec,
+            opup_spec,
+            option_counts,
+            CLOSE_SCALING_VOTE_TYPE,
+            APPS[GENERIC_APP],
+        )
+        results[f"{GENERIC_APP}/close/{shape}/{type_name}"] = round_results["close"]
+    app_spec = load_app_spec(SHARDED_APP)
+    type_name = VOTE_TYPES[SHARDED_VOTE_TYPE]
+    for shape, option_counts in SHARDED_SHAPES.items():
+        logger.info(f"Benchmarking {SHARDED_APP} {shape} {type_name}")
+        round_results = measure_round(
+            app_spec,
+            opup_spec,
+            option_counts,
+            SHARDED_VOTE_TYPE,
+            APPS[SHARDED_APP],
+        )
+        for method, measurement in round_results.items():
+            results[f"{SHARDED_APP}/{method}/{shape}/{type_name}"] = measurement
+    return results
+
+
+def print_variant_comparison(results: dict[str, Measurement]) -> None:
+    """Compares the cost of a vote and the approval program size of each app
+    with the generic app for the vote types they share"""
+    program_sizes = {
+        app_name: approval_size(load_app_spec(app_name)) for app_name in APPS
+    }
+    print(f"\n{'vote vs ' + GENERIC_APP:<66} {'opcodes':>9} {'Δopcodes':>9}")
+    for key, measurement in results.items():
+        app_name, method, shape, type_name = key.split("/")
+        if app_name == GENERIC_APP or method != "vote":
+            continue
+        generic = results.get(f"{GENERIC_APP}/{method}/{shape}/{type_name}")
+        if generic is None:
+            # a shape only the sharded tallies app can run
+            continue
+        delta = measurement.opcode_cost - generic.opcode_cost
+        print(f"{key:<66} {measurement.opcode_cost:>9} {delta:>+9d}")
+    print(f"\n{'approval program':<66} {'bytes':>9} {'Δbytes':>9}")
+    for app_name, size in program_sizes.items():
+        delta = size - program_sizes[GENERIC_APP]
+        print(f"{app_name:<66} {size:>9} {delta:>+9d}")
+
+
+def print_batch_comparison(results: dict[str, Measurement]) -> None:
+    """Compares the inner transactions and fee per vote of a vote in a batch
+    with a vote on its own"""
+    print(
+        f"\n{'vote_batch vs vote, per vote':<66} {'inner':>6} {'Δinner':>7} "
+        f"{'fee':>7} {'Δfee':>7}"
+    )
+    for key, measurement in results.items():
+        app_name, method, shape, type_name = key.split("/")
+        if method != "vote_batch":
+            continue
+        single = results[f"{app_name}/vote/{shape}/{type_name}"]
+        print(
+            f"{key:<66} {measurement.inner_transactions:>6} "
+            f"{measurement.inner_transactions - single.inner_transactions:>+7d} "
+            f"{measurement.fee:>7} {measurement.fee - single.fee:>+7d}"
+        )
+
+
+def print_ballot_storage_comparison(results: dict[str, Measurement]) -> None:
+    """Compares what a voter pays for their box (its min balance requirement)
+    and their vote's fee with packed ballots and without"""
+    print(
+        f"\n{'ballot storage, per voter':<26} {'box':>5} {'packed':>7} "
+        f"{'min bal':>8} {'packed':>7} {'fee':>7} {'packed':>7} {'Δtotal':>7}"
+    )
+    for shape, option_counts in SHAPES.items():
+        questions = len(option_counts)
+        box_size = 32 + 2 + questions
+        packed_box_size = 32 + packed_ballot_size(option_counts)
+        min_balance = vote_min_balance(questions)
+        packed_min_balance = vote_min_balance(questions, option_counts)
+        for type_name in VOTE_TYPES.values():
+            vote = results.get(f"{GENERIC_APP}/vote/{shape}/{type_name}")
+            packed_vote = results.get(f"{PACKED_APP}/vote/{shape}/{type_name}")
+            if vote is None or packed_vote is None:
+                continue
+            delta = packed_min_balance + packed_vote.fee - min_balance - vote.fee
+            print(
+                f"{shape + ' ' + type_name:<26} {box_size:>5} {packed_box_size:>7} "
+                f"{min_balance:>8} {packed_min_balance:>7} {vote.fee:>7} "
+                f"{packed_vote.fee:>7} {delta:>+7d}"
+            )
+
+
+def print_close_scaling(results: dict[str, Measurement]) -> None:
+    """Shows how the cost of close grows with the number of options, and the
+    opcodes each option added since the previous shape"""
+    type_name = VOTE_TYPES[CLOSE_SCALING_VOTE_TYPE]
+    print(
+        f"\n{'close by options, ' + type_name:<26} {'opcodes':>9} {'inner':>6} "
+        f"{'fee':>7} {'per option':>11}"
+    )
+    previous: tuple[int, int] | None = None
+    for shape, option_counts in CLOSE_SCALING_SHAPES.items():
+        measurement = results[f"{GENERIC_APP}/close/{shape}/{type_name}"]
+        options = sum(option_counts)
+        per_option = "-"
+        if previous:
+            previous_options, previous_cost = previous
+            growth = measurement.opcode_cost - previous_cost
+            per_option = f"{growth / (options - previous_options):.1f}"
+        print(
+            f"{shape:<26} {measurement.opcode_cost:>9} "
+            f"{measurement.inner_transactions:>6} {measurement.fee:>7} {per_option:>11}"
+        )
+        previous = options, measurement.opcode_cost
+
+
+def print_sharded_scaling(results: dict[str, Measurement]) -> None:
+    """Shows the cost of bootstrapping, voting in and closing a round with
+    sharded tallies as the number of options and questions grows"""
+    type_name = VOTE_TYPES[SHARDED_VOTE_TYPE]
+    print(
+        f"\n{SHARDED_APP + ', ' + type_name:<36} {'bootstrap fee':>14} "
+        f"{'vote opcodes':>13} {'vote fee':>9} {'close opcodes':>14} {'close fee':>10}"
+    )
+    for shape in SHARDED_SHAPES:
+        bootstrap, vote, close = (
+            results[f"{SHARDED_APP}/{method}/{shape}/{type_name}"]
+            for method in ("bootstrap", "vote", "close")
+        )
+        print(
+            f"{shape:<36} {bootstrap.fee:>14} {vote.opcode_cost:>13} "
+            f"{vote.fee:>9} {close.opcode_cost:>14} {close.fee:>10}"
+        )
+
+
+def find_regressions(
+    results: dict[str, Measurement],
+    baseline: dict[str, dict[str, int]],
+    threshold: float,
+) -> list[str]:
+    """The measurements more than `threshold` over the baseline, along with any
+    baseline entries the results no longer have, e.g. for a shape now skipped"""
+    regressions = [
+        f"{key}: missing from the results"
+        for key in sorted(baseline.keys() - results.keys())
+    ]
+    for key, measurement in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for metric, value in asdict(measurement).items():
+            limit = expected[metric] * (1 + threshold)
+            if value > limit:
+                regressions.append(
+                    f"{key} {metric}: {value} > {expected[metric]} (+{threshold:.0%})"
+                )
+    return regressions
+
+
+def print_report(
+    results: dict[str, Measurement], baseline: dict[str, dict[str, int]]
+) -> None:
+    print(f"{'benchmark':<66} {'opcodes':>9} {'inner':>6} {'fee':>7} {'Δopcodes':>9}")
+    for key, measurement in results.items():
+        expected = baseline.get(key)
+        delta = (
+            f"{measurement.opcode_cost - expected['opcode_cost']:+d}"
+            if expected
+            else "new"
+        )
+        print(
+            f"{key:<66} {measurement.opcode_cost:>9} "
+            f"{measurement.inner_transactions:>6} {measurement.fee:>7} {delta:>9}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="smart_contracts.benchmark")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="fractional increase over the baseline that counts as a regression",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help=f"write the results to {baseline_path.name} instead of comparing",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks()
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    print_report(results, baseline)
+    print_variant_comparison(results)
+    print_batch_comparison(results)
+    print_ballot_storage_comparison(results)
+    print_close_scaling(results)
+    print_sharded_scaling(results)
+    if args.update_baseline:
+        baseline_path.write_text(
+            json.dumps({k: asdict(v) for k, v in results.items()}, indent=4) + "\n"
+        )
+        return 0
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)-10s: %(message)s"
+    )
+    sys.exit(main())
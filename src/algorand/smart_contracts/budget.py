@@ -0,0 +1,152 @@
+"""The opcode budget model of the voting apps.
+
+voting.py and op_up.py build the apps' OpUp calls from it, and vote_batch.py
+and the benchmark work out off-chain what a vote needs with it. Like
+constants.py, it doesn't import PyTeal or Beaker.
+"""
+
+from collections.abc import Sequence
+
+from smart_contracts.constants import (
+    MAX_OPTIONS,
+    MAX_QUESTIONS,
+    MAX_SHARDED_OPTIONS,
+    TYPE_NO_SNAPSHOT,
+    TYPE_PARTITIONED_WEIGHTING,
+)
+
+#: The opcode budget each top level app call adds to the group's pool
+APP_CALL_BUDGET = 700
+#: The opcode budget each opup call adds, i.e. the 700 of an inner app call less
+#: what the opup app and adding the call to the inner group use
+OPUP_CALL_BUDGET = 650
+#: Added to every budget OpUp makes sure of, since ensure_budget() can return
+#: with slightly less than the required budget when the current budget is equal
+#: to or only slightly higher than it
+OPUP_BUFFER = 10
+#: The OpUp calls the dapps' vote fee pays for
+MAX_VOTE_OPUP_CALLS = 16
+
+#: Opcode budget to mint the result NFT once the tallies are rendered
+CLOSE_BUDGET = 1500
+#: Opcode budget to render a single tally, enough for the 20 digits of a uint64
+RENDER_TALLY_BUDGET = 400
+#: Opcode budget to skip over a question when resuming rendering part way through
+SCAN_QUESTION_BUDGET = 15
+#: Opcode budget to verify a snapshot signature, i.e. ed25519verify_bare and the
+#: checks around it
+SIGNATURE_BUDGET = 1930
+#: Opcode budget for a vote, other than verifying the signature and recording the
+#: answers
+VOTE_BUDGET = 180
+#: Opcode budget to record the answer to a question, with extra for partitioned
+#: weights, for narrower tallies and for checking the vote type at runtime (which
+#: costs more when the weights are partitioned)
+VOTE_QUESTION_BUDGET = 48
+PARTITIONED_QUESTION_BUDGET = 12
+NARROW_TALLY_BUDGET = 7
+GENERIC_VOTE_QUESTION_BUDGET = 15
+GENERIC_PARTITIONED_QUESTION_BUDGET = 19
+#: Opcode budget to pack the answer to a question into a packed ballot, with
+#: extra for the questions with more than one option, whose answers take bits
+PACKED_QUESTION_BUDGET = 18
+PACKED_ANSWER_BUDGET = 22
+#: Opcode budget to record the answer to a question in its tally shard rather
+#: than in a copy of a single tally box
+SHARDED_QUESTION_BUDGET = 14
+#: The opcode budget `vote` uses before making sure it has the budget it needs,
+#: i.e. the method dispatch, decoding its arguments and reading the offsets
+VOTE_CALL_COST = 130
+#: The opcode budget a `pool_budget` call uses itself, i.e. the method dispatch
+POOL_BUDGET_CALL_COST = 30
+
+
+def question_budgets(
+    *,
+    fixed_vote_type: bool = False,
+    tally_bytes: int = 8,
+    packed_ballots: bool = False,
+    sharded_tallies: bool = False,
+) -> tuple[int, int]:
+    """The opcode budget `vote` needs per question, for the vote types without
+    partitioned weights and for TYPE_PARTITIONED_WEIGHTING"""
+    question_budget = VOTE_QUESTION_BUDGET + (
+        0 if tally_bytes == 8 else NARROW_TALLY_BUDGET
+    )
+    partitioned_question_budget = question_budget + PARTITIONED_QUESTION_BUDGET
+    if not fixed_vote_type:
+        question_budget += GENERIC_VOTE_QUESTION_BUDGET
+        partitioned_question_budget += GENERIC_PARTITIONED_QUESTION_BUDGET
+    if packed_ballots:
+        question_budget += PACKED_QUESTION_BUDGET
+        partitioned_question_budget += PACKED_QUESTION_BUDGET
+    if sharded_tallies:
+        question_budget += SHARDED_QUESTION_BUDGET
+        partitioned_question_budget += SHARDED_QUESTION_BUDGET
+    return question_budget, partitioned_question_budget
+
+
+def vote_budget(
+    vote_type: int,
+    questions_count: int,
+    *,
+    fixed_vote_type: bool = False,
+    tally_bytes: int = 8,
+    packed_option_counts: Sequence[int] | None = None,
+    sharded_tallies: bool = False,
+) -> int:
+    """The opcode budget `vote` makes sure it has before voting, including the
+    buffer OpUp keeps"""
+    question_budget, partitioned_question_budget = question_budgets(
+        fixed_vote_type=fixed_vote_type,
+        tally_bytes=tally_bytes,
+        packed_ballots=packed_option_counts is not None,
+        sharded_tallies=sharded_tallies,
+    )
+    packed_budget = 0
+    if packed_option_counts is not None:
+        extra_options = sum(packed_option_counts) - questions_count
+        packed_budget = PACKED_ANSWER_BUDGET * min(extra_options, questions_count)
+    return (
+        VOTE_BUDGET
+        + (0 if vote_type == TYPE_NO_SNAPSHOT else SIGNATURE_BUDGET)
+        + questions_count
+        * (
+            partitioned_question_budget
+            if vote_type == TYPE_PARTITIONED_WEIGHTING
+            else question_budget
+        )
+        + packed_budget
+        + OPUP_BUFFER
+    )
+
+
+def max_questions(
+    vote_type: int,
+    *,
+    fixed_vote_type: bool = False,
+    tally_bytes: int = 8,
+    packed_ballots: bool = False,
+    sharded_tallies: bool = False,
+) -> int:
+    """The most questions a round can have for `vote` to fit its budget in the
+    OpUp calls the dapps pay for, with any number of options. The costliest
+    packed ballot has as many two option questions as the options allow"""
+    most = MAX_SHARDED_OPTIONS if sharded_tallies else MAX_QUESTIONS
+    for questions_count in range(most, 0, -1):
+        two_option_questions = min(MAX_OPTIONS - questions_count, questions_count)
+        option_counts = [2] * two_option_questions + [1] * (
+            questions_count - two_option_questions
+        )
+        budget = vote_budget(
+            vote_type,
+            questions_count,
+            fixed_vote_type=fixed_vote_type,
+            tally_bytes=tally_bytes,
+            packed_option_counts=option_counts if packed_ballots else None,
+            sharded_tallies=sharded_tallies,
+        )
+        available = APP_CALL_BUDGET - VOTE_CALL_COST
+        if budget <= available + MAX_VOTE_OPUP_CALLS * OPUP_CALL_BUDGET:
+            return questions_count
+    return 0
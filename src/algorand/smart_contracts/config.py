@@ -1,9 +1,35 @@
+import importlib
 import logging
+from typing import TYPE_CHECKING
 
-
-from smart_contracts.voting import app as voting_app
+if TYPE_CHECKING:
+    from beaker import Application
 
 logger = logging.getLogger(__name__)
 
-# define contracts to build and/or deploy
-contracts = [voting_app]
+# define contracts to build and/or deploy, by name with the module attribute
+# each is defined as, so that listing them doesn't import PyTeal and Beaker,
+# and building one only imports the module it's in
+contracts = {
+    "VotingRoundApp": "smart_contracts.voting:app",
+    "VotingRoundAppCompact": "smart_contracts.voting:compact_tallies_app",
+    "VotingRoundAppPackedBallots": "smart_contracts.voting:packed_ballots_app",
+    "VotingRoundAppSharded": "smart_contracts.voting:sharded_tallies_app",
+    "VotingRoundAppNoSnapshot": "smart_contracts.voting:no_snapshot_app",
+    "VotingRoundAppNoWeighting": "smart_contracts.voting:no_weighting_app",
+    "VotingRoundAppWeighting": "smart_contracts.voting:weighting_app",
+    "VotingRoundAppPartitionedWeighting": (
+        "smart_contracts.voting:partitioned_weighting_app"
+    ),
+    "OpUpApp": "smart_contracts.op_up:target_app",
+}
+
+
+def load_contract(name: str) -> "Application":
+    """Imports the module the named contract is defined in and returns it"""
+    module_name, attribute = contracts[name].split(":")
+    logger.debug(f"Importing {module_name} for {name}")
+    app = getattr(importlib.import_module(module_name), attribute)
+    if app.name != name:
+        raise ValueError(f"{contracts[name]} is {app.name}, not {name}")
+    return app
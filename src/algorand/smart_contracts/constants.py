@@ -0,0 +1,30 @@
+"""Constants shared by the contracts in voting.py and the off-chain tooling.
+
+This module doesn't import PyTeal or Beaker, so that the off-chain modules can
+use the same values as the contracts without the cost of building the apps.
+"""
+
+#: The vote types `create` accepts
+TYPE_NO_SNAPSHOT = 0
+TYPE_NO_WEIGHTING = 1
+TYPE_WEIGHTING = 2
+TYPE_PARTITIONED_WEIGHTING = 3
+
+#: The most questions and options a round can have, besides VotingRoundAppSharded
+MAX_QUESTIONS = 112
+MAX_OPTIONS = 128
+#: The tallies in each of VotingRoundAppSharded's tally boxes, a 1KB box of uint64s
+TALLY_SHARD_SIZE = 128
+#: The most options VotingRoundAppSharded allows, in its 5 tally boxes
+MAX_SHARDED_OPTIONS = 5 * TALLY_SHARD_SIZE
+
+#: Bytes of a voter's box besides the answers: the 32 byte address key and the
+#: 2 byte length prefix of the answer array, which packed ballots don't have
+VOTE_BOX_OVERHEAD = 32 + 2
+PACKED_VOTE_BOX_OVERHEAD = 32
+
+#: As in beaker.consts and algosdk.constants
+MIN_TXN_FEE = 1_000
+BOX_FLAT_MIN_BALANCE = 2_500
+BOX_BYTE_MIN_BALANCE = 400
+ASSET_MIN_BALANCE = 100_000
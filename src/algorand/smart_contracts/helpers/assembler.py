@@ -0,0 +1,487 @@
+import base64
+from dataclasses import dataclass, field
+
+import pyteal as pt
+from algosdk import encoding
+from pyteal.ast.global_ import GlobalField
+
+__all__ = [
+    "AssembledProgram",
+    "TealAssemblyError",
+    "TealLine",
+    "assemble",
+    "parse_teal",
+    "program_address",
+]
+
+
+class TealAssemblyError(Exception):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+@dataclass
+class TealLine:
+    #: 1-based line number in the source TEAL
+    line: int
+    op: str
+    args: list[str]
+    #: The most recent standalone comment before this line, e.g. an assert message
+    comment: str | None = None
+
+
+@dataclass
+class AssembledProgram:
+    bytecode: bytes
+    #: Maps the pc of each instruction to its 1-based line number in the source
+    pc_to_line: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def address(self) -> str:
+        return program_address(self.bytecode)
+
+    def source_map(self) -> dict:
+        """A version 3 source map in the same shape as algod's compile endpoint"""
+        segments: list[str] = []
+        last_line = 0
+        for pc in range(len(self.bytecode)):
+            line = self.pc_to_line.get(pc)
+            if line is None:
+                segments.append("")
+                continue
+            # source maps use 0-based lines
+            segments.append("AA" + _vlq(line - 1 - last_line) + "A")
+            last_line = line - 1
+        return {
+            "version": 3,
+            "sources": [],
+            "names": [],
+            "mappings": ";".join(segments),
+        }
+
+
+def program_address(bytecode: bytes) -> str:
+    return str(encoding.encode_address(encoding.checksum(b"Program" + bytecode)))
+
+
+# Immediate argument encodings
+_UINT8 = "uint8"
+_INT8 = "int8"
+_TXN_FIELD = "txn_field"
+_GLOBAL_FIELD = "global_field"
+_LABEL = "label"
+_VARUINT = "varuint"
+_BYTES = "bytes"
+_INTS = "ints"
+_BYTESS = "bytess"
+_LABELS = "labels"
+
+_OPCODES: dict[str, tuple[int, tuple[str, ...]]] = {
+    "err": (0x00, ()),
+    "sha256": (0x01, ()),
+    "keccak256": (0x02, ()),
+    "sha512_256": (0x03, ()),
+    "ed25519verify": (0x04, ()),
+    "+": (0x08, ()),
+    "-": (0x09, ()),
+    "/": (0x0A, ()),
+    "*": (0x0B, ()),
+    "<": (0x0C, ()),
+    ">": (0x0D, ()),
+    "<=": (0x0E, ()),
+    ">=": (0x0F, ()),
+    "&&": (0x10, ()),
+    "||": (0x11, ()),
+    "==": (0x12, ()),
+    "!=": (0x13, ()),
+    "!": (0x14, ()),
+    "len": (0x15, ()),
+    "itob": (0x16, ()),
+    "btoi": (0x17, ()),
+    "%": (0x18, ()),
+    "|": (0x19, ()),
+    "&": (0x1A, ()),
+    "^": (0x1B, ()),
+    "~": (0x1C, ()),
+    "mulw": (0x1D, ()),
+    "addw": (0x1E, ()),
+    "divmodw": (0x1F, ()),
+    "intcblock": (0x20, (_INTS,)),
+    "intc": (0x21, (_UINT8,)),
+    "intc_0": (0x22, ()),
+    "intc_1": (0x23, ()),
+    "intc_2": (0x24, ()),
+    "intc_3": (0x25, ()),
+    "bytecblock": (0x26, (_BYTESS,)),
+    "bytec": (0x27, (_UINT8,)),
+    "bytec_0": (0x28, ()),
+    "bytec_1": (0x29, ()),
+    "bytec_2": (0x2A, ()),
+    "bytec_3": (0x2B, ()),
+    "arg": (0x2C, (_UINT8,)),
+    "arg_0": (0x2D, ()),
+    "arg_1": (0x2E, ()),
+    "arg_2": (0x2F, ()),
+    "arg_3": (0x30, ()),
+    "txn": (0x31, (_TXN_FIELD,)),
+    "global": (0x32, (_GLOBAL_FIELD,)),
+    "gtxn": (0x33, (_UINT8, _TXN_FIELD)),
+    "load": (0x34, (_UINT8,)),
+    "store": (0x35, (_UINT8,)),
+    "txna": (0x36, (_TXN_FIELD, _UINT8)),
+    "gtxna": (0x37, (_UINT8, _TXN_FIELD, _UINT8)),
+    "gtxns": (0x38, (_TXN_FIELD,)),
+    "gtxnsa": (0x39, (_TXN_FIELD, _UINT8)),
+    "gload": (0x3A, (_UINT8, _UINT8)),
+    "gloads": (0x3B, (_UINT8,)),
+    "gaid": (0x3C, (_UINT8,)),
+    "gaids": (0x3D, ()),
+    "loads": (0x3E, ()),
+    "stores": (0x3F, ()),
+    "bnz": (0x40, (_LABEL,)),
+    "bz": (0x41, (_LABEL,)),
+    "b": (0x42, (_LABEL,)),
+    "return": (0x43, ()),
+    "assert": (0x44, ()),
+    "bury": (0x45, (_UINT8,)),
+    "popn": (0x46, (_UINT8,)),
+    "dupn": (0x47, (_UINT8,)),
+    "pop": (0x48, ()),
+    "dup": (0x49, ()),
+    "dup2": (0x4A, ()),
+    "dig": (0x4B, (_UINT8,)),
+    "swap": (0x4C, ()),
+    "select": (0x4D, ()),
+    "cover": (0x4E, (_UINT8,)),
+    "uncover": (0x4F, (_UINT8,)),
+    "concat": (0x50, ()),
+    "substring": (0x51, (_UINT8, _UINT8)),
+    "substring3": (0x52, ()),
+    "getbit": (0x53, ()),
+    "setbit": (0x54, ()),
+    "getbyte": (0x55, ()),
+    "setbyte": (0x56, ()),
+    "extract": (0x57, (_UINT8, _UINT8)),
+    "extract3": (0x58, ()),
+    "extract_uint16": (0x59, ()),
+    "extract_uint32": (0x5A, ()),
+    "extract_uint64": (0x5B, ()),
+    "replace2": (0x5C, (_UINT8,)),
+    "replace3": (0x5D, ()),
+    "balance": (0x60, ()),
+    "app_opted_in": (0x61, ()),
+    "app_local_get": (0x62, ()),
+    "app_local_get_ex": (0x63, ()),
+    "app_global_get": (0x64, ()),
+    "app_global_get_ex": (0x65, ()),
+    "app_local_put": (0x66, ()),
+    "app_global_put": (0x67, ()),
+    "app_local_del": (0x68, ()),
+    "app_global_del": (0x69, ()),
+    "min_balance": (0x78, ()),
+    "pushbytes": (0x80, (_BYTES,)),
+    "pushint": (0x81, (_VARUINT,)),
+    "pushbytess": (0x82, (_BYTESS,)),
+    "pushints": (0x83, (_INTS,)),
+    "ed25519verify_bare": (0x84, ()),
+    "callsub": (0x88, (_LABEL,)),
+    "retsub": (0x89, ()),
+    "proto": (0x8A, (_UINT8, _UINT8)),
+    "frame_dig": (0x8B, (_INT8,)),
+    "frame_bury": (0x8C, (_INT8,)),
+    "switch": (0x8D, (_LABELS,)),
+    "match": (0x8E, (_LABELS,)),
+    "shl": (0x90, ()),
+    "shr": (0x91, ()),
+    "sqrt": (0x92, ()),
+    "bitlen": (0x93, ()),
+    "exp": (0x94, ()),
+    "expw": (0x95, ()),
+    "bsqrt": (0x96, ()),
+    "divw": (0x97, ()),
+    "sha3_256": (0x98, ()),
+    "b+": (0xA0, ()),
+    "b-": (0xA1, ()),
+    "b/": (0xA2, ()),
+    "b*": (0xA3, ()),
+    "b<": (0xA4, ()),
+    "b>": (0xA5, ()),
+    "b<=": (0xA6, ()),
+    "b>=": (0xA7, ()),
+    "b==": (0xA8, ()),
+    "b!=": (0xA9, ()),
+    "b%": (0xAA, ()),
+    "b|": (0xAB, ()),
+    "b&": (0xAC, ()),
+    "b^": (0xAD, ()),
+    "b~": (0xAE, ()),
+    "bzero": (0xAF, ()),
+    "log": (0xB0, ()),
+    "itxn_begin": (0xB1, ()),
+    "itxn_field": (0xB2, (_TXN_FIELD,)),
+    "itxn_submit": (0xB3, ()),
+    "itxn": (0xB4, (_TXN_FIELD,)),
+    "itxna": (0xB5, (_TXN_FIELD, _UINT8)),
+    "itxn_next": (0xB6, ()),
+    "gitxn": (0xB7, (_UINT8, _TXN_FIELD)),
+    "gitxna": (0xB8, (_UINT8, _TXN_FIELD, _UINT8)),
+    "box_create": (0xB9, ()),
+    "box_extract": (0xBA, ()),
+    "box_replace": (0xBB, ()),
+    "box_del": (0xBC, ()),
+    "box_len": (0xBD, ()),
+    "box_get": (0xBE, ()),
+    "box_put": (0xBF, ()),
+    "txnas": (0xC0, (_TXN_FIELD,)),
+    "gtxnas": (0xC1, (_UINT8, _TXN_FIELD)),
+    "gtxnsas": (0xC2, (_TXN_FIELD,)),
+    "args": (0xC3, ()),
+    "gloadss": (0xC4, ()),
+    "itxnas": (0xC5, (_TXN_FIELD,)),
+    "gitxnas": (0xC6, (_UINT8, _TXN_FIELD)),
+}
+
+TXN_FIELDS: dict[str, int] = {f.arg_name: f.id for f in pt.TxnField}
+GLOBAL_FIELDS: dict[str, int] = {f.arg_name: f.id for f in GlobalField}
+
+NAMED_INTS: dict[str, int] = {
+    "unknown": 0,
+    "pay": 1,
+    "keyreg": 2,
+    "acfg": 3,
+    "axfer": 4,
+    "afrz": 5,
+    "appl": 6,
+    "NoOp": 0,
+    "OptIn": 1,
+    "CloseOut": 2,
+    "ClearState": 3,
+    "UpdateApplication": 4,
+    "DeleteApplication": 5,
+}
+
+
+def parse_teal(teal: str) -> list[TealLine]:
+    """Split TEAL source into its non-empty lines of op + arguments, dropping
+    trailing comments but remembering standalone ones so they can be surfaced
+    with errors (PyTeal emits assert comments on the line before the assert)"""
+    result = []
+    comment: str | None = None
+    for line_no, raw in enumerate(teal.splitlines(), start=1):
+        tokens, trailing = _tokenize(raw)
+        if not tokens:
+            if trailing is not None:
+                comment = trailing
+            continue
+        result.append(TealLine(line_no, tokens[0], tokens[1:], comment))
+        comment = None
+    return result
+
+
+def _tokenize(raw: str) -> tuple[list[str], str | None]:
+    tokens: list[str] = []
+    i = 0
+    length = len(raw)
+    while i < length:
+        char = raw[i]
+        if char in " \t":
+            i += 1
+        elif raw.startswith("//", i):
+            return tokens, raw[i + 2 :].strip()
+        elif char == '"':
+            end = i + 1
+            while end < length and raw[end] != '"':
+                end += 2 if raw[end] == "\\" else 1
+            tokens.append(raw[i : end + 1])
+            i = end + 1
+        else:
+            end = i
+            while end < length and raw[end] not in " \t":
+                end += 1
+            tokens.append(raw[i:end])
+            i = end
+    return tokens, None
+
+
+def parse_int(token: str) -> int:
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    if token.startswith(("0x", "0X")):
+        return int(token, 16)
+    if len(token) > 1 and token.startswith("0"):
+        return int(token, 8)
+    return int(token)
+
+
+def parse_bytes(args: list[str]) -> tuple[bytes, int]:
+    """Parse a byte constant from the front of args, returns (value, tokens used)"""
+    first = args[0]
+    if first.startswith(("0x", "0X")):
+        return bytes.fromhex(first[2:]), 1
+    if first.startswith('"'):
+        return _unescape(first[1:-1]), 1
+    if first in ("base64", "b64"):
+        return base64.b64decode(args[1]), 2
+    if first in ("base32", "b32"):
+        padded = args[1] + "=" * (-len(args[1]) % 8)
+        return base64.b32decode(padded), 2
+    if first.startswith(("base64(", "b64(")):
+        return base64.b64decode(first[first.index("(") + 1 : -1]), 1
+    raise ValueError(f"Unable to parse byte constant {first}")
+
+
+def _unescape(value: str) -> bytes:
+    result = bytearray()
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char != "\\":
+            result += char.encode("utf-8")
+            i += 1
+            continue
+        escaped = value[i + 1]
+        if escaped == "x":
+            result.append(int(value[i + 2 : i + 4], 16))
+            i += 4
+            continue
+        result += {"n": b"\n", "r": b"\r", "t": b"\t"}.get(
+            escaped, escaped.encode("utf-8")
+        )
+        i += 2
+    return bytes(result)
+
+
+def _varuint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def _vlq(value: int) -> str:
+    chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+    vlq = (-value << 1) | 1 if value < 0 else value << 1
+    result = ""
+    while True:
+        digit = vlq & 0x1F
+        vlq >>= 5
+        if vlq:
+            digit |= 0x20
+        result += chars[digit]
+        if not vlq:
+            return result
+
+
+def assemble(teal: str) -> AssembledProgram:
+    """Assemble TEAL to AVM bytecode without needing algod.
+
+    Covers the opcodes PyTeal / Beaker emit for AVM versions up to 8 when built
+    with assembled constants, for which it produces the same bytes as algod."""
+    lines = parse_teal(teal)
+    if not lines or lines[0].op != "#pragma":
+        raise TealAssemblyError(1, "Missing #pragma version")
+    version = int(lines[0].args[1])
+
+    instructions: list[TealLine] = []
+    labels: dict[str, int] = {}
+    pending_labels: list[str] = []
+    for line in lines[1:]:
+        if line.op.endswith(":") and not line.args:
+            pending_labels.append(line.op[:-1])
+            continue
+        if line.op in ("int", "byte", "addr", "method"):
+            # algod lays these out in constant blocks with its own heuristics, so
+            # only TEAL that was built with assembled constants is supported
+            raise TealAssemblyError(
+                line.line, f"Pseudo op {line.op} requires assemble_constants"
+            )
+        if line.op not in _OPCODES:
+            raise TealAssemblyError(line.line, f"Unknown opcode {line.op}")
+        for label in pending_labels:
+            labels[label] = len(instructions)
+        pending_labels.clear()
+        instructions.append(line)
+    for label in pending_labels:
+        labels[label] = len(instructions)
+
+    # first pass sizes every instruction so label positions are known
+    header = _varuint(version)
+    sizes = [len(_encode(i, {}, 0, sizing=True)) for i in instructions]
+    starts = []
+    pc = len(header)
+    for size in sizes:
+        starts.append(pc)
+        pc += size
+    label_pcs = {
+        label: (starts[index] if index < len(starts) else pc)
+        for label, index in labels.items()
+    }
+
+    bytecode = bytearray(header)
+    pc_to_line: dict[int, int] = {}
+    for instruction, start in zip(instructions, starts, strict=True):
+        pc_to_line[start] = instruction.line
+        bytecode += _encode(instruction, label_pcs, start, sizing=False)
+    return AssembledProgram(bytes(bytecode), pc_to_line)
+
+
+def _encode(
+    line: TealLine, label_pcs: dict[str, int], start: int, *, sizing: bool
+) -> bytes:
+    opcode, immediates = _OPCODES[line.op]
+    result = bytearray([opcode])
+    args = list(line.args)
+    try:
+        for kind in immediates:
+            match kind:
+                case "uint8":
+                    result.append(parse_int(args.pop(0)))
+                case "int8":
+                    result += parse_int(args.pop(0)).to_bytes(1, "big", signed=True)
+                case "txn_field":
+                    result.append(TXN_FIELDS[args.pop(0)])
+                case "global_field":
+                    result.append(GLOBAL_FIELDS[args.pop(0)])
+                case "varuint":
+                    result += _varuint(parse_int(args.pop(0)))
+                case "bytes":
+                    value, used = parse_bytes(args)
+                    del args[:used]
+                    result += _varuint(len(value)) + value
+                case "ints":
+                    result += _varuint(len(args))
+                    for arg in args:
+                        result += _varuint(parse_int(arg))
+                    args.clear()
+                case "bytess":
+                    values = []
+                    while args:
+                        value, used = parse_bytes(args)
+                        del args[:used]
+                        values.append(value)
+                    result += _varuint(len(values))
+                    for value in values:
+                        result += _varuint(len(value)) + value
+                case "label":
+                    target = args.pop(0)
+                    offset = 0 if sizing else label_pcs[target] - (start + 3)
+                    result += offset.to_bytes(2, "big", signed=True)
+                case "labels":
+                    targets = list(args)
+                    args.clear()
+                    result.append(len(targets))
+                    end = start + 2 + 2 * len(targets)
+                    for target in targets:
+                        offset = 0 if sizing else label_pcs[target] - end
+                        result += offset.to_bytes(2, "big", signed=True)
+    except (KeyError, IndexError, ValueError, OverflowError) as ex:
+        raise TealAssemblyError(line.line, f"Invalid arguments for {line.op}") from ex
+    if args:
+        raise TealAssemblyError(line.line, f"Unexpected arguments for {line.op}")
+    return bytes(result)
@@ -0,0 +1,1657 @@
+import copy
+import hashlib
+import math
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+import nacl.exceptions
+import nacl.signing
+from algosdk import abi, encoding
+from Cryptodome.Hash import keccak
+
+from smart_contracts.helpers.assembler import (
+    TealLine,
+    assemble,
+    parse_bytes,
+    parse_int,
+    parse_teal,
+)
+
+__all__ = [
+    "APP_CALL_BUDGET",
+    "MIN_TXN_FEE",
+    "Application",
+    "GroupResult",
+    "Ledger",
+    "LogicError",
+    "Program",
+    "Transaction",
+    "TransactionResult",
+    "app_address",
+]
+
+MIN_TXN_FEE = 1_000
+MIN_BALANCE = 100_000
+APP_CALL_BUDGET = 700
+APP_PAGE_MIN_BALANCE = 100_000
+SCHEMA_MIN_BALANCE = 25_000
+SCHEMA_UINT_MIN_BALANCE = 3_500
+SCHEMA_BYTES_MIN_BALANCE = 25_000
+BOX_FLAT_MIN_BALANCE = 2_500
+BOX_BYTE_MIN_BALANCE = 400
+MAX_STACK_BYTES = 4096
+MAX_LOG_CALLS = 32
+MAX_LOG_BYTES = 1024
+MAX_INNER_TXNS = 256
+MAX_CALL_DEPTH = 8
+#: The accounts, apps, assets and boxes an app call can reference in total
+MAX_APP_REFERENCES = 8
+#: The bytes of boxes each box reference lets the group read and write
+BOX_IO_BUDGET = 1024
+ZERO_ADDRESS = bytes(32)
+
+#: Opcodes that cost more than 1 in AVM version 8
+OPCODE_COSTS: dict[str, int] = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "sha3_256": 130,
+    "ed25519verify": 1900,
+    "ed25519verify_bare": 1900,
+    "b+": 10,
+    "b-": 10,
+    "b/": 20,
+    "b*": 20,
+    "b%": 20,
+    "b|": 6,
+    "b&": 6,
+    "b^": 6,
+    "b~": 4,
+    "bsqrt": 40,
+    "divw": 1,
+    "expw": 10,
+}
+
+_ARRAY_FIELDS = {
+    "ApplicationArgs": "NumAppArgs",
+    "Accounts": "NumAccounts",
+    "Assets": "NumAssets",
+    "Applications": "NumApplications",
+    "Logs": "NumLogs",
+    "ApprovalProgramPages": "NumApprovalProgramPages",
+    "ClearStateProgramPages": "NumClearStateProgramPages",
+}
+_TYPE_ENUMS = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+_BYTES_FIELDS = {
+    "Sender",
+    "Note",
+    "Lease",
+    "Receiver",
+    "CloseRemainderTo",
+    "Type",
+    "TxID",
+    "ApprovalProgram",
+    "ClearStateProgram",
+    "RekeyTo",
+    "ConfigAssetUnitName",
+    "ConfigAssetName",
+    "ConfigAssetURL",
+    "ConfigAssetMetadataHash",
+    "ConfigAssetManager",
+    "ConfigAssetReserve",
+    "ConfigAssetFreeze",
+    "ConfigAssetClawback",
+    "AssetSender",
+    "AssetReceiver",
+    "AssetCloseTo",
+    "FreezeAssetAccount",
+    "LastLog",
+    "VotePK",
+    "SelectionPK",
+    "StateProofPK",
+}
+
+StackValue = int | bytes
+
+
+class LogicError(Exception):
+    """Raised when a program fails, e.g. an `assert` or `err` is hit"""
+
+    def __init__(self, message: str, line: TealLine | None = None):
+        self.reason = message
+        #: The comment PyTeal emitted before the failing line, if any
+        self.comment = line.comment if line else None
+        self.line = line.line if line else None
+        location = f" at line {self.line}" if line else ""
+        detail = f" ({self.comment})" if self.comment else ""
+        super().__init__(f"{message}{location}{detail}")
+
+
+def app_address(app_id: int) -> bytes:
+    return encoding.checksum(b"appID" + app_id.to_bytes(8, "big"))
+
+
+def _uint(value: StackValue, line: TealLine) -> int:
+    if not isinstance(value, int):
+        raise LogicError("expected uint64 but got bytes", line)
+    return value
+
+
+def _bytes(value: StackValue, line: TealLine) -> bytes:
+    if not isinstance(value, bytes):
+        raise LogicError("expected bytes but got uint64", line)
+    return value
+
+
+@dataclass
+class Transaction:
+    """A transaction described by its TEAL field names, e.g. `Sender`, `Amount`"""
+
+    fields: dict[str, Any] = field(default_factory=dict)
+    #: Box references as (app id, name), app id 0 means the called app
+    boxes: list[tuple[int, bytes]] | None = None
+
+    @staticmethod
+    def payment(
+        sender: bytes, receiver: bytes, amount: int, fee: int | None = None
+    ) -> "Transaction":
+        return Transaction(
+            {
+                "Type": b"pay",
+                "Sender": sender,
+                "Receiver": receiver,
+                "Amount": amount,
+                "Fee": fee,
+            }
+        )
+
+    @staticmethod
+    def app_call(
+        sender: bytes,
+        app_id: int,
+        args: Iterable[bytes] = (),
+        *,
+        on_complete: int = 0,
+        accounts: Iterable[bytes] = (),
+        apps: Iterable[int] = (),
+        assets: Iterable[int] = (),
+        boxes: Iterable[tuple[int, bytes]] | None = None,
+        fee: int | None = None,
+        **extra: Any,
+    ) -> "Transaction":
+        return Transaction(
+            {
+                "Type": b"appl",
+                "Sender": sender,
+                "ApplicationID": app_id,
+                "OnCompletion": on_complete,
+                "ApplicationArgs": list(args),
+                "Accounts": list(accounts),
+                "Applications": list(apps),
+                "Assets": list(assets),
+                "Fee": fee,
+                **extra,
+            },
+            boxes=list(boxes) if boxes is not None else None,
+        )
+
+    @property
+    def type(self) -> bytes:  # noqa: A003
+        return bytes(self.fields.get("Type", b""))
+
+    @property
+    def sender(self) -> bytes:
+        return bytes(self.fields["Sender"])
+
+    def get(self, name: str, index: int | None = None) -> StackValue:
+        if name == "TypeEnum":
+            return _TYPE_ENUMS.get(self.type.decode(), 0)
+        if name in _ARRAY_FIELDS:
+            values = self._array(name)
+            if index is None or index >= len(values):
+                raise IndexError(f"{name} index {index} out of range")
+            return values[index]
+        if name in _ARRAY_FIELDS.values():
+            array = next(k for k, v in _ARRAY_FIELDS.items() if v == name)
+            return len(self.fields.get(array, []))
+        if name == "ApprovalProgram" and "ApprovalProgramPages" in self.fields:
+            return b"".join(self.fields["ApprovalProgramPages"])
+        if name == "ClearStateProgram" and "ClearStateProgramPages" in self.fields:
+            return b"".join(self.fields["ClearStateProgramPages"])
+        if name == "LastLog":
+            logs = self.fields.get("Logs", [])
+            return logs[-1] if logs else b""
+        value = self.fields.get(name)
+        if value is None:
+            return (
+                ZERO_ADDRESS
+                if name in _ADDRESS_FIELDS
+                else (b"" if name in _BYTES_FIELDS else 0)
+            )
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _array(self, name: str) -> list:
+        values = list(self.fields.get(name, []))
+        # Index 0 of the foreign arrays refers to the sender / called app
+        if name == "Accounts":
+            return [self.sender, *values]
+        if name == "Applications":
+            return [self.fields.get("ApplicationID", 0), *values]
+        return values
+
+
+_ADDRESS_FIELDS = {
+    "Sender",
+    "Receiver",
+    "CloseRemainderTo",
+    "Lease",
+    "RekeyTo",
+    "ConfigAssetManager",
+    "ConfigAssetReserve",
+    "ConfigAssetFreeze",
+    "ConfigAssetClawback",
+    "AssetSender",
+    "AssetReceiver",
+    "AssetCloseTo",
+    "FreezeAssetAccount",
+}
+
+
+@dataclass
+class Instruction:
+    line: TealLine
+    op: str
+    immediates: list[Any]
+    cost: int
+
+
+class Program:
+    """A parsed TEAL program ready to be evaluated"""
+
+    def __init__(self, teal: str, template_values: dict[str, int] | None = None):
+        self.teal = teal
+        for name, value in (template_values or {}).items():
+            self.teal = self.teal.replace(f"TMPL_{name}", str(value))
+        lines = parse_teal(self.teal)
+        self.version = int(lines[0].args[1])
+        self.instructions: list[Instruction] = []
+        self.labels: dict[str, int] = {}
+        for line in lines[1:]:
+            if line.op.endswith(":") and not line.args:
+                self.labels[line.op[:-1]] = len(self.instructions)
+                continue
+            self.instructions.append(
+                Instruction(
+                    line, line.op, _parse_immediates(line), OPCODE_COSTS.get(line.op, 1)
+                )
+            )
+
+    def __deepcopy__(self, memo: dict) -> "Program":
+        # programs are immutable so can be shared between ledger snapshots
+        return self
+
+
+def _parse_immediates(line: TealLine) -> list[Any]:
+    op, args = line.op, line.args
+    if op in ("pushbytes", "byte"):
+        return [parse_bytes(args)[0]]
+    if op == "addr":
+        return [encoding.decode_address(args[0])]
+    if op == "method":
+        return [abi.Method.from_signature(args[0][1:-1]).get_selector()]
+    if op in ("bytecblock", "pushbytess"):
+        values = []
+        remaining = list(args)
+        while remaining:
+            value, used = parse_bytes(remaining)
+            del remaining[:used]
+            values.append(value)
+        return values
+    if op in (
+        "txn",
+        "txna",
+        "txnas",
+        "gtxns",
+        "gtxnsa",
+        "gtxnsas",
+        "itxn",
+        "itxna",
+        "itxnas",
+        "itxn_field",
+        "global",
+    ):
+        return [args[0], *[parse_int(a) for a in args[1:]]]
+    if op in ("gtxn", "gtxna", "gtxnas", "gitxn", "gitxna", "gitxnas"):
+        return [parse_int(args[0]), args[1], *[parse_int(a) for a in args[2:]]]
+    if op in ("bnz", "bz", "b", "callsub", "switch", "match"):
+        return list(args)
+    return [parse_int(a) for a in args]
+
+
+@dataclass
+class Application:
+    id: int  # noqa: A003
+    approval: Program
+    clear: Program | None
+    creator: bytes
+    global_num_uints: int = 64
+    global_num_byte_slices: int = 64
+    extra_pages: int = 0
+    global_state: dict[bytes, StackValue] = field(default_factory=dict)
+    boxes: dict[bytes, bytearray] = field(default_factory=dict)
+
+    @property
+    def address(self) -> bytes:
+        return app_address(self.id)
+
+
+@dataclass
+class Account:
+    balance: int = 0
+    #: asset id -> amount held
+    assets: dict[int, int] = field(default_factory=dict)
+    created_apps: set[int] = field(default_factory=set)
+
+
+@dataclass
+class TransactionResult:
+    transaction: Transaction
+    logs: list[bytes] = field(default_factory=list)
+    inner_transactions: list["TransactionResult"] = field(default_factory=list)
+    #: Opcode budget consumed by this transaction, including any inner app calls
+    opcode_cost: int = 0
+    created_app_id: int = 0
+    created_asset_id: int = 0
+    #: The fee this transaction has to pay to cover itself and its inner txns
+    required_fee: int = 0
+
+    @property
+    def inner_transaction_count(self) -> int:
+        return sum(1 + t.inner_transaction_count for t in self.inner_transactions)
+
+    @property
+    def return_value(self) -> bytes | None:
+        """The ARC-4 return value logged by an ABI method, if any"""
+        if self.logs and self.logs[-1][:4] == bytes.fromhex("151f7c75"):
+            return self.logs[-1][4:]
+        return None
+
+
+@dataclass
+class GroupResult:
+    transactions: list[TransactionResult]
+    opcode_budget: int
+    opcode_cost: int
+
+    @property
+    def total_fee(self) -> int:
+        return sum(t.required_fee for t in self.transactions)
+
+
+class Ledger:
+    """An in-process stand-in for algod that evaluates transaction groups
+    against TEAL programs, tracking balances, global state and boxes.
+
+    It implements the subset of AVM behaviour that PyTeal / Beaker apps in
+    this repo rely on; it is not a replacement for LocalNet when verifying
+    protocol level behaviour."""
+
+    def __init__(self, timestamp: int = 1_700_000_000, round_: int = 1):
+        self.timestamp = timestamp
+        self.round = round_
+        self.accounts: dict[bytes, Account] = {}
+        self.apps: dict[int, Application] = {}
+        self.assets: dict[int, dict[str, StackValue]] = {}
+        self.programs: dict[bytes, Program] = {}
+        self._next_id = 1001
+
+    def register_program(
+        self, teal: str, template_values: dict[str, int] | None = None
+    ) -> bytes:
+        """Make a program known to the ledger so inner transactions that create
+        apps from its bytecode can be evaluated, returns the bytecode"""
+        program = Program(teal, template_values)
+        bytecode = assemble(program.teal).bytecode
+        self.programs[bytecode] = program
+        return bytecode
+
+    def account(self, address: bytes) -> Account:
+        return self.accounts.setdefault(address, Account())
+
+    def fund(self, address: bytes, amount: int) -> None:
+        self.account(address).balance += amount
+
+    def min_balance(self, address: bytes) -> int:
+        account = self.accounts.get(address)
+        if account is None:
+            return 0
+        result = MIN_BALANCE + MIN_BALANCE * len(account.assets)
+        for app_id in account.created_apps:
+            app = self.apps[app_id]
+            result += APP_PAGE_MIN_BALANCE * (1 + app.extra_pages)
+            result += (SCHEMA_MIN_BALANCE + SCHEMA_UINT_MIN_BALANCE) * (
+                app.global_num_uints
+            ) + (SCHEMA_MIN_BALANCE + SCHEMA_BYTES_MIN_BALANCE) * (
+                app.global_num_byte_slices
+            )
+        app_account = self._app_by_address(address)
+        if app_account is not None:
+            for name, value in app_account.boxes.items():
+                result += BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (
+                    len(name) + len(value)
+                )
+        return result
+
+    def _app_by_address(self, address: bytes) -> Application | None:
+        for app in self.apps.values():
+            if app.address == address:
+                return app
+        return None
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def create_app(
+        self,
+        creator: bytes,
+        approval: Program,
+        clear: Program | None = None,
+        *,
+        global_num_uints: int = 0,
+        global_num_byte_slices: int = 0,
+        extra_pages: int = 0,
+    ) -> Application:
+        app = Application(
+            id=self._new_id(),
+            approval=approval,
+            clear=clear,
+            creator=creator,
+            global_num_uints=global_num_uints,
+            global_num_byte_slices=global_num_byte_slices,
+            extra_pages=extra_pages,
+        )
+        self.apps[app.id] = app
+        self.account(creator).created_apps.add(app.id)
+        return app
+
+    def execute(self, group: list[Transaction]) -> GroupResult:
+        """Evaluate a transaction group atomically; on failure no state changes
+        are kept and the LogicError is raised"""
+        snapshot = (
+            copy.deepcopy(self.accounts),
+            copy.deepcopy(self.apps),
+            copy.deepcopy(self.assets),
+            self._next_id,
+        )
+        try:
+            return self._execute(group)
+        except Exception:
+            self.accounts, self.apps, self.assets, self._next_id = snapshot
+            raise
+
+    def _execute(self, group: list[Transaction]) -> GroupResult:
+        app_calls = [t for t in group if t.type == b"appl"]
+        box_references = [len(t.boxes) for t in app_calls if t.boxes is not None]
+        budget = _Budget(
+            APP_CALL_BUDGET * len(app_calls),
+            BOX_IO_BUDGET * sum(box_references) if box_references else None,
+        )
+        results = []
+        for index, txn in enumerate(group):
+            txn.fields["GroupIndex"] = index
+            results.append(self._apply(txn, group, budget, depth=0))
+        fees_paid = sum(
+            (r.transaction.fields.get("Fee") or 0) + _inner_fees(r) for r in results
+        )
+        fees_required = sum(r.required_fee for r in results)
+        explicit = all(r.transaction.fields.get("Fee") is not None for r in results)
+        if explicit and fees_paid < fees_required:
+            raise LogicError(
+                f"fee too small: paid {fees_paid}, group requires {fees_required}"
+            )
+        for result in results:
+            if result.transaction.fields.get("Fee") is None:
+                self.account(result.transaction.sender).balance -= result.required_fee
+                result.transaction.fields["Fee"] = result.required_fee
+        # app accounts pay for boxes, so can drop below their min balance too
+        for address in list(self.accounts):
+            self._check_min_balance(address)
+        return GroupResult(results, budget.initial, budget.used)
+
+    def _check_min_balance(self, address: bytes) -> None:
+        account = self.accounts.get(address)
+        if account is None:
+            return
+        min_balance = self.min_balance(address)
+        if account.balance < 0 or (
+            account.balance < min_balance
+            and (account.balance > 0 or account.assets or account.created_apps)
+        ):
+            raise LogicError(
+                f"account {encoding.encode_address(address)} balance "
+                f"{account.balance} below min {min_balance}"
+            )
+
+    def _apply(
+        self,
+        txn: Transaction,
+        group: list[Transaction],
+        budget: "_Budget",
+        depth: int,
+    ) -> TransactionResult:
+        result = TransactionResult(txn)
+        used_before = budget.used
+        explicit_fee = txn.fields.get("Fee")
+        if explicit_fee is not None:
+            self.account(txn.sender).balance -= explicit_fee
+        match txn.type:
+            case b"pay":
+                amount = int(txn.get("Amount"))
+                self.account(txn.sender).balance -= amount
+                self.account(bytes(txn.get("Receiver"))).balance += amount
+                self._check_min_balance(bytes(txn.get("Receiver")))
+            case b"acfg":
+                self._apply_asset_config(txn, result)
+            case b"appl":
+                self._apply_app_call(txn, group, budget, depth, result)
+            case _:
+                raise LogicError(f"unsupported transaction type {txn.type!r}")
+        if explicit_fee is not None or depth == 0:
+            self._check_min_balance(txn.sender)
+        result.opcode_cost = budget.used - used_before
+        result.required_fee = MIN_TXN_FEE * (1 + result.inner_transaction_count)
+        return result
+
+    def _apply_asset_config(self, txn: Transaction, result: TransactionResult) -> None:
+        if txn.get("ConfigAsset"):
+            raise LogicError("only asset creation is supported")
+        asset_id = self._new_id()
+        self.assets[asset_id] = {
+            name: txn.get(name)
+            for name in (
+                "ConfigAssetTotal",
+                "ConfigAssetDecimals",
+                "ConfigAssetDefaultFrozen",
+                "ConfigAssetUnitName",
+                "ConfigAssetName",
+                "ConfigAssetURL",
+                "ConfigAssetManager",
+                "Note",
+            )
+        }
+        self.assets[asset_id]["Creator"] = txn.sender
+        self.account(txn.sender).assets[asset_id] = int(txn.get("ConfigAssetTotal"))
+        result.created_asset_id = asset_id
+
+    def _apply_app_call(
+        self,
+        txn: Transaction,
+        group: list[Transaction],
+        budget: "_Budget",
+        depth: int,
+        result: TransactionResult,
+    ) -> None:
+        references = len(txn.boxes or []) + sum(
+            len(txn.fields.get(name, []))
+            for name in ("Accounts", "Applications", "Assets")
+        )
+        if references > MAX_APP_REFERENCES:
+            raise LogicError(
+                f"too many references: {references} > {MAX_APP_REFERENCES}"
+            )
+        app_id = int(txn.get("ApplicationID"))
+        if app_id == 0:
+            approval = self._program(bytes(txn.get("ApprovalProgram")))
+            app = self.create_app(
+                txn.sender,
+                approval,
+                global_num_uints=int(txn.get("GlobalNumUint")),
+                global_num_byte_slices=int(txn.get("GlobalNumByteSlice")),
+                extra_pages=int(txn.get("ExtraProgramPages")),
+            )
+            result.created_app_id = app.id
+        else:
+            if app_id not in self.apps:
+                raise LogicError(f"app {app_id} does not exist")
+            app = self.apps[app_id]
+        evaluator = _Evaluator(self, app, txn, group, budget, depth, result)
+        approved = evaluator.run()
+        if not approved:
+            raise LogicError("transaction rejected by ApprovalProgram")
+        if txn.get("OnCompletion") == 5:
+            self.account(app.creator).created_apps.discard(app.id)
+            del self.apps[app.id]
+
+    def _program(self, bytecode: bytes) -> Program:
+        if bytecode == bytes.fromhex("068101"):
+            # the program PyTeal's OpUp uses in OnCall mode
+            return Program("#pragma version 6\nint 1")
+        if bytecode not in self.programs:
+            raise LogicError(
+                "unknown program bytecode, register its TEAL with the ledger first"
+            )
+        return self.programs[bytecode]
+
+
+def _inner_fees(result: TransactionResult) -> int:
+    return sum(
+        (inner.transaction.fields.get("Fee") or 0) + _inner_fees(inner)
+        for inner in result.inner_transactions
+    )
+
+
+class _Budget:
+    """The opcode budget a group pools, and the box I/O budget its box
+    references give it, which is None (unchecked) if none were given"""
+
+    def __init__(self, initial: int, box_io: int | None = None):
+        self.initial = initial
+        self.used = 0
+        self.box_io = box_io
+        #: The largest size each box the group has read or written has had
+        self.box_sizes: dict[tuple[int, bytes], int] = {}
+
+    @property
+    def remaining(self) -> int:
+        return self.initial - self.used
+
+    def add(self, amount: int) -> None:
+        self.initial += amount
+
+    def use_box(self, app_id: int, name: bytes, size: int, line: TealLine) -> None:
+        if self.box_io is None:
+            return
+        key = app_id, name
+        self.box_sizes[key] = max(size, self.box_sizes.get(key, 0))
+        used = sum(self.box_sizes.values())
+        if used > self.box_io:
+            raise LogicError(f"box I/O budget exceeded: {used} > {self.box_io}", line)
+
+
+@dataclass
+class _Frame:
+    return_index: int
+    stack_height: int
+    args: int = 0
+    returns: int = 0
+    has_proto: bool = False
+
+
+class _Evaluator:
+    def __init__(
+        self,
+        ledger: Ledger,
+        app: Application,
+        txn: Transaction,
+        group: list[Transaction],
+        budget: _Budget,
+        depth: int,
+        result: TransactionResult,
+    ):
+        self.ledger = ledger
+        self.app = app
+        self.program = app.approval
+        self.txn = txn
+        self.group = group
+        self.budget = budget
+        self.depth = depth
+        self.result = result
+        self.stack: list[StackValue] = []
+        self.scratch: list[StackValue] = [0] * 256
+        self.frames: list[_Frame] = []
+        self.intc: list[int] = []
+        self.bytec: list[bytes] = []
+        self.pc = 0
+        self.inner_group: list[Transaction] | None = None
+        self.last_inner: list[TransactionResult] = []
+        self.log_bytes = 0
+
+    # helpers
+
+    def pop(self, line: TealLine) -> StackValue:
+        if not self.stack:
+            raise LogicError("stack underflow", line)
+        return self.stack.pop()
+
+    def pop_uint(self, line: TealLine) -> int:
+        return _uint(self.pop(line), line)
+
+    def pop_bytes(self, line: TealLine) -> bytes:
+        return _bytes(self.pop(line), line)
+
+    def push(self, value: StackValue, line: TealLine) -> None:
+        if isinstance(value, bytes) and len(value) > MAX_STACK_BYTES:
+            raise LogicError("byte array exceeds 4096 bytes", line)
+        if isinstance(value, int) and not 0 <= value < 2**64:
+            raise LogicError("uint64 overflow", line)
+        self.stack.append(value)
+
+    def jump(self, label: str) -> None:
+        self.pc = self.program.labels[label]
+
+    def run(self) -> bool:
+        instructions = self.program.instructions
+        while self.pc < len(instructions):
+            instruction = instructions[self.pc]
+            self.pc += 1
+            self.budget.used += instruction.cost
+            if self.budget.remaining < 0:
+                raise LogicError("dynamic cost budget exceeded", instruction.line)
+            handler = _HANDLERS.get(instruction.op)
+            if handler is None:
+                raise LogicError(
+                    f"unsupported opcode {instruction.op}", instruction.line
+                )
+            outcome = handler(self, instruction)
+            if outcome is not None:
+                return outcome
+        if len(self.stack) != 1:
+            raise LogicError("stack must contain exactly one value at the end")
+        return bool(self.pop_uint(instructions[-1].line))
+
+    # context
+
+    def resolve_app(self, value: StackValue, line: TealLine) -> int:
+        reference = _uint(value, line)
+        applications = self.txn._array("Applications")
+        if reference < len(applications):
+            return int(applications[reference]) or self.app.id
+        return reference
+
+    def resolve_account(self, value: StackValue, line: TealLine) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        accounts = self.txn._array("Accounts")
+        if value >= len(accounts):
+            raise LogicError(f"invalid account reference {value}", line)
+        return bytes(accounts[value])
+
+    def box(self, name: bytes, line: TealLine) -> bytearray | None:
+        if self.txn.boxes is not None and not any(
+            ref_name == name and ref_app in (0, self.app.id)
+            for ref_app, ref_name in self.txn.boxes
+        ):
+            raise LogicError(f"invalid box reference {name!r}", line)
+        if not name or len(name) > 64:
+            raise LogicError("box names must be 1-64 bytes", line)
+        box = self.app.boxes.get(name)
+        if box is not None:
+            self.use_box(name, len(box), line)
+        return box
+
+    def use_box(self, name: bytes, size: int, line: TealLine) -> None:
+        """Counts a box against the group's box I/O budget if the app call
+        references its boxes"""
+        if self.txn.boxes is not None:
+            self.budget.use_box(self.app.id, name, size, line)
+
+    def txn_field(self, txn: Transaction, name: str, index: int | None) -> StackValue:
+        if name == "GroupIndex":
+            return int(txn.fields.get("GroupIndex", 0))
+        try:
+            return txn.get(name, index)
+        except IndexError as ex:
+            raise LogicError(str(ex)) from ex
+
+    def global_field(self, name: str) -> StackValue:
+        match name:
+            case "MinTxnFee":
+                return MIN_TXN_FEE
+            case "MinBalance":
+                return MIN_BALANCE
+            case "MaxTxnLife":
+                return 1000
+            case "ZeroAddress":
+                return ZERO_ADDRESS
+            case "GroupSize":
+                return len(self.group)
+            case "LogicSigVersion":
+                return 8
+            case "Round":
+                return self.ledger.round
+            case "LatestTimestamp":
+                return self.ledger.timestamp
+            case "CurrentApplicationID":
+                return self.app.id
+            case "CurrentApplicationAddress":
+                return self.app.address
+            case "CreatorAddress":
+                return self.app.creator
+            case "GroupID":
+                return bytes(32)
+            case "OpcodeBudget":
+                return self.budget.remaining
+            case "CallerApplicationID":
+                return int(self.txn.fields.get("_caller", 0))
+            case "CallerApplicationAddress":
+                caller = int(self.txn.fields.get("_caller", 0))
+                return app_address(caller) if caller else ZERO_ADDRESS
+        raise LogicError(f"unsupported global field {name}")
+
+    # inner transactions
+
+    def submit_inner(self, line: TealLine) -> None:
+        if self.inner_group is None:
+            raise LogicError("itxn_submit without itxn_begin", line)
+        if self.result.inner_transaction_count + len(self.inner_group) > (
+            MAX_INNER_TXNS
+        ):
+            raise LogicError("too many inner transactions", line)
+        if self.depth + 1 > MAX_CALL_DEPTH:
+            raise LogicError("inner transaction depth exceeded", line)
+        group = self.inner_group
+        self.inner_group = None
+        # every inner app call adds to the pooled opcode budget
+        self.budget.add(
+            APP_CALL_BUDGET * sum(1 for txn in group if txn.type == b"appl")
+        )
+        results = []
+        for index, txn in enumerate(group):
+            txn.fields["GroupIndex"] = index
+            txn.fields["_caller"] = self.app.id
+            try:
+                results.append(
+                    self.ledger._apply(txn, group, self.budget, self.depth + 1)
+                )
+            except LogicError as ex:
+                raise LogicError(f"inner transaction failed: {ex}", line) from ex
+        self.result.inner_transactions.extend(results)
+        self.last_inner = results
+
+
+def _handler(*names: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        for name in names:
+            _HANDLERS[name] = func
+        return func
+
+    return decorator
+
+
+_HANDLERS: dict[str, Callable[[_Evaluator, Instruction], bool | None]] = {}
+
+
+def _binary_uint(op: Callable[[int, int], int]) -> Callable:
+    def handler(ev: _Evaluator, ins: Instruction) -> None:
+        b = ev.pop_uint(ins.line)
+        a = ev.pop_uint(ins.line)
+        try:
+            value = op(a, b)
+        except ZeroDivisionError as ex:
+            raise LogicError("division by zero", ins.line) from ex
+        if not 0 <= value < 2**64:
+            raise LogicError(f"{ins.op} overflowed", ins.line)
+        ev.push(value, ins.line)
+
+    return handler
+
+
+for _name, _op in {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b,
+    "%": lambda a, b: a % b,
+    "<": lambda a, b: int(a < b),
+    ">": lambda a, b: int(a > b),
+    "<=": lambda a, b: int(a <= b),
+    ">=": lambda a, b: int(a >= b),
+    "&&": lambda a, b: int(bool(a) and bool(b)),
+    "||": lambda a, b: int(bool(a) or bool(b)),
+    "|": lambda a, b: a | b,
+    "&": lambda a, b: a & b,
+    "^": lambda a, b: a ^ b,
+    "shl": lambda a, b: (a << b) % 2**64,
+    "shr": lambda a, b: a >> b,
+    "exp": lambda a, b: a**b,
+}.items():
+    _HANDLERS[_name] = _binary_uint(_op)
+
+
+@_handler("==", "!=")
+def _equality(ev: _Evaluator, ins: Instruction) -> None:
+    b = ev.pop(ins.line)
+    a = ev.pop(ins.line)
+    if type(a) is not type(b):
+        raise LogicError("cannot compare uint64 to bytes", ins.line)
+    ev.push(int((a == b) == (ins.op == "==")), ins.line)
+
+
+@_handler("!")
+def _not(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(int(ev.pop_uint(ins.line) == 0), ins.line)
+
+
+@_handler("~")
+def _bitwise_not(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(ev.pop_uint(ins.line) ^ (2**64 - 1), ins.line)
+
+
+@_handler("sqrt")
+def _sqrt(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(math.isqrt(ev.pop_uint(ins.line)), ins.line)
+
+
+@_handler("mulw")
+def _mulw(ev: _Evaluator, ins: Instruction) -> None:
+    b = ev.pop_uint(ins.line)
+    a = ev.pop_uint(ins.line)
+    value = a * b
+    ev.push(value >> 64, ins.line)
+    ev.push(value & (2**64 - 1), ins.line)
+
+
+@_handler("addw")
+def _addw(ev: _Evaluator, ins: Instruction) -> None:
+    b = ev.pop_uint(ins.line)
+    a = ev.pop_uint(ins.line)
+    value = a + b
+    ev.push(value >> 64, ins.line)
+    ev.push(value & (2**64 - 1), ins.line)
+
+
+@_handler("len")
+def _len(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(len(ev.pop_bytes(ins.line)), ins.line)
+
+
+@_handler("itob")
+def _itob(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(ev.pop_uint(ins.line).to_bytes(8, "big"), ins.line)
+
+
+@_handler("btoi")
+def _btoi(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop_bytes(ins.line)
+    if len(value) > 8:
+        raise LogicError("btoi arg too long", ins.line)
+    ev.push(int.from_bytes(value, "big"), ins.line)
+
+
+@_handler("bitlen")
+def _bitlen(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop(ins.line)
+    if isinstance(value, bytes):
+        value = int.from_bytes(value, "big")
+    ev.push(value.bit_length(), ins.line)
+
+
+@_handler("b+", "b-", "b*", "b/", "b%", "b|", "b&", "b^")
+def _byte_math(ev: _Evaluator, ins: Instruction) -> None:
+    b_raw = ev.pop_bytes(ins.line)
+    a_raw = ev.pop_bytes(ins.line)
+    a, b = int.from_bytes(a_raw, "big"), int.from_bytes(b_raw, "big")
+    match ins.op:
+        case "b+":
+            value = a + b
+        case "b-":
+            if b > a:
+                raise LogicError("byte math underflow", ins.line)
+            value = a - b
+        case "b*":
+            value = a * b
+        case "b/" | "b%":
+            if b == 0:
+                raise LogicError("division by zero", ins.line)
+            value = a // b if ins.op == "b/" else a % b
+        case _:
+            size = max(len(a_raw), len(b_raw))
+            value = {"b|": a | b, "b&": a & b, "b^": a ^ b}[ins.op]
+            ev.push(value.to_bytes(size, "big"), ins.line)
+            return
+    ev.push(value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"), ins.line)
+
+
+@_handler("b<", "b>", "b<=", "b>=", "b==", "b!=")
+def _byte_compare(ev: _Evaluator, ins: Instruction) -> None:
+    b = int.from_bytes(ev.pop_bytes(ins.line), "big")
+    a = int.from_bytes(ev.pop_bytes(ins.line), "big")
+    ev.push(
+        int(
+            {
+                "b<": a < b,
+                "b>": a > b,
+                "b<=": a <= b,
+                "b>=": a >= b,
+                "b==": a == b,
+                "b!=": a != b,
+            }[ins.op]
+        ),
+        ins.line,
+    )
+
+
+@_handler("bzero")
+def _bzero(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(bytes(ev.pop_uint(ins.line)), ins.line)
+
+
+@_handler("sha256", "sha512_256", "keccak256", "sha3_256")
+def _hash(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop_bytes(ins.line)
+    match ins.op:
+        case "sha256":
+            digest = hashlib.sha256(value).digest()
+        case "sha512_256":
+            digest = encoding.checksum(value)
+        case "sha3_256":
+            digest = hashlib.sha3_256(value).digest()
+        case _:
+            digest = keccak.new(data=value, digest_bits=256).digest()
+    ev.push(digest, ins.line)
+
+
+@_handler("ed25519verify_bare")
+def _ed25519verify_bare(ev: _Evaluator, ins: Instruction) -> None:
+    public_key = ev.pop_bytes(ins.line)
+    signature = ev.pop_bytes(ins.line)
+    data = ev.pop_bytes(ins.line)
+    if len(public_key) != 32 or len(signature) != 64:
+        ev.push(0, ins.line)
+        return
+    try:
+        nacl.signing.VerifyKey(public_key).verify(data, signature)
+        ev.push(1, ins.line)
+    except nacl.exceptions.BadSignatureError:
+        ev.push(0, ins.line)
+
+
+# constants
+
+
+@_handler("intcblock")
+def _intcblock(ev: _Evaluator, ins: Instruction) -> None:
+    ev.intc = list(ins.immediates)
+
+
+@_handler("bytecblock")
+def _bytecblock(ev: _Evaluator, ins: Instruction) -> None:
+    ev.bytec = list(ins.immediates)
+
+
+@_handler("intc", "intc_0", "intc_1", "intc_2", "intc_3")
+def _intc(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[0] if ins.op == "intc" else int(ins.op[-1])
+    if index >= len(ev.intc):
+        raise LogicError("intc index out of range", ins.line)
+    ev.push(ev.intc[index], ins.line)
+
+
+@_handler("bytec", "bytec_0", "bytec_1", "bytec_2", "bytec_3")
+def _bytec(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[0] if ins.op == "bytec" else int(ins.op[-1])
+    if index >= len(ev.bytec):
+        raise LogicError("bytec index out of range", ins.line)
+    ev.push(ev.bytec[index], ins.line)
+
+
+@_handler("pushint", "int", "pushbytes", "byte", "addr", "method")
+def _push(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(ins.immediates[0], ins.line)
+
+
+@_handler("pushints", "pushbytess")
+def _push_many(ev: _Evaluator, ins: Instruction) -> None:
+    for value in ins.immediates:
+        ev.push(value, ins.line)
+
+
+# flow control
+
+
+@_handler("err")
+def _err(ev: _Evaluator, ins: Instruction) -> None:
+    raise LogicError("err opcode executed", ins.line)
+
+
+@_handler("assert")
+def _assert(ev: _Evaluator, ins: Instruction) -> None:
+    if not ev.pop_uint(ins.line):
+        raise LogicError("assert failed", ins.line)
+
+
+@_handler("return")
+def _return(ev: _Evaluator, ins: Instruction) -> bool:
+    return bool(ev.pop_uint(ins.line))
+
+
+@_handler("bnz", "bz", "b")
+def _branch(ev: _Evaluator, ins: Instruction) -> None:
+    if ins.op == "b":
+        ev.jump(ins.immediates[0])
+        return
+    value = ev.pop_uint(ins.line)
+    if (value != 0) == (ins.op == "bnz"):
+        ev.jump(ins.immediates[0])
+
+
+@_handler("switch")
+def _switch(ev: _Evaluator, ins: Instruction) -> None:
+    index = ev.pop_uint(ins.line)
+    if index < len(ins.immediates):
+        ev.jump(ins.immediates[index])
+
+
+@_handler("match")
+def _match(ev: _Evaluator, ins: Instruction) -> None:
+    count = len(ins.immediates)
+    target = ev.pop(ins.line)
+    candidates = [ev.pop(ins.line) for _ in range(count)][::-1]
+    for index, candidate in enumerate(candidates):
+        if candidate == target:
+            ev.jump(ins.immediates[index])
+            return
+
+
+@_handler("callsub")
+def _callsub(ev: _Evaluator, ins: Instruction) -> None:
+    ev.frames.append(_Frame(return_index=ev.pc, stack_height=len(ev.stack)))
+    ev.jump(ins.immediates[0])
+
+
+@_handler("proto")
+def _proto(ev: _Evaluator, ins: Instruction) -> None:
+    frame = ev.frames[-1]
+    frame.args, frame.returns = ins.immediates
+    frame.has_proto = True
+    if len(ev.stack) < frame.args:
+        raise LogicError("proto arg count exceeds stack", ins.line)
+
+
+@_handler("retsub")
+def _retsub(ev: _Evaluator, ins: Instruction) -> None:
+    if not ev.frames:
+        raise LogicError("retsub with empty callstack", ins.line)
+    frame = ev.frames.pop()
+    if frame.has_proto:
+        base = frame.stack_height - frame.args
+        if len(ev.stack) < frame.stack_height + frame.returns:
+            raise LogicError("retsub with too few values on the stack", ins.line)
+        # the return values are the first locals, anything above them is dropped
+        returns = ev.stack[frame.stack_height : frame.stack_height + frame.returns]
+        del ev.stack[base:]
+        ev.stack.extend(returns)
+    ev.pc = frame.return_index
+
+
+@_handler("frame_dig", "frame_bury")
+def _frame(ev: _Evaluator, ins: Instruction) -> None:
+    frame = ev.frames[-1]
+    index = frame.stack_height + ins.immediates[0]
+    if index < 0 or index >= len(ev.stack):
+        raise LogicError("frame access out of range", ins.line)
+    if ins.op == "frame_dig":
+        ev.push(ev.stack[index], ins.line)
+    else:
+        value = ev.pop(ins.line)
+        ev.stack[index] = value
+
+
+# stack manipulation
+
+
+@_handler("pop")
+def _pop(ev: _Evaluator, ins: Instruction) -> None:
+    ev.pop(ins.line)
+
+
+@_handler("popn")
+def _popn(ev: _Evaluator, ins: Instruction) -> None:
+    for _ in range(ins.immediates[0]):
+        ev.pop(ins.line)
+
+
+@_handler("dup")
+def _dup(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop(ins.line)
+    ev.stack += [value, value]
+
+
+@_handler("dup2")
+def _dup2(ev: _Evaluator, ins: Instruction) -> None:
+    if len(ev.stack) < 2:
+        raise LogicError("stack underflow", ins.line)
+    ev.stack += ev.stack[-2:]
+
+
+@_handler("dupn")
+def _dupn(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop(ins.line)
+    ev.stack += [value] * (ins.immediates[0] + 1)
+
+
+@_handler("dig")
+def _dig(ev: _Evaluator, ins: Instruction) -> None:
+    depth = ins.immediates[0]
+    if depth >= len(ev.stack):
+        raise LogicError("dig beyond stack", ins.line)
+    ev.stack.append(ev.stack[-1 - depth])
+
+
+@_handler("bury")
+def _bury(ev: _Evaluator, ins: Instruction) -> None:
+    depth = ins.immediates[0]
+    value = ev.pop(ins.line)
+    if depth == 0 or depth > len(ev.stack):
+        raise LogicError("bury beyond stack", ins.line)
+    ev.stack[-depth] = value
+
+
+@_handler("swap")
+def _swap(ev: _Evaluator, ins: Instruction) -> None:
+    b = ev.pop(ins.line)
+    a = ev.pop(ins.line)
+    ev.stack += [b, a]
+
+
+@_handler("select")
+def _select(ev: _Evaluator, ins: Instruction) -> None:
+    condition = ev.pop_uint(ins.line)
+    b = ev.pop(ins.line)
+    a = ev.pop(ins.line)
+    ev.stack.append(b if condition else a)
+
+
+@_handler("cover")
+def _cover(ev: _Evaluator, ins: Instruction) -> None:
+    depth = ins.immediates[0]
+    if depth >= len(ev.stack):
+        raise LogicError("cover beyond stack", ins.line)
+    value = ev.stack.pop()
+    ev.stack.insert(len(ev.stack) - depth, value)
+
+
+@_handler("uncover")
+def _uncover(ev: _Evaluator, ins: Instruction) -> None:
+    depth = ins.immediates[0]
+    if depth >= len(ev.stack):
+        raise LogicError("uncover beyond stack", ins.line)
+    ev.stack.append(ev.stack.pop(-1 - depth))
+
+
+@_handler("load")
+def _load(ev: _Evaluator, ins: Instruction) -> None:
+    ev.stack.append(ev.scratch[ins.immediates[0]])
+
+
+@_handler("store")
+def _store(ev: _Evaluator, ins: Instruction) -> None:
+    ev.scratch[ins.immediates[0]] = ev.pop(ins.line)
+
+
+@_handler("loads")
+def _loads(ev: _Evaluator, ins: Instruction) -> None:
+    ev.stack.append(ev.scratch[ev.pop_uint(ins.line)])
+
+
+@_handler("stores")
+def _stores(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop(ins.line)
+    ev.scratch[ev.pop_uint(ins.line)] = value
+
+
+# byte manipulation
+
+
+@_handler("concat")
+def _concat(ev: _Evaluator, ins: Instruction) -> None:
+    b = ev.pop_bytes(ins.line)
+    a = ev.pop_bytes(ins.line)
+    ev.push(a + b, ins.line)
+
+
+def _checked_slice(value: bytes, start: int, end: int, ins: Instruction) -> bytes:
+    if start > end or end > len(value):
+        raise LogicError(f"{ins.op} range beyond length of bytes", ins.line)
+    return value[start:end]
+
+
+@_handler("substring")
+def _substring(ev: _Evaluator, ins: Instruction) -> None:
+    start, end = ins.immediates
+    ev.push(_checked_slice(ev.pop_bytes(ins.line), start, end, ins), ins.line)
+
+
+@_handler("substring3")
+def _substring3(ev: _Evaluator, ins: Instruction) -> None:
+    end = ev.pop_uint(ins.line)
+    start = ev.pop_uint(ins.line)
+    ev.push(_checked_slice(ev.pop_bytes(ins.line), start, end, ins), ins.line)
+
+
+@_handler("extract")
+def _extract(ev: _Evaluator, ins: Instruction) -> None:
+    start, length = ins.immediates
+    value = ev.pop_bytes(ins.line)
+    end = len(value) if length == 0 else start + length
+    ev.push(_checked_slice(value, start, end, ins), ins.line)
+
+
+@_handler("extract3")
+def _extract3(ev: _Evaluator, ins: Instruction) -> None:
+    length = ev.pop_uint(ins.line)
+    start = ev.pop_uint(ins.line)
+    value = ev.pop_bytes(ins.line)
+    ev.push(_checked_slice(value, start, start + length, ins), ins.line)
+
+
+@_handler("extract_uint16", "extract_uint32", "extract_uint64")
+def _extract_uint(ev: _Evaluator, ins: Instruction) -> None:
+    size = int(ins.op[len("extract_uint") :]) // 8
+    start = ev.pop_uint(ins.line)
+    value = ev.pop_bytes(ins.line)
+    ev.push(
+        int.from_bytes(_checked_slice(value, start, start + size, ins), "big"),
+        ins.line,
+    )
+
+
+@_handler("replace2", "replace3")
+def _replace(ev: _Evaluator, ins: Instruction) -> None:
+    replacement = ev.pop_bytes(ins.line)
+    start = ins.immediates[0] if ins.op == "replace2" else ev.pop_uint(ins.line)
+    value = ev.pop_bytes(ins.line)
+    if start + len(replacement) > len(value):
+        raise LogicError("replacement end exceeds array", ins.line)
+    ev.push(value[:start] + replacement + value[start + len(replacement) :], ins.line)
+
+
+@_handler("getbyte")
+def _getbyte(ev: _Evaluator, ins: Instruction) -> None:
+    index = ev.pop_uint(ins.line)
+    value = ev.pop_bytes(ins.line)
+    if index >= len(value):
+        raise LogicError("getbyte index beyond array length", ins.line)
+    ev.push(value[index], ins.line)
+
+
+@_handler("setbyte")
+def _setbyte(ev: _Evaluator, ins: Instruction) -> None:
+    byte = ev.pop_uint(ins.line)
+    index = ev.pop_uint(ins.line)
+    value = bytearray(ev.pop_bytes(ins.line))
+    if index >= len(value) or byte > 255:
+        raise LogicError("setbyte out of range", ins.line)
+    value[index] = byte
+    ev.push(bytes(value), ins.line)
+
+
+@_handler("getbit")
+def _getbit(ev: _Evaluator, ins: Instruction) -> None:
+    index = ev.pop_uint(ins.line)
+    value = ev.pop(ins.line)
+    if isinstance(value, int):
+        if index >= 64:
+            raise LogicError("getbit index beyond uint64", ins.line)
+        ev.push((value >> index) & 1, ins.line)
+        return
+    if index >= len(value) * 8:
+        raise LogicError("getbit index beyond byte array", ins.line)
+    ev.push((value[index // 8] >> (7 - index % 8)) & 1, ins.line)
+
+
+@_handler("setbit")
+def _setbit(ev: _Evaluator, ins: Instruction) -> None:
+    bit = ev.pop_uint(ins.line)
+    index = ev.pop_uint(ins.line)
+    value = ev.pop(ins.line)
+    if bit > 1:
+        raise LogicError("setbit value must be 0 or 1", ins.line)
+    if isinstance(value, int):
+        if index >= 64:
+            raise LogicError("setbit index beyond uint64", ins.line)
+        ev.push(value | (1 << index) if bit else value & ~(1 << index), ins.line)
+        return
+    if index >= len(value) * 8:
+        raise LogicError("setbit index beyond byte array", ins.line)
+    array = bytearray(value)
+    mask = 1 << (7 - index % 8)
+    array[index // 8] = array[index // 8] | mask if bit else array[index // 8] & ~mask
+    ev.push(bytes(array), ins.line)
+
+
+# transaction and global fields
+
+
+@_handler("txn", "txna", "txnas")
+def _txn(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[1] if ins.op == "txna" else None
+    if ins.op == "txnas":
+        index = ev.pop_uint(ins.line)
+    ev.push(ev.txn_field(ev.txn, ins.immediates[0], index), ins.line)
+
+
+@_handler("gtxn", "gtxna", "gtxnas")
+def _gtxn(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[2] if ins.op == "gtxna" else None
+    if ins.op == "gtxnas":
+        index = ev.pop_uint(ins.line)
+    txn = ev.group[ins.immediates[0]]
+    ev.push(ev.txn_field(txn, ins.immediates[1], index), ins.line)
+
+
+@_handler("gtxns", "gtxnsa", "gtxnsas")
+def _gtxns(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[1] if ins.op == "gtxnsa" else None
+    if ins.op == "gtxnsas":
+        index = ev.pop_uint(ins.line)
+    group_index = ev.pop_uint(ins.line)
+    if group_index >= len(ev.group):
+        raise LogicError("gtxns index beyond group", ins.line)
+    ev.push(ev.txn_field(ev.group[group_index], ins.immediates[0], index), ins.line)
+
+
+@_handler("global")
+def _global(ev: _Evaluator, ins: Instruction) -> None:
+    ev.push(ev.global_field(ins.immediates[0]), ins.line)
+
+
+@_handler("log")
+def _log(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop_bytes(ins.line)
+    ev.log_bytes += len(value)
+    if len(ev.result.logs) >= MAX_LOG_CALLS or ev.log_bytes > MAX_LOG_BYTES:
+        raise LogicError("too many log calls or bytes", ins.line)
+    ev.result.logs.append(value)
+    ev.txn.fields.setdefault("Logs", []).append(value)
+
+
+# state
+
+
+@_handler("app_global_get")
+def _app_global_get(ev: _Evaluator, ins: Instruction) -> None:
+    key = ev.pop_bytes(ins.line)
+    ev.push(ev.app.global_state.get(key, 0), ins.line)
+
+
+@_handler("app_global_get_ex")
+def _app_global_get_ex(ev: _Evaluator, ins: Instruction) -> None:
+    key = ev.pop_bytes(ins.line)
+    app_id = ev.resolve_app(ev.pop(ins.line), ins.line)
+    app = ev.ledger.apps.get(app_id)
+    value = app.global_state.get(key) if app else None
+    ev.push(0 if value is None else value, ins.line)
+    ev.push(int(value is not None), ins.line)
+
+
+@_handler("app_global_put")
+def _app_global_put(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop(ins.line)
+    key = ev.pop_bytes(ins.line)
+    if len(key) > 64 or (isinstance(value, bytes) and len(key) + len(value) > 128):
+        raise LogicError("global state key/value too long", ins.line)
+    state = dict(ev.app.global_state)
+    state[key] = value
+    uints = sum(1 for v in state.values() if isinstance(v, int))
+    if (
+        uints > ev.app.global_num_uints
+        or len(state) - uints > ev.app.global_num_byte_slices
+    ):
+        raise LogicError("store exceeds global state schema", ins.line)
+    ev.app.global_state[key] = value
+
+
+@_handler("app_global_del")
+def _app_global_del(ev: _Evaluator, ins: Instruction) -> None:
+    ev.app.global_state.pop(ev.pop_bytes(ins.line), None)
+
+
+@_handler("balance", "min_balance")
+def _balance(ev: _Evaluator, ins: Instruction) -> None:
+    address = ev.resolve_account(ev.pop(ins.line), ins.line)
+    account = ev.ledger.accounts.get(address)
+    if ins.op == "balance":
+        ev.push(account.balance if account else 0, ins.line)
+    else:
+        ev.push(ev.ledger.min_balance(address), ins.line)
+
+
+@_handler("box_create")
+def _box_create(ev: _Evaluator, ins: Instruction) -> None:
+    size = ev.pop_uint(ins.line)
+    name = ev.pop_bytes(ins.line)
+    existing = ev.box(name, ins.line)
+    if size > 32768:
+        raise LogicError("box size too large", ins.line)
+    if existing is not None:
+        if len(existing) != size:
+            raise LogicError("box size mismatch", ins.line)
+        ev.push(0, ins.line)
+        return
+    ev.use_box(name, size, ins.line)
+    ev.app.boxes[name] = bytearray(size)
+    ev.push(1, ins.line)
+
+
+def _existing_box(ev: _Evaluator, name: bytes, ins: Instruction) -> bytearray:
+    box = ev.box(name, ins.line)
+    if box is None:
+        raise LogicError(f"no such box {name!r}", ins.line)
+    return box
+
+
+@_handler("box_extract")
+def _box_extract(ev: _Evaluator, ins: Instruction) -> None:
+    length = ev.pop_uint(ins.line)
+    start = ev.pop_uint(ins.line)
+    box = _existing_box(ev, ev.pop_bytes(ins.line), ins)
+    if start + length > len(box):
+        raise LogicError("box_extract range beyond box", ins.line)
+    ev.push(bytes(box[start : start + length]), ins.line)
+
+
+@_handler("box_replace")
+def _box_replace(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop_bytes(ins.line)
+    start = ev.pop_uint(ins.line)
+    box = _existing_box(ev, ev.pop_bytes(ins.line), ins)
+    if start + len(value) > len(box):
+        raise LogicError("box_replace range beyond box", ins.line)
+    box[start : start + len(value)] = value
+
+
+@_handler("box_del")
+def _box_del(ev: _Evaluator, ins: Instruction) -> None:
+    name = ev.pop_bytes(ins.line)
+    existed = ev.box(name, ins.line) is not None
+    ev.app.boxes.pop(name, None)
+    ev.push(int(existed), ins.line)
+
+
+@_handler("box_len")
+def _box_len(ev: _Evaluator, ins: Instruction) -> None:
+    box = ev.box(ev.pop_bytes(ins.line), ins.line)
+    ev.push(len(box) if box is not None else 0, ins.line)
+    ev.push(int(box is not None), ins.line)
+
+
+@_handler("box_get")
+def _box_get(ev: _Evaluator, ins: Instruction) -> None:
+    box = ev.box(ev.pop_bytes(ins.line), ins.line)
+    ev.push(bytes(box) if box is not None else b"", ins.line)
+    ev.push(int(box is not None), ins.line)
+
+
+@_handler("box_put")
+def _box_put(ev: _Evaluator, ins: Instruction) -> None:
+    value = ev.pop_bytes(ins.line)
+    name = ev.pop_bytes(ins.line)
+    box = ev.box(name, ins.line)
+    if box is not None and len(box) != len(value):
+        raise LogicError("box_put size mismatch", ins.line)
+    ev.use_box(name, len(value), ins.line)
+    ev.app.boxes[name] = bytearray(value)
+
+
+# inner transactions
+
+
+@_handler("itxn_begin")
+def _itxn_begin(ev: _Evaluator, ins: Instruction) -> None:
+    if ev.inner_group is not None:
+        raise LogicError("itxn_begin without itxn_submit", ins.line)
+    ev.inner_group = [_new_inner(ev)]
+
+
+@_handler("itxn_next")
+def _itxn_next(ev: _Evaluator, ins: Instruction) -> None:
+    if ev.inner_group is None:
+        raise LogicError("itxn_next without itxn_begin", ins.line)
+    ev.inner_group.append(_new_inner(ev))
+
+
+def _new_inner(ev: _Evaluator) -> Transaction:
+    return Transaction({"Sender": ev.app.address, "Fee": None})
+
+
+@_handler("itxn_field")
+def _itxn_field(ev: _Evaluator, ins: Instruction) -> None:
+    if ev.inner_group is None:
+        raise LogicError("itxn_field without itxn_begin", ins.line)
+    name = ins.immediates[0]
+    value = ev.pop(ins.line)
+    txn = ev.inner_group[-1]
+    if name == "TypeEnum":
+        names = {v: k for k, v in _TYPE_ENUMS.items()}
+        txn.fields["Type"] = names[_uint(value, ins.line)].encode()
+    elif name in _ARRAY_FIELDS:
+        txn.fields.setdefault(name, []).append(value)
+    else:
+        txn.fields[name] = value
+
+
+@_handler("itxn_submit")
+def _itxn_submit(ev: _Evaluator, ins: Instruction) -> None:
+    ev.submit_inner(ins.line)
+
+
+@_handler("itxn", "itxna", "itxnas")
+def _itxn(ev: _Evaluator, ins: Instruction) -> None:
+    if not ev.last_inner:
+        raise LogicError("no inner transaction has been submitted", ins.line)
+    index = ins.immediates[1] if ins.op == "itxna" else None
+    if ins.op == "itxnas":
+        index = ev.pop_uint(ins.line)
+    ev.push(_inner_field(ev.last_inner[-1], ins.immediates[0], index), ins.line)
+
+
+@_handler("gitxn", "gitxna", "gitxnas")
+def _gitxn(ev: _Evaluator, ins: Instruction) -> None:
+    index = ins.immediates[2] if ins.op == "gitxna" else None
+    if ins.op == "gitxnas":
+        index = ev.pop_uint(ins.line)
+    result = ev.last_inner[ins.immediates[0]]
+    ev.push(_inner_field(result, ins.immediates[1], index), ins.line)
+
+
+def _inner_field(result: TransactionResult, name: str, index: int | None) -> StackValue:
+    if name == "CreatedApplicationID":
+        return result.created_app_id
+    if name == "CreatedAssetID":
+        return result.created_asset_id
+    return result.transaction.get(name, index)
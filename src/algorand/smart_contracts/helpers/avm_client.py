@@ -0,0 +1,202 @@
+import base64
+from collections.abc import Iterable
+from typing import Any
+
+from algosdk import abi, encoding, transaction
+from algosdk.error import AlgodHTTPError
+
+from smart_contracts.helpers.avm import (
+    GroupResult,
+    Ledger,
+    Transaction,
+    TransactionResult,
+    app_address,
+)
+
+__all__ = [
+    "AppClient",
+    "CallResult",
+    "LedgerAlgodClient",
+    "suggested_params",
+    "to_avm_transaction",
+]
+
+CallResult = tuple[Any, TransactionResult, GroupResult]
+
+
+class AppClient:
+    """Calls the ABI methods of an ARC-32 app spec (i.e. an `application.json`)
+    against a Ledger, mirroring how the dapps call the deployed app"""
+
+    def __init__(
+        self,
+        ledger: Ledger,
+        app_spec: dict,
+        template_values: dict[str, int] | None = None,
+    ):
+        self.ledger = ledger
+        self.app_spec = app_spec
+        self.contract = abi.Contract.undictify(app_spec["contract"])
+        self.template_values = template_values or {}
+        self.app_id = 0
+
+    @property
+    def address(self) -> bytes:
+        return app_address(self.app_id)
+
+    def method(self, name: str) -> abi.Method:
+        return self.contract.get_method_by_name(name)
+
+    def call(
+        self,
+        sender: bytes,
+        name: str,
+        *args: Any,
+        boxes: Iterable[tuple[int, bytes]] | None = None,
+        fee: int | None = None,
+        extra_txns: Iterable[Transaction] = (),
+        create: bool = False,
+    ) -> CallResult:
+        """Calls method `name` in a group preceded by `extra_txns` and any
+        transaction arguments, returning the decoded return value along with
+        the results for the app call and the whole group"""
+        method = self.method(name)
+        group = list(extra_txns)
+        app_args = [method.get_selector()]
+        accounts: list[bytes] = []
+        apps: list[int] = []
+        for arg, value in zip(method.args, args, strict=True):
+            if abi.is_abi_transaction_type(arg.type):
+                group.append(value)
+            elif arg.type == abi.ABIReferenceType.APPLICATION:
+                if value != self.app_id:
+                    apps.append(value)
+                app_args.append(bytes([len(apps) if value != self.app_id else 0]))
+            elif arg.type == abi.ABIReferenceType.ACCOUNT:
+                accounts.append(value)
+                app_args.append(bytes([len(accounts)]))
+            else:
+                app_args.append(arg.type.encode(value))
+        group.append(
+            Transaction.app_call(
+                sender,
+                0 if create else self.app_id,
+                app_args,
+                accounts=accounts,
+                apps=apps,
+                boxes=boxes,
+                fee=fee,
+                **(self._create_fields() if create else {}),
+            )
+        )
+        group_result = self.ledger.execute(group)
+        call_result = group_result.transactions[-1]
+        if create:
+            self.app_id = call_result.created_app_id
+        value = None
+        return_type = method.returns.type
+        if call_result.return_value is not None and isinstance(
+            return_type, abi.ABIType
+        ):
+            value = return_type.decode(call_result.return_value)
+        return value, call_result, group_result
+
+    def register_programs(self) -> tuple[bytes, bytes]:
+        """Registers the app's programs with the ledger, which is needed for
+        apps that are created by inner transactions, e.g. the OpUp app"""
+        source = self.app_spec["source"]
+        approval = self.ledger.register_program(
+            base64.b64decode(source["approval"]).decode(), self.template_values
+        )
+        clear = self.ledger.register_program(base64.b64decode(source["clear"]).decode())
+        return approval, clear
+
+    def _create_fields(self) -> dict[str, Any]:
+        approval, clear = self.register_programs()
+        pages = [approval[i : i + 2048] for i in range(0, len(approval), 2048)]
+        global_schema = self.app_spec["state"]["global"]
+        return {
+            "ApprovalProgramPages": pages,
+            "ClearStateProgram": clear,
+            "GlobalNumUint": global_schema["num_uints"],
+            "GlobalNumByteSlice": global_schema["num_byte_slices"],
+            "ExtraProgramPages": len(pages) - 1,
+        }
+
+
+class LedgerAlgodClient:
+    """Answers the algod queries the off-chain tooling makes from a Ledger, in
+    the shape algod's REST API returns them, so it can stand in for an
+    AlgodClient in tests"""
+
+    def __init__(self, ledger: Ledger):
+        self.ledger = ledger
+        #: The number of queries made, to check what's being cached
+        self.request_count = 0
+
+    def application_info(self, application_id: int) -> dict[str, Any]:
+        self.request_count += 1
+        app = self.ledger.apps.get(application_id)
+        if app is None:
+            raise AlgodHTTPError("application does not exist", 404)
+        global_state = [
+            {
+                "key": base64.b64encode(key).decode(),
+                "value": (
+                    {"type": 1, "bytes": base64.b64encode(value).decode()}
+                    if isinstance(value, bytes)
+                    else {"type": 2, "uint": value}
+                ),
+            }
+            for key, value in app.global_state.items()
+        ]
+        return {"id": app.id, "params": {"global-state": global_state}}
+
+    def application_box_by_name(
+        self, application_id: int, box_name: bytes
+    ) -> dict[str, Any]:
+        self.request_count += 1
+        app = self.ledger.apps.get(application_id)
+        value = app.boxes.get(box_name) if app else None
+        if value is None:
+            raise AlgodHTTPError("box not found", 404)
+        return {
+            "name": base64.b64encode(box_name).decode(),
+            "value": base64.b64encode(value).decode(),
+            "round": self.ledger.round,
+        }
+
+
+def to_avm_transaction(txn: transaction.Transaction) -> Transaction:
+    """The AVM equivalent of a payment or app call built with algosdk"""
+    sender = encoding.decode_address(txn.sender)
+    if isinstance(txn, transaction.PaymentTxn):
+        return Transaction.payment(
+            sender, encoding.decode_address(txn.receiver), txn.amt, txn.fee
+        )
+    assert isinstance(txn, transaction.ApplicationCallTxn)
+    foreign_apps = txn.foreign_apps or []
+    return Transaction.app_call(
+        sender,
+        txn.index,
+        txn.app_args or [],
+        apps=foreign_apps,
+        accounts=[encoding.decode_address(a) for a in txn.accounts or []],
+        boxes=[
+            (foreign_apps[box.app_index - 1] if box.app_index else 0, box.name)
+            for box in txn.boxes or []
+        ],
+        fee=txn.fee,
+    )
+
+
+def suggested_params(ledger: Ledger, fee: int = 0) -> transaction.SuggestedParams:
+    """Params to build transactions with algosdk for the ledger, which doesn't
+    check validity rounds or the genesis hash"""
+    return transaction.SuggestedParams(
+        fee=fee,
+        first=ledger.round,
+        last=ledger.round + 1000,
+        gh=base64.b64encode(bytes(32)).decode(),
+        flat_fee=True,
+    )
@@ -1,21 +1,171 @@
+import base64
+import dataclasses
+import hashlib
+import json
 import logging
+from importlib import metadata
 from pathlib import Path
-from shutil import rmtree
+from tempfile import TemporaryDirectory
+from typing import Any
+
+import beaker.lib
 from algokit_utils import (
+    ApplicationSpecification,
     get_algod_client,
+    replace_template_variables,
 )
-
+from algosdk.v2client.algod import AlgodClient
 from beaker import Application
 
+from smart_contracts.helpers.assembler import assemble
+from smart_contracts.helpers.files import write_atomic
+from smart_contracts.helpers.teal_profile import (
+    diff_profiles,
+    profile_program,
+    python_functions,
+)
+
 logger = logging.getLogger(__name__)
 
+# Written into each app's output directory, see build_hash
+BUILD_HASH_FILE = ".build_hash"
+# Written into each app's output directory, see teal_profile.py
+PROFILE_FILE = "approval.profile.json"
+_package_root = Path(__file__).parent.parent
+
+
+class OfflineAlgodClient(AlgodClient):
+    """Stands in for algod while building so that precompiled apps (e.g. the
+    OpUp app) are assembled locally rather than by a running node"""
+
+    def __init__(self) -> None:
+        super().__init__(algod_token="", algod_address="")
+
+    def compile(  # noqa: A003
+        self, source: str, source_map: bool = False, **kwargs: Any  # noqa: FBT
+    ) -> dict[str, Any]:
+        program = assemble(source)
+        result: dict[str, Any] = {
+            "hash": program.address,
+            "result": base64.b64encode(program.bytecode).decode(),
+        }
+        if source_map:
+            result["sourcemap"] = program.source_map()
+        return result
+
+
+def build_hash(app: Application, *, compile_with_algod: bool = False) -> str:
+    """Hash of everything that can change the artifacts of an app: the PyTeal
+    source of the smart_contracts package, the versions of the libraries doing
+    the compilation/export, the app's build options and the build mode"""
+    digest = hashlib.sha256()
+    for path in sorted(_package_root.rglob("*.py")):
+        digest.update(path.relative_to(_package_root).as_posix().encode())
+        digest.update(path.read_bytes())
+    for package in ("beaker-pyteal", "pyteal", "algokit-utils"):
+        digest.update(f"{package}=={metadata.version(package)}".encode())
+    build_options = dataclasses.asdict(app.build_options)
+    digest.update(
+        json.dumps(
+            {
+                "name": app.name,
+                "build_options": build_options,
+                "compile_with_algod": compile_with_algod,
+            },
+            sort_keys=True,
+        ).encode()
+    )
+    return digest.hexdigest()
 
-def build(output_dir: Path, app: Application) -> Path:
+
+def build(
+    output_dir: Path,
+    app: Application,
+    *,
+    compile_with_algod: bool = False,
+    force: bool = False,
+) -> Path:
     output_dir = output_dir.resolve()
-    if output_dir.exists():
-        rmtree(output_dir)
-    output_dir.mkdir(exist_ok=True, parents=True)
+    app_spec_path = output_dir / "application.json"
+    hash_path = output_dir / BUILD_HASH_FILE
+    current_hash = build_hash(app, compile_with_algod=compile_with_algod)
+    if (
+        not force
+        and app_spec_path.exists()
+        and hash_path.exists()
+        and hash_path.read_text() == current_hash
+    ):
+        logger.info(f"{app.name} is unchanged, skipping")
+        return app_spec_path
+
     logger.info(f"Exporting {app.name} to {output_dir}")
-    specification = app.build(get_algod_client())
-    specification.export(output_dir)
-    return output_dir / "application.json"
+    with TemporaryDirectory() as staging:
+        specification = app.build(OfflineAlgodClient())
+        specification.export(Path(staging))
+        profile = profile_approval(specification)
+        (Path(staging) / PROFILE_FILE).write_text(json.dumps(profile, indent=4) + "\n")
+        if (output_dir / PROFILE_FILE).exists():
+            old_profile = json.loads((output_dir / PROFILE_FILE).read_text())
+            for change in diff_profiles(old_profile, profile):
+                logger.info(f"Profile change: {change}")
+        if compile_with_algod:
+            compile_programs(Path(staging), specification)
+        sync_artifacts(Path(staging), output_dir)
+    write_atomic(hash_path, current_hash.encode())
+    return app_spec_path
+
+
+def profile_approval(specification: ApplicationSpecification) -> dict[str, Any]:
+    """Profiles the approval program, mapping its sections back to the functions
+    in this package's PyTeal modules and Beaker's library they were built from"""
+    teal = replace_template_variables(
+        specification.approval_program, {"UPDATABLE": 0, "DELETABLE": 0}
+    )
+    sources = [
+        path
+        for path in sorted(_package_root.rglob("*.py"))
+        if "import pyteal" in path.read_text()
+    ]
+    sources += sorted(Path(beaker.lib.__file__).parent.rglob("*.py"))
+    return profile_program(teal, python_functions(sources))
+
+
+def sync_artifacts(source_dir: Path, output_dir: Path) -> None:
+    """Makes output_dir match source_dir, only touching files whose contents
+    changed so that identical artifacts keep their timestamps"""
+    output_dir.mkdir(exist_ok=True, parents=True)
+    exported = {path.name for path in source_dir.iterdir()}
+    for existing in output_dir.iterdir():
+        if existing.name not in exported and existing.name != BUILD_HASH_FILE:
+            logger.info(f"Removing stale {existing.name}")
+            existing.unlink()
+    for name in sorted(exported):
+        content = (source_dir / name).read_bytes()
+        target = output_dir / name
+        if target.exists() and target.read_bytes() == content:
+            continue
+        logger.info(f"Writing {name}")
+        write_atomic(target, content)
+
+
+def compile_programs(output_dir: Path, specification: ApplicationSpecification) -> None:
+    """Compiles the exported TEAL with algod, writing source maps next to it and
+    checking algod agrees with the offline assembler"""
+    algod_client = get_algod_client()
+    programs = {
+        "approval": specification.approval_program,
+        "clear": specification.clear_program,
+    }
+    for name, teal in programs.items():
+        # template values don't change the layout of the program, so compiling
+        # with them zeroed gives a source map that holds for any deployment
+        teal = replace_template_variables(teal, {"UPDATABLE": 0, "DELETABLE": 0})
+        logger.info(f"Compiling {name} program with algod")
+        result = algod_client.compile(teal, source_map=True)
+        if base64.b64decode(result["result"]) != assemble(teal).bytecode:
+            raise Exception(
+                f"algod compiled the {name} program differently to the offline build"
+            )
+        (output_dir / f"{name}.teal.map").write_text(
+            json.dumps(result["sourcemap"], indent=4)
+        )
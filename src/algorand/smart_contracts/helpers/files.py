@@ -0,0 +1,13 @@
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """Writes via a temporary file and rename so readers never see a partially
+    written file, e.g. an artifact while parallel builds are running"""
+    with NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f:
+        f.write(content)
+    os.replace(f.name, path)
@@ -0,0 +1,310 @@
+"""Profiles where the bytes and opcode budget of a TEAL program go.
+
+The program is split into sections, the way PyTeal and Beaker lay it out:
+
+- constants: the intcblock and bytecblock
+- router: the method selector dispatch and bare calls
+- router/{method}: decoding a method's arguments and encoding its return value
+- {method} and {subroutine}: the body of each ABI method and subroutine, with
+  its `_l{n}` labels
+
+Each section gets its size in bytes as assembled, its number of ops and its
+static cost (the cost of each op summed once, so branches are over counted and
+loops are counted for a single iteration), the subroutines it calls and the
+Python function it was built from. Loops (the code between a label and a later
+branch back to it) are listed under the section they're in with the cost of an
+iteration, since that's where most of the budget of vote and close goes.
+
+The profile is a JSON document with sections in program order, so it's
+diffable between builds with `diff_profiles` (or git, as build() writes it to
+the artifacts as approval.profile.json).
+"""
+
+import ast
+import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from smart_contracts.helpers.assembler import TealLine
+
+__all__ = [
+    "diff_profiles",
+    "format_profile",
+    "profile_program",
+    "python_functions",
+]
+
+#: Ops that can jump to their label arguments
+_JUMPS = ("b", "bz", "bnz", "switch", "match")
+#: Ops that never continue to the next instruction
+_TERMINATORS = ("b", "return", "retsub", "err")
+_SUBLABEL = re.compile(r"^(?P<section>.+)_l\d+$")
+_DISPATCH = re.compile(r'^\s*pushbytes 0x[0-9a-fA-F]+ // "(?P<signature>[^"]+)"')
+
+
+def _normalise(name: str) -> str:
+    """A function name the way PyTeal names its subroutine labels"""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def python_functions(paths: Iterable[Path]) -> dict[str, str]:
+    """Maps the normalised name of each function defined in the files to where
+    it's defined, e.g. "getpreconditions" to "voting.py:412". Where names clash
+    the file given first wins, so that a package's own subroutines win over a
+    library's of the same name, and within a file the first decorated
+    definition wins, since subroutines and methods are declared with decorators"""
+    functions: dict[str, str] = {}
+    for path in paths:
+        found: dict[str, str] = {}
+        decorated: set[str] = set()
+        for node in ast.walk(ast.parse(path.read_text(), str(path))):
+            if not isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+                continue
+            name = _normalise(node.name)
+            if name not in decorated and (node.decorator_list or name not in found):
+                found[name] = f"{path.name}:{node.lineno}"
+                if node.decorator_list:
+                    decorated.add(name)
+        functions = found | functions
+    return functions
+
+
+def profile_program(
+    teal: str, functions: dict[str, str] | None = None
+) -> dict[str, Any]:
+    """Profiles TEAL, which must have had its template variables replaced.
+    `functions` is from `python_functions`, to map sections to their source"""
+    # imported here so that reading and formatting a profile doesn't need PyTeal
+    from smart_contracts.helpers.assembler import TealLine, assemble, parse_teal
+    from smart_contracts.helpers.avm import OPCODE_COSTS
+
+    functions = functions or {}
+    program = assemble(teal)
+    pcs = sorted(program.pc_to_line)
+    sizes = {
+        program.pc_to_line[pc]: end - pc
+        for pc, end in zip(pcs, [*pcs[1:], len(program.bytecode)], strict=True)
+    }
+    # the version at the start of the program is counted with the constants
+    sizes[min(sizes)] += pcs[0]
+    # methods are dispatched by comparing the selector with a pushbytes that's
+    # commented with the signature, then branching to the code decoding it
+    dispatch: dict[str, str] = {}
+    raw_lines = teal.splitlines()
+    for index, raw in enumerate(raw_lines[:-2]):
+        match = _DISPATCH.match(raw)
+        if (
+            match
+            and "(" in match["signature"]
+            and raw_lines[index + 1].strip() == "=="
+            and raw_lines[index + 2].startswith("bnz ")
+        ):
+            dispatch[raw_lines[index + 2].split()[1]] = match["signature"].split("(")[0]
+    method_labels = {_normalise(name) for name in dispatch.values()}
+
+    sections: dict[str, dict[str, Any]] = {}
+    # the index of the instruction each label is at
+    labels: dict[str, int] = {}
+    instructions: list[TealLine] = []
+    owner: list[str] = []
+    current = "router"
+    for line in parse_teal(teal)[1:]:
+        if line.op.endswith(":") and not line.args:
+            label = line.op[:-1]
+            labels[label] = len(instructions)
+            sublabel = _SUBLABEL.match(label)
+            if label in dispatch:
+                current = f"router/{dispatch[label]}"
+            elif label.startswith("main"):
+                current = "router"
+            elif not (sublabel and sublabel["section"] in sections):
+                current = label
+            sections.setdefault(current, _section(current, line.line, method_labels))
+            continue
+        name = "constants" if line.op in ("intcblock", "bytecblock") else current
+        section = sections.setdefault(name, _section(name, line.line, method_labels))
+        section["ops"] += 1
+        section["bytes"] += sizes[line.line]
+        section["cost"] += OPCODE_COSTS.get(line.op, 1)
+        if line.op == "callsub" and line.args[0] not in section["calls"]:
+            section["calls"].append(line.args[0])
+        instructions.append(line)
+        owner.append(name)
+
+    for header, body in _loops(instructions, labels):
+        calls: list[str] = []
+        for index in body:
+            line = instructions[index]
+            if line.op == "callsub" and line.args[0] not in calls:
+                calls.append(line.args[0])
+        label = next(name for name, index in labels.items() if index == header)
+        sections[owner[header]]["loops"].append(
+            {
+                "label": label,
+                "line": instructions[header].line,
+                "ops": len(body),
+                "cost": sum(
+                    OPCODE_COSTS.get(instructions[index].op, 1) for index in body
+                ),
+                "calls": [_section_name(call) for call in calls],
+            }
+        )
+
+    for name, section in sections.items():
+        section["calls"] = [_section_name(call) for call in section["calls"]]
+        base = _section_name(name.removeprefix("router/"))
+        section["source"] = (
+            functions.get(_normalise(base))
+            if section["kind"] != "router" or base != name
+            else None
+        )
+        section["name"] = _section_name(name)
+    return {
+        "bytes": len(program.bytecode),
+        "ops": len(instructions),
+        "sections": [section for section in sections.values() if section["ops"]],
+    }
+
+
+def _loops(
+    instructions: list["TealLine"], labels: dict[str, int]
+) -> list[tuple[int, list[int]]]:
+    """The natural loops of the program, as the index of each loop's header
+    (the instruction branched back to) and the sorted indexes of its body.
+
+    A back edge is a branch to an instruction that every path to the branch
+    goes through (i.e. dominates it), and the loop's body is everything that
+    can reach the branch without passing through the header. Several back
+    edges to the same header (e.g. from a `continue`) make one loop"""
+    predecessors: list[list[int]] = [[] for _ in instructions]
+    # the program and each subroutine are entered from outside the graph
+    entries = {0} | {
+        labels[line.args[0]] for line in instructions if line.op == "callsub"
+    }
+    for index, line in enumerate(instructions):
+        if line.op in _JUMPS:
+            for arg in line.args:
+                predecessors[labels[arg]].append(index)
+        if line.op not in _TERMINATORS and index + 1 < len(instructions):
+            predecessors[index + 1].append(index)
+
+    # dominator sets as bitmasks, iterated to a fixed point
+    everything = (1 << len(instructions)) - 1
+    dominators = [
+        1 << index if index in entries else everything
+        for index in range(len(instructions))
+    ]
+    changed = True
+    while changed:
+        changed = False
+        for index in range(len(instructions)):
+            if index in entries:
+                continue
+            common = everything
+            for predecessor in predecessors[index]:
+                common &= dominators[predecessor]
+            updated = common | 1 << index
+            if updated != dominators[index]:
+                dominators[index] = updated
+                changed = True
+
+    back_edges: dict[int, list[int]] = {}
+    for index, line in enumerate(instructions):
+        if line.op in _JUMPS:
+            for arg in line.args:
+                if dominators[index] >> labels[arg] & 1:
+                    back_edges.setdefault(labels[arg], []).append(index)
+    loops = []
+    for header, sources in sorted(back_edges.items()):
+        body = {header}
+        stack = [source for source in sources if source != header]
+        while stack:
+            index = stack.pop()
+            if index not in body:
+                body.add(index)
+                stack.extend(predecessors[index])
+        loops.append((header, sorted(body)))
+    return loops
+
+
+def _section_name(label: str) -> str:
+    """The name of the method or subroutine at a label, without the counter
+    PyTeal adds to make labels unique"""
+    return re.sub(r"_\d+$", "", label)
+
+
+def _section(name: str, line: int, method_labels: set[str]) -> dict[str, Any]:
+    if name == "constants":
+        kind = "constants"
+    elif name.startswith("router"):
+        kind = "router"
+    elif _section_name(name) in method_labels:
+        kind = "method"
+    else:
+        kind = "subroutine"
+    return {
+        "name": name,
+        "kind": kind,
+        "line": line,
+        "bytes": 0,
+        "ops": 0,
+        "cost": 0,
+        "calls": [],
+        "loops": [],
+        "source": None,
+    }
+
+
+def format_profile(profile: dict[str, Any]) -> str:
+    """The profile as a table, a row per section followed by its loops"""
+    rows = [
+        f"{'section':<40} {'kind':<10} {'bytes':>6} {'ops':>5} {'cost':>5} "
+        f"{'source':<18} calls"
+    ]
+    for section in profile["sections"]:
+        rows.append(
+            f"{section['name']:<40} {section['kind']:<10} {section['bytes']:>6} "
+            f"{section['ops']:>5} {section['cost']:>5} "
+            f"{section['source'] or '-':<18} {', '.join(section['calls'])}".rstrip()
+        )
+        for loop in section["loops"]:
+            rows.append(
+                f"  loop at {loop['label'] + ' (TEAL ' + str(loop['line']) + ')':<29} "
+                f"{'':<10} {'':>6} {loop['ops']:>5} {loop['cost']:>5} "
+                f"{'per iteration':<18} {', '.join(loop['calls'])}".rstrip()
+            )
+    rows.append(f"{'total':<40} {'':<10} {profile['bytes']:>6} {profile['ops']:>5}")
+    return "\n".join(rows)
+
+
+def diff_profiles(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+    """A line per section whose bytes, ops or cost changed between profiles"""
+    metrics = ("bytes", "ops", "cost")
+    old_sections = {section["name"]: section for section in old["sections"]}
+    new_sections = {section["name"]: section for section in new["sections"]}
+    changes = []
+    for name in [*new_sections, *(n for n in old_sections if n not in new_sections)]:
+        before = old_sections.get(name, dict.fromkeys(metrics, 0))
+        after = new_sections.get(name, dict.fromkeys(metrics, 0))
+        deltas = {metric: after[metric] - before[metric] for metric in metrics}
+        if not any(deltas.values()):
+            continue
+        status = (
+            " (new)"
+            if name not in old_sections
+            else " (removed)" if name not in new_sections else ""
+        )
+        changes.append(
+            f"{name}{status}: "
+            + ", ".join(
+                f"{metric} {after[metric]} ({delta:+d})"
+                for metric, delta in deltas.items()
+            )
+        )
+    if old["bytes"] != new["bytes"]:
+        changes.append(
+            f"program: bytes {new['bytes']} ({new['bytes'] - old['bytes']:+d})"
+        )
+    return changes
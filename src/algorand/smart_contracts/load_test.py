@@ -0,0 +1,555 @@
+"""Load tests `vote` with a rush of synthetic voters.
+
+Deploys a voting round, then builds and signs a vote group (the box funding
+payment followed by the `vote` app call referencing the OpUp app) for each of N
+generated voters, signed into the round's snapshot where the vote type needs
+one, and submits the groups with up to `--concurrency` in flight. Reports the
+votes per second achieved, why any were rejected and submission latency
+percentiles. A share of deliberately invalid ballots can be mixed in with
+`--invalid` to check rejections are reported.
+
+The groups are submitted to either the in-process AVM (`--target avm`, the
+default, see helpers/avm.py), which evaluates one group at a time so mostly
+measures program cost, or to the algod configured in `.env`, e.g. LocalNet
+(`--target algod`), with the rounds deployed and voters funded from the
+LocalNet dispenser:
+
+    python -m smart_contracts.load_test [--target avm|algod] [--voters 200] \\
+        [--concurrency 32] [--vote-type 0|1|2|3|all] [--option-counts 3,1,4]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from itertools import pairwise
+from pathlib import Path
+from typing import Protocol
+
+import nacl.signing
+from algokit_utils import (
+    get_algod_client,
+    get_localnet_default_account,
+    replace_template_variables,
+)
+from algosdk import abi, account, encoding, logic, transaction
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+)
+from algosdk.v2client.algod import AlgodClient
+
+from smart_contracts.benchmark import APPS, AppFeatures
+from smart_contracts.helpers.avm import Ledger, LogicError, Transaction
+from smart_contracts.helpers.avm_client import (
+    AppClient,
+    suggested_params,
+    to_avm_transaction,
+)
+from smart_contracts.preconditions import decode_global_state
+from smart_contracts.vote_batch import bootstrap_min_balance, vote_min_balance
+
+logger = logging.getLogger(__name__)
+
+root_path = Path(__file__).parent
+artifact_path = root_path / "artifacts"
+
+VOTE_TYPES = {0: "no-snapshot", 1: "no-weighting", 2: "weighting", 3: "partitioned"}
+# The fees the dapps pay for each method
+CREATE_FEE = 1_000 + 4 * 1_000
+BOOTSTRAP_FEE = 2_000
+VOTE_FEE = 1_000 + 16 * 1_000
+VOTER_FUNDING = 1_000_000
+
+
+@dataclass
+class Voter:
+    private_key: str
+    address: str
+    weighting: int
+    signature: bytes
+
+    @property
+    def public_key(self) -> bytes:
+        return bytes(encoding.decode_address(self.address))
+
+
+@dataclass
+class Round:
+    app_id: int
+    opup_app_id: int
+    option_counts: list[int]
+    vote_type: int
+    method: abi.Method
+    packed_ballots: bool = False
+
+
+@dataclass
+class LoadReport:
+    vote_type: int
+    submitted: int = 0
+    accepted: int = 0
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    rejections: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def votes_per_second(self) -> float:
+        return self.accepted / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[
+            percent - 1
+        ]
+
+
+class Target(Protocol):
+    def deploy(
+        self,
+        app_spec: dict,
+        features: AppFeatures,
+        option_counts: list[int],
+        vote_type: int,
+        public_key: bytes,
+    ) -> tuple[int, int]:
+        """Creates and bootstraps a round, returning its app ID and OpUp app ID"""
+
+    def fund(self, addresses: Sequence[str]) -> None: ...
+
+    def suggested_params(self) -> transaction.SuggestedParams: ...
+
+    async def submit(
+        self, group: list[transaction.GenericSignedTransaction]
+    ) -> str | None:
+        """Submits a group, returning why it was rejected, if it was"""
+
+
+class AvmTarget:
+    """Evaluates groups with the in-process AVM, one at a time"""
+
+    def __init__(self) -> None:
+        self.ledger = Ledger()
+        self.creator = b"C" * 32
+        self.ledger.fund(self.creator, 10**12)
+        opup_spec = json.loads(
+            (artifact_path / "OpUpApp" / "application.json").read_text()
+        )
+        AppClient(self.ledger, opup_spec).register_programs()
+
+    def deploy(
+        self,
+        app_spec: dict,
+        features: AppFeatures,
+        option_counts: list[int],
+        vote_type: int,
+        public_key: bytes,
+    ) -> tuple[int, int]:
+        client = AppClient(self.ledger, app_spec, {"DELETABLE": 1})
+        client.call(
+            self.creator,
+            "create",
+            "load-test",
+            vote_type,
+            public_key,
+            "cid",
+            self.ledger.timestamp,
+            self.ledger.timestamp + 3600,
+            option_counts,
+            1,
+            "ipfs://image",
+            fee=CREATE_FEE,
+            create=True,
+        )
+        payment = Transaction.payment(
+            self.creator,
+            client.address,
+            bootstrap_min_balance(option_counts, features.tally_bytes),
+            1_000,
+        )
+        client.call(self.creator, "bootstrap", payment, fee=BOOTSTRAP_FEE)
+        opup_app_id = self.ledger.apps[client.app_id].global_state[b"ouaid"]
+        assert isinstance(opup_app_id, int)
+        return client.app_id, opup_app_id
+
+    def fund(self, addresses: Sequence[str]) -> None:
+        for address in addresses:
+            self.ledger.fund(encoding.decode_address(address), VOTER_FUNDING)
+
+    def suggested_params(self) -> transaction.SuggestedParams:
+        return suggested_params(self.ledger, 1_000)
+
+    async def submit(
+        self, group: list[transaction.GenericSignedTransaction]
+    ) -> str | None:
+        # yield so every submission in flight is queued like it would be by algod
+        await asyncio.sleep(0)
+        try:
+            self.ledger.execute(
+                [to_avm_transaction(stxn.transaction) for stxn in group]
+            )
+        except LogicError as ex:
+            return ex.comment or ex.reason
+        return None
+
+
+class AlgodTarget:
+    """Submits groups to algod, e.g. LocalNet, funding accounts from its
+    dispenser"""
+
+    def __init__(self, algod_client: AlgodClient):
+        self.algod_client = algod_client
+        self.dispenser = get_localnet_default_account(algod_client)
+        self.signer = AccountTransactionSigner(self.dispenser.private_key)
+
+    def deploy(
+        self,
+        app_spec: dict,
+        features: AppFeatures,
+        option_counts: list[int],
+        vote_type: int,
+        public_key: bytes,
+    ) -> tuple[int, int]:
+        contract = abi.Contract.undictify(app_spec["contract"])
+        programs = {}
+        for name in ("approval", "clear"):
+            teal = base64.b64decode(app_spec["source"][name]).decode()
+            teal = replace_template_variables(teal, {"UPDATABLE": 0, "DELETABLE": 1})
+            programs[name] = base64.b64decode(self.algod_client.compile(teal)["result"])
+        schema = app_spec["state"]["global"]
+        start = int(time.time())
+        atc = AtomicTransactionComposer()
+        atc.add_method_call(
+            app_id=0,
+            method=contract.get_method_by_name("create"),
+            sender=self.dispenser.address,
+            sp=self.fee_params(CREATE_FEE),
+            signer=self.signer,
+            method_args=[
+                "load-test",
+                vote_type,
+                public_key,
+                "cid",
+                start,
+                start + 3600,
+                option_counts,
+                1,
+                "ipfs://image",
+            ],
+            approval_program=programs["approval"],
+            clear_program=programs["clear"],
+            global_schema=transaction.StateSchema(
+                schema["num_uints"], schema["num_byte_slices"]
+            ),
+            local_schema=transaction.StateSchema(0, 0),
+            extra_pages=(len(programs["approval"]) - 1) // 2048,
+        )
+        result = atc.execute(self.algod_client, 4)
+        app_id = result.abi_results[0].tx_info["application-index"]
+        atc = AtomicTransactionComposer()
+        payment = transaction.PaymentTxn(
+            self.dispenser.address,
+            self.suggested_params(),
+            logic.get_application_address(app_id),
+            bootstrap_min_balance(option_counts, features.tally_bytes),
+        )
+        atc.add_method_call(
+            app_id=app_id,
+            method=contract.get_method_by_name("bootstrap"),
+            sender=self.dispenser.address,
+            sp=self.fee_params(BOOTSTRAP_FEE),
+            signer=self.signer,
+            method_args=[TransactionWithSigner(payment, self.signer)],
+            boxes=[(app_id, b"V")],
+        )
+        atc.execute(self.algod_client, 4)
+        app_info = self.algod_client.application_info(app_id)
+        assert isinstance(app_info, dict)
+        global_state = decode_global_state(app_info)
+        opup_app_id = global_state[b"ouaid"]
+        assert isinstance(opup_app_id, int)
+        return app_id, opup_app_id
+
+    def fund(self, addresses: Sequence[str]) -> None:
+        params = self.suggested_params()
+        for start in range(0, len(addresses), 16):
+            atc = AtomicTransactionComposer()
+            for address in addresses[start : start + 16]:
+                payment = transaction.PaymentTxn(
+                    self.dispenser.address, params, address, VOTER_FUNDING
+                )
+                atc.add_transaction(TransactionWithSigner(payment, self.signer))
+            atc.execute(self.algod_client, 4)
+
+    def suggested_params(self) -> transaction.SuggestedParams:
+        return self.algod_client.suggested_params()
+
+    def fee_params(self, fee: int) -> transaction.SuggestedParams:
+        params = self.suggested_params()
+        params.fee = fee
+        params.flat_fee = True
+        return params
+
+    async def submit(
+        self, group: list[transaction.GenericSignedTransaction]
+    ) -> str | None:
+        loop = asyncio.get_running_loop()
+        try:
+            tx_id = await loop.run_in_executor(
+                None, self.algod_client.send_transactions, group
+            )
+            await loop.run_in_executor(
+                None, transaction.wait_for_confirmation, self.algod_client, tx_id, 10
+            )
+        except Exception as ex:
+            # drop the transaction IDs and program counters that make every
+            # rejection message unique
+            return re.sub(r"[A-Z2-7]{52}|\d+", "#", str(ex))[:200]
+        return None
+
+
+def make_voters(
+    count: int, vote_type: int, signing_key: nacl.signing.SigningKey, rng: random.Random
+) -> list[Voter]:
+    voters = []
+    for _ in range(count):
+        private_key, address = account.generate_account()
+        weighting = rng.randrange(1, 1_000_000)
+        public_key = encoding.decode_address(address)
+        if vote_type == 0:
+            signature = b""
+        elif vote_type == 1:
+            signature = signing_key.sign(public_key).signature
+        else:
+            message = public_key + weighting.to_bytes(8, "big")
+            signature = signing_key.sign(message).signature
+        voters.append(Voter(private_key, address, weighting, signature))
+    return voters
+
+
+def build_vote_group(
+    voting_round: Round,
+    voter: Voter,
+    params: transaction.SuggestedParams,
+    rng: random.Random,
+    *,
+    invalid: bool = False,
+) -> list[transaction.GenericSignedTransaction]:
+    """Builds and signs a random ballot, which when `invalid` picks an option
+    past the end of a question"""
+    option_counts = voting_round.option_counts
+    answer_ids = [rng.randrange(count) for count in option_counts]
+    if invalid:
+        answer_ids[rng.randrange(len(answer_ids))] = max(option_counts)
+    answer_weights = []
+    if voting_round.vote_type == 3:
+        # split the weight at random points across the questions
+        cuts = sorted(rng.randint(0, voter.weighting) for _ in option_counts[1:])
+        bounds = [0, *cuts, voter.weighting]
+        answer_weights = [high - low for low, high in pairwise(bounds)]
+    signer = AccountTransactionSigner(voter.private_key)
+    payment = transaction.PaymentTxn(
+        voter.address,
+        params,
+        logic.get_application_address(voting_round.app_id),
+        vote_min_balance(
+            len(answer_ids), option_counts if voting_round.packed_ballots else None
+        ),
+    )
+    vote_params = transaction.SuggestedParams(
+        fee=VOTE_FEE,
+        first=params.first,
+        last=params.last,
+        gh=params.gh,
+        gen=params.gen,
+        flat_fee=True,
+    )
+    atc = AtomicTransactionComposer()
+    atc.add_method_call(
+        app_id=voting_round.app_id,
+        method=voting_round.method,
+        sender=voter.address,
+        sp=vote_params,
+        signer=signer,
+        method_args=[
+            TransactionWithSigner(payment, signer),
+            voter.signature,
+            voter.weighting,
+            answer_ids,
+            answer_weights,
+            voting_round.opup_app_id,
+        ],
+        boxes=[(voting_round.app_id, b"V"), (voting_round.app_id, voter.public_key)],
+    )
+    return atc.gather_signatures()
+
+
+async def submit_all(
+    target: Target,
+    groups: list[list[transaction.GenericSignedTransaction]],
+    report: LoadReport,
+    concurrency: int,
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(group: list[transaction.GenericSignedTransaction]) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            rejection = await target.submit(group)
+            report.latencies.append(time.perf_counter() - start)
+        report.submitted += 1
+        if rejection is None:
+            report.accepted += 1
+        else:
+            report.rejections[rejection] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(submit(group) for group in groups))
+    report.elapsed = time.perf_counter() - start
+
+
+def run_load_test(
+    target: Target,
+    app_spec: dict,
+    features: AppFeatures,
+    option_counts: list[int],
+    vote_type: int,
+    *,
+    voter_count: int,
+    concurrency: int,
+    invalid: float = 0.0,
+    seed: int = 0,
+) -> LoadReport:
+    rng = random.Random(seed)
+    signing_key = nacl.signing.SigningKey(rng.randbytes(32))
+    public_key = bytes(signing_key.verify_key) if vote_type else b""
+    app_id, opup_app_id = target.deploy(
+        app_spec, features, option_counts, vote_type, public_key
+    )
+    voting_round = Round(
+        app_id,
+        opup_app_id,
+        option_counts,
+        vote_type,
+        abi.Contract.undictify(app_spec["contract"]).get_method_by_name("vote"),
+        features.packed_ballots,
+    )
+    logger.info(f"Deployed round {app_id}, generating {voter_count} voters")
+    voters = make_voters(voter_count, vote_type, signing_key, rng)
+    target.fund([voter.address for voter in voters])
+    params = target.suggested_params()
+    groups = [
+        build_vote_group(
+            voting_round, voter, params, rng, invalid=rng.random() < invalid
+        )
+        for voter in voters
+    ]
+    logger.info(f"Submitting {len(groups)} votes, {concurrency} at a time")
+    report = LoadReport(vote_type)
+    asyncio.run(submit_all(target, groups, report, concurrency))
+    return report
+
+
+def print_report(reports: list[LoadReport]) -> None:
+    print(
+        f"{'vote type':<14} {'votes':>6} {'accepted':>9} {'votes/s':>8} "
+        f"{'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}"
+    )
+    for report in reports:
+        print(
+            f"{VOTE_TYPES[report.vote_type]:<14} {report.submitted:>6} "
+            f"{report.accepted:>9} {report.votes_per_second:>8.1f} "
+            f"{report.percentile(50) * 1000:>7.1f} "
+            f"{report.percentile(90) * 1000:>7.1f} "
+            f"{report.percentile(99) * 1000:>7.1f} "
+            f"{max(report.latencies, default=0) * 1000:>7.1f}"
+        )
+    for report in reports:
+        for reason, count in report.rejections.most_common():
+            print(f"{VOTE_TYPES[report.vote_type]:<14} rejected {count:>6}: {reason}")
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="smart_contracts.load_test")
+    parser.add_argument("--target", choices=["avm", "algod"], default="avm")
+    parser.add_argument(
+        "--app",
+        # the sharded app's bootstrap and votes need boxes the load test doesn't
+        # reference
+        choices=[
+            name for name, features in APPS.items() if not features.sharded_tallies
+        ],
+        default="VotingRoundApp",
+        help="the app to deploy",
+    )
+    parser.add_argument("--voters", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--vote-type",
+        choices=[*map(str, VOTE_TYPES), "all"],
+        default="all",
+        help="the vote type to test, or all the ones the app supports",
+    )
+    parser.add_argument(
+        "--option-counts",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[3, 1, 1, 1, 3],
+        help="comma separated number of options of each question",
+    )
+    parser.add_argument(
+        "--invalid",
+        type=float,
+        default=0.0,
+        help="fraction of ballots with an invalid option, to exercise rejections",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    app_spec = json.loads((artifact_path / args.app / "application.json").read_text())
+    supported = APPS[args.app].vote_types
+    if args.vote_type == "all":
+        vote_types = list(supported)
+    elif int(args.vote_type) in supported:
+        vote_types = [int(args.vote_type)]
+    else:
+        parser.error(
+            f"{args.app} only supports vote types " + ", ".join(map(str, supported))
+        )
+    reports = []
+    for vote_type in vote_types:
+        target: Target = (
+            AvmTarget() if args.target == "avm" else AlgodTarget(get_algod_client())
+        )
+        reports.append(
+            run_load_test(
+                target,
+                app_spec,
+                APPS[args.app],
+                args.option_counts,
+                vote_type,
+                voter_count=args.voters,
+                concurrency=args.concurrency,
+                invalid=args.invalid,
+                seed=args.seed,
+            )
+        )
+    print_report(reports)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)-10s: %(message)s"
+    )
+    sys.exit(main())
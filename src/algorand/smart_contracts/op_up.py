@@ -4,6 +4,11 @@ import pyteal as pt
 
 import beaker
 
+from smart_contracts.budget import OPUP_BUFFER, OPUP_CALL_BUDGET
+
+#: The most transactions that can be submitted in a single inner group
+MAX_INNER_GROUP_SIZE = 16
+
 
 class OpUpState:
     #: The id of the app created during `bootstrap`
@@ -12,18 +17,20 @@ class OpUpState:
     )
 
 
-def op_up_blueprint(
-    app: beaker.Application[OpUpState],
-) -> tuple[Callable[[], pt.Expr], Callable[[int], pt.Expr]]:
-    target_app = beaker.Application(
-        name="OpUpApp",
-        descr="""Simple app that allows the creator to call `opup` in order to increase its opcode budget""",
-    )
+target_app = beaker.Application(
+    name="OpUpApp",
+    descr="""Simple app that allows the creator to call `opup` in order to increase its opcode budget""",
+)
 
-    @target_app.external(authorize=beaker.Authorize.only_creator())
-    def opup() -> pt.Expr:
-        return pt.Approve()
 
+@target_app.external(authorize=beaker.Authorize.only_creator())
+def opup() -> pt.Expr:
+    return pt.Approve()
+
+
+def op_up_blueprint(
+    app: beaker.Application[OpUpState],
+) -> tuple[Callable[[], pt.Expr], Callable[..., pt.Expr]]:
     #: The minimum balance required for this class
     min_balance = beaker.consts.Algos(0.1)
 
@@ -38,6 +45,13 @@ def op_up_blueprint(
             output.set(app.state.opup_app_id),
         )
 
+    @app.external
+    def pool_budget() -> pt.Expr:
+        """does nothing, so that adding calls to it to a group adds their opcode
+        budget to the group's pooled budget, e.g. to cover several votes without
+        each of them making opup calls"""
+        return pt.Approve()
+
     @pt.Subroutine(pt.TealType.none)
     def create_opup() -> pt.Expr:
         """internal method to create the target application"""
@@ -56,26 +70,77 @@ def op_up_blueprint(
             app.state.opup_app_id.set(pt.InnerTxn.created_application_id()),
         )
 
-    # No decorator, inline it
-    def call_opup(required_budget: int) -> pt.Expr:
-        """internal method to just return the method call to our target app"""
-        # A budget buffer is necessary to deal with an edge case of ensure_budget():
-        #   if the current budget is equal to or only slightly higher than the
-        #   required budget then it's possible for ensure_budget() to return with a
-        #   current budget less than the required budget. The buffer prevents this
-        #   from being the case.
-        buffer = pt.Int(10)
-        buffered_budget = pt.ScratchVar(pt.TealType.uint64)
-        return pt.Seq(
-            buffered_budget.store(pt.Int(required_budget) + buffer),
-            pt.While(buffered_budget.load() > pt.Global.opcode_budget()).Do(
-                pt.InnerTxnBuilder.ExecuteMethodCall(
-                    app_id=app.state.opup_app_id,
-                    method_signature=opup.method_signature(),
-                    args=[],
-                    extra_fields={pt.TxnField.fee: pt.Int(0)},
+    def opup_call() -> pt.Expr:
+        return pt.InnerTxnBuilder.MethodCall(
+            app_id=app.state.opup_app_id,
+            method_signature=opup.method_signature(),
+            args=[],
+            extra_fields={pt.TxnField.fee: pt.Int(0)},
+        )
+
+    @pt.Subroutine(pt.TealType.none)
+    def ensure_opup_budget_batched(buffered_budget: pt.Expr) -> pt.Expr:
+        """works out the opup calls the budget needs to cover `buffered_budget` up
+        front and issues them in inner groups of up to 16"""
+        calls = pt.ScratchVar(pt.TealType.uint64)
+        batched = pt.ScratchVar(pt.TealType.uint64)
+        # This only loops again if issuing the calls cost more than
+        # OPUP_CALL_BUDGET allows for
+        return pt.While(buffered_budget > pt.Global.opcode_budget()).Do(
+            calls.store(
+                (
+                    buffered_budget
+                    - pt.Global.opcode_budget()
+                    + pt.Int(OPUP_CALL_BUDGET - 1)
                 )
+                / pt.Int(OPUP_CALL_BUDGET)
+            ),
+            pt.While(calls.load() > pt.Int(0)).Do(
+                pt.InnerTxnBuilder.Begin(),
+                opup_call(),
+                pt.For(
+                    batched.store(pt.Int(1)),
+                    pt.And(
+                        batched.load() < pt.Int(MAX_INNER_GROUP_SIZE),
+                        batched.load() < calls.load(),
+                    ),
+                    batched.store(batched.load() + pt.Int(1)),
+                ).Do(
+                    pt.InnerTxnBuilder.Next(),
+                    opup_call(),
+                ),
+                pt.InnerTxnBuilder.Submit(),
+                calls.store(calls.load() - batched.load()),
             ),
         )
 
+    def call_opup(required_budget: int | pt.Expr, *, batch: bool = False) -> pt.Expr:
+        """internal method to make sure the opcode budget covers `required_budget`
+        by calling our target app.
+
+        With `batch` the number of calls needed is worked out up front and they're
+        issued in inner groups of up to 16, which is cheaper when the required
+        budget covers several calls, e.g. when it's sized to the whole method.
+        That's shared as a subroutine, whereas a call at a time is inlined since
+        it's short and called per tally when closing"""
+        # the buffer is added here so a constant budget is folded into one int
+        buffered_budget = (
+            pt.Int(required_budget + OPUP_BUFFER)
+            if isinstance(required_budget, int)
+            else required_budget + pt.Int(OPUP_BUFFER)
+        )
+        if batch:
+            return ensure_opup_budget_batched(buffered_budget)
+        top_up = pt.Seq(
+            pt.InnerTxnBuilder.Begin(), opup_call(), pt.InnerTxnBuilder.Submit()
+        )
+        if isinstance(required_budget, int):
+            # a constant is as cheap to push as to load, e.g. per tally in close
+            return pt.While(buffered_budget > pt.Global.opcode_budget()).Do(top_up)
+        budget = pt.ScratchVar(pt.TealType.uint64)
+        return pt.Seq(
+            budget.store(buffered_budget),
+            pt.While(budget.load() > pt.Global.opcode_budget()).Do(top_up),
+        )
+
     return (create_opup, call_opup)
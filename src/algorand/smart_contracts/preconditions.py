@@ -0,0 +1,235 @@
+"""Evaluates `get_preconditions` off-chain from cached round state.
+
+`get_preconditions` is read-only, but calling it means simulating an app call
+that, for snapshot rounds, does OpUp calls to afford an Ed25519 verify. Its
+answers only depend on a few global state values, whether the voter has a box
+and the signature, so this reproduces `voting_open`, `already_voted` and
+`allowed_to_vote` from those, fetching global state and box existence from
+algod and caching them for a short while per app and per (app, sender):
+
+    cache = PreconditionsCache(get_algod_client())
+    preconditions = cache.get_preconditions(app_id, sender, signature, weighting)
+"""
+
+import base64
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+import nacl.exceptions
+import nacl.signing
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client.algod import AlgodClient
+
+from smart_contracts.constants import TYPE_NO_SNAPSHOT, TYPE_NO_WEIGHTING
+
+#: How long round state and whether a voter has voted are cached for, in
+#: seconds. Voting opening or closing is worked out from the cached state, so
+#: this only delays seeing a round being closed early or a vote from elsewhere
+DEFAULT_TTL = 5.0
+DEFAULT_MAX_ENTRIES = 100_000
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class RoundState:
+    """The global state `get_preconditions` depends on"""
+
+    vote_type: int
+    snapshot_public_key: bytes
+    start_time: int
+    end_time: int
+    close_time: int
+    is_bootstrapped: bool
+
+    @classmethod
+    def from_global_state(
+        cls, global_state: Mapping[bytes, int | bytes]
+    ) -> "RoundState":
+        def uint(key: bytes) -> int:
+            value = global_state.get(key, 0)
+            assert isinstance(value, int)
+            return value
+
+        public_key = global_state.get(b"snapshot_public_key", b"")
+        assert isinstance(public_key, bytes)
+        return cls(
+            vote_type=uint(b"vote_type"),
+            snapshot_public_key=public_key,
+            start_time=uint(b"start_time"),
+            end_time=uint(b"end_time"),
+            close_time=uint(b"close_time"),
+            is_bootstrapped=uint(b"is_bootstrapped") == 1,
+        )
+
+
+@dataclass(frozen=True)
+class VotingPreconditions:
+    """The result of `get_preconditions`"""
+
+    is_voting_open: bool
+    is_allowed_to_vote: bool
+    has_already_voted: bool
+    current_time: int
+
+
+def decode_global_state(app_info: Mapping) -> dict[bytes, int | bytes]:
+    """The global state of an algod application_info response"""
+    global_state: dict[bytes, int | bytes] = {}
+    for item in app_info["params"].get("global-state", []):
+        value = item["value"]
+        global_state[base64.b64decode(item["key"])] = (
+            base64.b64decode(value["bytes"]) if value["type"] == 1 else value["uint"]
+        )
+    return global_state
+
+
+def is_voting_open(state: RoundState, current_time: int) -> bool:
+    """Mirrors `voting_open`"""
+    return (
+        state.is_bootstrapped
+        and state.close_time == 0
+        and state.start_time <= current_time < state.end_time
+    )
+
+
+def is_allowed_to_vote(
+    state: RoundState, sender: bytes, signature: bytes, weighting: int
+) -> bool:
+    """Mirrors `allowed_to_vote`: a valid snapshot signature of the sender, and
+    for the weighted vote types their weighting, unless there's no snapshot"""
+    if state.vote_type == TYPE_NO_SNAPSHOT:
+        return True
+    message = sender
+    if state.vote_type != TYPE_NO_WEIGHTING:
+        message += weighting.to_bytes(8, "big")
+    try:
+        nacl.signing.VerifyKey(state.snapshot_public_key).verify(message, signature)
+    except (nacl.exceptions.BadSignatureError, ValueError, TypeError):
+        return False
+    return True
+
+
+class TTLCache(Generic[K, V]):
+    """A cache whose entries expire `ttl` seconds after being set, evicting the
+    least recently used entry once it holds `max_entries`"""
+
+    def __init__(
+        self,
+        ttl: float | None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: OrderedDict[K, tuple[float | None, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and self.clock() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, *, expires: bool = True) -> None:  # noqa: A003
+        """Caches value for key, for good if `expires` is False (though it can
+        still be evicted)"""
+        expiry = self.clock() + self.ttl if expires and self.ttl is not None else None
+        self._entries[key] = (expiry, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PreconditionsCache:
+    """Answers `get_preconditions` from cached algod state. Round state is
+    cached per app and whether a voter has voted per (app, sender), which is
+    cached for good once they have since votes can't be undone. Signature
+    checks are cached per (app, sender) for the last signature and weighting
+    they were asked about. Those don't expire: a check only depends on them and
+    the round's vote type and snapshot public key, which `create` sets for
+    good, and is redone if any of them differ"""
+
+    def __init__(
+        self,
+        algod_client: AlgodClient,
+        *,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+        current_time: Callable[[], int] = lambda: int(time.time()),
+    ):
+        self.algod_client = algod_client
+        self.current_time = current_time
+        self._states: TTLCache[int, RoundState] = TTLCache(ttl, max_entries, clock)
+        self._voted: TTLCache[tuple[int, bytes], bool] = TTLCache(
+            ttl, max_entries, clock
+        )
+        self._allowed: TTLCache[
+            tuple[int, bytes], tuple[tuple[bytes, int, int, bytes], bool]
+        ] = TTLCache(None, max_entries, clock)
+
+    def round_state(self, app_id: int) -> RoundState:
+        state = self._states.get(app_id)
+        if state is None:
+            app_info = self.algod_client.application_info(app_id)
+            assert isinstance(app_info, dict)
+            state = RoundState.from_global_state(decode_global_state(app_info))
+            self._states.set(app_id, state)
+        return state
+
+    def has_voted(self, app_id: int, sender: bytes) -> bool:
+        """Mirrors `already_voted`, i.e. whether the sender has a vote box"""
+        voted = self._voted.get((app_id, sender))
+        if voted is None:
+            try:
+                self.algod_client.application_box_by_name(app_id, sender)
+                voted = True
+            except AlgodHTTPError as ex:
+                if ex.code != 404:
+                    raise
+                voted = False
+            self._voted.set((app_id, sender), voted, expires=not voted)
+        return voted
+
+    def mark_voted(self, app_id: int, sender: bytes | str) -> None:
+        """Records that a vote from sender was confirmed, e.g. by a relay that
+        submitted it, rather than waiting for the cached answer to expire"""
+        self._voted.set((app_id, _public_key(sender)), value=True, expires=False)
+
+    def get_preconditions(
+        self, app_id: int, sender: bytes | str, signature: bytes, weighting: int
+    ) -> VotingPreconditions:
+        sender = _public_key(sender)
+        state = self.round_state(app_id)
+        current_time = self.current_time()
+        checked = (signature, weighting, state.vote_type, state.snapshot_public_key)
+        cached = self._allowed.get((app_id, sender))
+        if cached is not None and cached[0] == checked:
+            allowed = cached[1]
+        else:
+            allowed = is_allowed_to_vote(state, sender, signature, weighting)
+            self._allowed.set((app_id, sender), (checked, allowed))
+        return VotingPreconditions(
+            is_voting_open=is_voting_open(state, current_time),
+            is_allowed_to_vote=allowed,
+            has_already_voted=self.has_voted(app_id, sender),
+            current_time=current_time,
+        )
+
+
+def _public_key(address: bytes | str) -> bytes:
+    return encoding.decode_address(address) if isinstance(address, str) else address
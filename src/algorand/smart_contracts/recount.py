@@ -0,0 +1,275 @@
+"""Recounts a voting round from its voter boxes and checks the result against
+the tally box.
+
+The boxes are streamed from a dump of algod box responses (see results.py) in
+batches, so memory use is bounded by the batch size rather than the number of
+voters. Each batch of ballots is added to the recount with NumPy:
+
+- no snapshot / no weighting: one vote per voter for each of their answers
+- weighting: each answer counts for the voter's weight from the snapshot file
+  written by snapshot.py
+- partitioned weighting: the voter boxes don't record how a voter split their
+  weight across questions, so only the sum of every tally can be checked,
+  against the sum of the voters' weights
+
+Usage:
+
+    python -m smart_contracts.recount boxes.jsonl --option-counts 3,1,4 \\
+        --vote-type 2 --snapshot snapshot.bin [--tally-bytes 4] [--packed-ballots]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from smart_contracts.constants import TYPE_PARTITIONED_WEIGHTING, TYPE_WEIGHTING
+from smart_contracts.results import (
+    ADDRESS_SIZE,
+    ARRAY_LENGTH_SIZE,
+    decode_tallies,
+    is_tally_box,
+    iter_box_dump,
+    join_tally_boxes,
+    unpack_answers,
+)
+from smart_contracts.snapshot import SnapshotReader
+from smart_contracts.vote_batch import packed_ballot_size
+
+logger = logging.getLogger(__name__)
+
+#: Voters recounted at a time; ~14MB of ballots at 112 questions
+DEFAULT_BATCH_SIZE = 65_536
+#: A snapshot entry as laid out by snapshot.py, with the address as a fixed
+#: width bytes field so that NumPy compares addresses byte by byte
+SNAPSHOT_ENTRY_DTYPE = np.dtype(
+    [("address", "S32"), ("signature", "V64"), ("weight", ">u8")]
+)
+
+
+@dataclass
+class Mismatch:
+    #: None when only the total over every question could be compared
+    question: int | None
+    option: int | None
+    tally: int
+    recount: int
+
+
+@dataclass
+class Recount:
+    voter_count: int
+    #: The recounted tally of each option, in tally box order; left at 0 for
+    #: partitioned weighting
+    tallies: np.ndarray
+    #: The tally box contents (every shard's, in order, for VotingRoundAppSharded),
+    #: if it was in the dump
+    tally_box: bytes | None = None
+    mismatches: list[Mismatch] = field(default_factory=list)
+
+
+class SnapshotWeights:
+    """Looks up the weights of a batch of voters from a snapshot at once, with
+    a binary search over the snapshot's (memory mapped) addresses"""
+
+    def __init__(self, reader: SnapshotReader):
+        self.entries = np.frombuffer(reader.entries, dtype=SNAPSHOT_ENTRY_DTYPE)
+
+    def __call__(self, addresses: np.ndarray) -> np.ndarray:
+        keys = addresses.view("S32").ravel()
+        if not len(self.entries) and len(keys):
+            raise ValueError(f"Voter {keys[0].hex()} isn't in the snapshot")
+        indexes = np.searchsorted(self.entries["address"], keys)
+        indexes = np.minimum(indexes, len(self.entries) - 1)
+        found = self.entries[indexes]
+        missing = found["address"] != keys
+        if missing.any():
+            address = bytes(addresses[missing.argmax()])
+            raise ValueError(f"Voter {address.hex()} isn't in the snapshot")
+        return found["weight"].astype(np.uint64)
+
+
+def iter_ballot_batches(
+    boxes: Iterable[tuple[bytes, bytes]],
+    questions_count: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    tally_boxes: dict[bytes, bytes] | None = None,
+    packed_option_counts: Sequence[int] | None = None,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Groups the voter boxes into batches of (addresses, answers) arrays,
+    shaped (n, 32) and (n, questions_count). If `tally_boxes` is given, the
+    tally box (or shards) are added to it when they're seen. The boxes hold
+    packed ballots if `packed_option_counts` are given"""
+    if packed_option_counts is None:
+        record_size = ARRAY_LENGTH_SIZE + questions_count
+        length_prefix = questions_count.to_bytes(ARRAY_LENGTH_SIZE, "big")
+    else:
+        record_size = packed_ballot_size(packed_option_counts)
+        length_prefix = b""
+    names = bytearray()
+    values = bytearray()
+    count = 0
+    for name, value in boxes:
+        if len(name) != ADDRESS_SIZE:
+            if is_tally_box(name) and tally_boxes is not None:
+                tally_boxes[name] = value
+            continue
+        if len(value) != record_size or not value.startswith(length_prefix):
+            raise ValueError(
+                f"Voter {name.hex()} should have {questions_count} answers"
+            )
+        names += name
+        values += value
+        count += 1
+        if count == batch_size:
+            yield _batch(names, values, record_size, packed_option_counts)
+            names, values, count = bytearray(), bytearray(), 0
+    if count:
+        yield _batch(names, values, record_size, packed_option_counts)
+
+
+def _batch(
+    names: bytearray,
+    values: bytearray,
+    record_size: int,
+    packed_option_counts: Sequence[int] | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    addresses = np.frombuffer(names, dtype=np.uint8).reshape(-1, ADDRESS_SIZE)
+    records = np.frombuffer(values, dtype=np.uint8).reshape(-1, record_size)
+    if packed_option_counts is not None:
+        return addresses, unpack_answers(records, packed_option_counts)
+    return addresses, records[:, ARRAY_LENGTH_SIZE:]
+
+
+def recount(
+    boxes: Iterable[tuple[bytes, bytes]],
+    option_counts: Sequence[int],
+    vote_type: int,
+    *,
+    weights: SnapshotWeights | None = None,
+    tally_bytes: int = 8,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    packed_ballots: bool = False,
+) -> Recount:
+    """Recounts the votes in `boxes`, comparing them with the tally box if it's
+    one of them. Weighted vote types need the snapshot weights, and
+    `packed_ballots` is for the voter boxes of VotingRoundAppPackedBallots"""
+    weighted = vote_type in (TYPE_WEIGHTING, TYPE_PARTITIONED_WEIGHTING)
+    if weighted and weights is None:
+        raise ValueError("Recounting a weighted round needs the snapshot weights")
+    option_counts = list(option_counts)
+    offsets = np.cumsum([0, *option_counts[:-1]], dtype=np.int64)
+    tallies = np.zeros(sum(option_counts), dtype=np.uint64)
+    total_weight = 0
+    voter_count = 0
+    tally_boxes: dict[bytes, bytes] = {}
+    for addresses, answers in iter_ballot_batches(
+        boxes,
+        len(option_counts),
+        batch_size,
+        tally_boxes,
+        option_counts if packed_ballots else None,
+    ):
+        voter_count += len(answers)
+        if (answers >= np.asarray(option_counts, dtype=np.uint8)).any():
+            raise ValueError("A voter has an answer outside their question's options")
+        indexes = (answers + offsets).ravel()
+        if not weighted:
+            tallies += np.bincount(indexes, minlength=len(tallies)).astype(np.uint64)
+            continue
+        assert weights is not None
+        voter_weights = weights(addresses)
+        total_weight += int(voter_weights.sum(dtype=object))
+        if vote_type == TYPE_WEIGHTING:
+            np.add.at(tallies, indexes, np.repeat(voter_weights, len(option_counts)))
+
+    result = Recount(voter_count=voter_count, tallies=tallies)
+    if not tally_boxes:
+        return result
+    result.tally_box = join_tally_boxes(tally_boxes)
+    box_tallies = decode_tallies(result.tally_box, option_counts, tally_bytes)
+    if vote_type == TYPE_PARTITIONED_WEIGHTING:
+        box_total = sum(int(question.sum(dtype=object)) for question in box_tallies)
+        if box_total != total_weight:
+            result.mismatches.append(Mismatch(None, None, box_total, total_weight))
+        return result
+    for question, (box_question, offset) in enumerate(
+        zip(box_tallies, offsets, strict=True)
+    ):
+        recounted = tallies[offset : offset + len(box_question)]
+        for option in np.flatnonzero(box_question != recounted):
+            result.mismatches.append(
+                Mismatch(
+                    question,
+                    int(option),
+                    int(box_question[option]),
+                    int(recounted[option]),
+                )
+            )
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="smart_contracts.recount")
+    parser.add_argument("boxes", type=Path, help="dump of algod box responses")
+    parser.add_argument(
+        "--option-counts",
+        required=True,
+        type=lambda value: [int(count) for count in value.split(",")],
+        help="comma separated number of options of each question",
+    )
+    parser.add_argument("--vote-type", type=int, choices=range(4), required=True)
+    parser.add_argument(
+        "--snapshot", type=Path, help="snapshot file, for weighted vote types"
+    )
+    parser.add_argument(
+        "--tally-bytes",
+        type=int,
+        default=8,
+        choices=[2, 4, 8],
+        help="width of each tally in the tally box, 4 for VotingRoundAppCompact",
+    )
+    parser.add_argument(
+        "--packed-ballots",
+        action="store_true",
+        help="voter boxes hold packed ballots, for VotingRoundAppPackedBallots",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    reader = SnapshotReader(args.snapshot) if args.snapshot else None
+    start = time.perf_counter()
+    result = recount(
+        iter_box_dump(args.boxes),
+        args.option_counts,
+        args.vote_type,
+        weights=SnapshotWeights(reader) if reader else None,
+        tally_bytes=args.tally_bytes,
+        batch_size=args.batch_size,
+        packed_ballots=args.packed_ballots,
+    )
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Recounted {result.voter_count} voters in {elapsed:.2f}s "
+        f"({result.voter_count / elapsed * 60:,.0f} per minute)"
+    )
+    if result.tally_box is None:
+        logger.error(f"{args.boxes} doesn't include the tally box")
+        return 1
+    for mismatch in result.mismatches:
+        logger.error(f"Mismatch: {mismatch}")
+    if not result.mismatches:
+        logger.info("Tally box matches the recount")
+    return 1 if result.mismatches else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)-10s: %(message)s"
+    )
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Decodes the results of a voting round from its boxes in bulk.
+
+The tally box "V" holds a big-endian tally per option, 8 bytes each (4 for
+VotingRoundAppCompact), in question order. Each voter's box is keyed by their
+32 byte address and holds their `answer_ids` as `vote` stores them, ABI
+encoded as a uint16 count followed by a Uint8 option index per question (not
+the StaticBytes[8] per question the `votes` box mapping is declared with).
+VotingRoundAppPackedBallots packs them instead, see `unpack_answers`. Both
+boxes are decoded with NumPy views over the box contents rather than value by
+value.
+
+VotingRoundAppSharded splits the tallies over boxes named "V" followed by the
+shard's index as a byte, 128 tallies each, keeps each question's option offset
+as a uint16 in the "O" box, and renders the results into boxes named "R"
+followed by their index as a uint16, which the result NFT's note refers to.
+
+Boxes can be read from a dump of the app's boxes with one algod
+`/v2/applications/{app-id}/box` response per line, i.e. JSON objects with
+base64 `name` and `value` fields.
+"""
+
+import base64
+import json
+from collections.abc import Iterator, Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from smart_contracts.vote_batch import packed_ballot_size
+
+TALLY_BOX_KEY = b"V"
+OFFSETS_BOX_KEY = b"O"
+RESULT_BOX_PREFIX = b"R"
+ADDRESS_SIZE = 32
+#: The uint16 length prefix of an ABI encoded dynamic array
+ARRAY_LENGTH_SIZE = 2
+
+
+def decode_option_counts(encoded: bytes) -> list[int]:
+    """The option count of each question from the `option_counts` global"""
+    return list(encoded[ARRAY_LENGTH_SIZE:])
+
+
+def decode_option_offsets(box: bytes) -> list[int]:
+    """The option count of each question from VotingRoundAppSharded's offsets
+    box"""
+    return [int(count) for count in np.diff(np.frombuffer(box, dtype=">u2"))]
+
+
+def is_tally_box(name: bytes) -> bool:
+    """Whether a box is the tally box or one of VotingRoundAppSharded's shards"""
+    return name == TALLY_BOX_KEY or (len(name) == 2 and name[:1] == TALLY_BOX_KEY)
+
+
+def join_tally_boxes(boxes: Mapping[bytes, bytes]) -> bytes:
+    """The contents of the tally box, or of VotingRoundAppSharded's shards in
+    order, for `decode_tallies`"""
+    return b"".join(boxes[name] for name in sorted(filter(is_tally_box, boxes)))
+
+
+def decode_result_boxes(boxes: Mapping[bytes, bytes]) -> list[list[int]]:
+    """The tallies VotingRoundAppSharded rendered into its result boxes when
+    closing, as the ARC-69 `tallies` array of the other apps' result notes"""
+    names = sorted(
+        name
+        for name in boxes
+        if len(name) == 1 + ARRAY_LENGTH_SIZE and name[:1] == RESULT_BOX_PREFIX
+    )
+    return list(json.loads(b"[" + b"".join(boxes[name] for name in names) + b"]"))
+
+
+def decode_tallies(
+    box: bytes, option_counts: Sequence[int], tally_bytes: int = 8
+) -> list[np.ndarray]:
+    """Splits the tally box into an array of tallies per question. The arrays
+    are read-only views over `box`, so no tallies are copied"""
+    tallies = np.frombuffer(box, dtype=f">u{tally_bytes}")
+    if len(tallies) != sum(option_counts):
+        raise ValueError(
+            f"Tally box has {len(tallies)} tallies but there are "
+            f"{sum(option_counts)} options"
+        )
+    return np.split(tallies, np.cumsum(option_counts)[:-1])
+
+
+def decode_votes(
+    boxes: Mapping[bytes, bytes], questions_count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Decodes every voter's box, returning their addresses as an (n, 32) uint8
+    array along with their answers as an (n, questions_count) uint8 array of
+    option indices, in the same order. Boxes whose name isn't an address, like
+    the tally box, are skipped"""
+    voter_boxes = {
+        name: value for name, value in boxes.items() if len(name) == ADDRESS_SIZE
+    }
+    record_size = ARRAY_LENGTH_SIZE + questions_count
+    values = b"".join(voter_boxes.values())
+    if len(values) != record_size * len(voter_boxes):
+        raise ValueError(f"Voter boxes should all be {record_size} bytes")
+    records = np.frombuffer(values, dtype=np.uint8).reshape(-1, record_size)
+    lengths = records[:, 0].astype(np.uint16) << 8 | records[:, 1]
+    if (lengths != questions_count).any():
+        raise ValueError(f"Voter boxes should all have {questions_count} answers")
+    addresses = np.frombuffer(b"".join(voter_boxes), dtype=np.uint8).reshape(
+        -1, ADDRESS_SIZE
+    )
+    return addresses, records[:, ARRAY_LENGTH_SIZE:]
+
+
+def decode_packed_votes(
+    boxes: Mapping[bytes, bytes], option_counts: Sequence[int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """`decode_votes` for the voter boxes of VotingRoundAppPackedBallots"""
+    voter_boxes = {
+        name: value for name, value in boxes.items() if len(name) == ADDRESS_SIZE
+    }
+    record_size = packed_ballot_size(option_counts)
+    values = b"".join(voter_boxes.values())
+    if len(values) != record_size * len(voter_boxes):
+        raise ValueError(f"Voter boxes should all be {record_size} bytes")
+    records = np.frombuffer(values, dtype=np.uint8).reshape(-1, record_size)
+    addresses = np.frombuffer(b"".join(voter_boxes), dtype=np.uint8).reshape(
+        -1, ADDRESS_SIZE
+    )
+    return addresses, unpack_answers(records, option_counts)
+
+
+def unpack_answers(records: np.ndarray, option_counts: Sequence[int]) -> np.ndarray:
+    """Unpacks an (n, size) uint8 array of packed ballots into an (n, questions)
+    uint8 array of option indices.
+
+    A packed ballot is a big-endian number with each answer taking the bits of
+    its question's option count less one, the first question's answer in the
+    most significant bits, so questions with a single option take none. Each
+    answer is the dot product of its bits and their place values, so all of
+    them are unpacked with one matrix product"""
+    widths = [(count - 1).bit_length() for count in option_counts]
+    padding = 8 * records.shape[1] - sum(widths)
+    bits = np.unpackbits(records, axis=1)[:, padding:]
+    place_values = np.zeros((sum(widths), len(widths)), dtype=np.int64)
+    offset = 0
+    for question, width in enumerate(widths):
+        place_values[offset : offset + width, question] = 1 << np.arange(width)[::-1]
+        offset += width
+    answers = bits.astype(np.int64) @ place_values
+    return answers.astype(np.uint8)
+
+
+def read_box_dump(path: Path) -> dict[bytes, bytes]:
+    """Reads the boxes of an app from a dump of algod box responses"""
+    return dict(iter_box_dump(path))
+
+
+def iter_box_dump(path: Path) -> Iterator[tuple[bytes, bytes]]:
+    """Streams (name, value) pairs from a dump of algod box responses"""
+    with path.open() as f:
+        for line in f:
+            if line.strip():
+                box = json.loads(line)
+                yield base64.b64decode(box["name"]), base64.b64decode(box["value"])
@@ -211,6 +211,15 @@ describe('voting', () => {
       })
     }
 
+    const closeChunk = async (count: number) => {
+      return await appClient.call({
+        method: 'close_chunk',
+        methodArgs: [count, opupId],
+        boxes: ['V', 'R'],
+        sendParams: { fee: algokit.microAlgos(1_000 + 16 * 1_000) },
+      })
+    }
+
     return {
       algod,
       testAccount,
@@ -233,6 +242,7 @@ describe('voting', () => {
       voteFee,
       vote,
       close,
+      closeChunk,
       getTallies,
       opupId: () => opupId,
     }
@@ -382,6 +392,38 @@ describe('voting', () => {
       `)
     })
 
+    test('in chunks', async () => {
+      const { closeChunk, getVoter, vote, bootstrap, appClient, opupId } = await setupApp({
+        questionCounts: [3, 1, 1, 1, 3],
+      })
+      await bootstrap()
+      const voter = await getVoter()
+      await vote(voter)
+      // the result box needs funding for its min balance while closing
+      await appClient.fundAppAccount(algokit.microAlgos(2_500 + 400 * (1 + 100)))
+
+      const first = await closeChunk(4)
+      expect(Number(first.return!.returnValue)).toBe(5)
+      await expect(vote(await getVoter())).rejects.toThrow()
+      const second = await closeChunk(4)
+      expect(Number(second.return!.returnValue)).toBe(1)
+      const result = await appClient.call({
+        method: 'close',
+        methodArgs: [opupId()],
+        boxes: ['V', 'R'],
+        sendParams: { fee: algokit.microAlgos(1_000 + 16 * 1_000) },
+      })
+
+      const globalState = await appClient.getGlobalState()
+      invariant(result.confirmation)
+      invariant(result.confirmation.innerTxns)
+      const inner = result.confirmation.innerTxns[result.confirmation.innerTxns.length - 1]
+      expect(inner.assetIndex).toBe(globalState.nft_asset_id.value)
+      const arc69Payload = JSON.parse(Buffer.from(inner.txn.txn.note ?? new Uint8Array()).toString('utf-8'))
+      expect(arc69Payload.properties.tallies).toEqual([[0, 0, 1], [1], [1], [1], [0, 0, 1]])
+      await expect(appClient.getBoxValue('R')).rejects.toThrow()
+    })
+
     test('max budget 1', async () => {
       try {
         const questionCounts = new Array(112).fill(1)
@@ -466,6 +508,24 @@ describe('voting', () => {
       expect(boxValues).toEqual([BigInt(weighting), 0n, 0n, 0n])
     })
 
+    test('max ballot size', async () => {
+      const questionCounts = new Array(112).fill(1)
+      questionCounts[0] = 128 - 112
+      const { getVoter, vote, bootstrap, getTallies } = await setupApp({
+        voteType: VoteType.WEIGHTING,
+        questionCounts,
+      })
+      await bootstrap()
+      const weighting = 20
+      const voter = await getVoter(weighting)
+
+      await vote(voter)
+
+      const boxValues = await getTallies()
+      expect(boxValues[questionCounts[0] - 1]).toBe(BigInt(weighting))
+      expect(boxValues[boxValues.length - 1]).toBe(BigInt(weighting))
+    })
+
     test('invalid signature', async () => {
       const { getVoter, vote, bootstrap } = await setupApp({ voteType: VoteType.WEIGHTING, questionCounts: [1] })
       await bootstrap()
@@ -596,6 +656,17 @@ describe('voting', () => {
       expect(boxValues).toEqual([0n, 0n, 0n, 1n, 0n, 0n, 0n, 1n])
     })
 
+    test('successful multiple voters', async () => {
+      const { getVoter, vote, bootstrap, getTallies } = await setupApp({ questionCounts: [3, 1, 2] })
+      await bootstrap()
+
+      await vote(await getVoter(), [0, 0, 1])
+      await vote(await getVoter(), [2, 0, 1])
+
+      const boxValues = await getTallies()
+      expect(boxValues).toEqual([1n, 0n, 1n, 2n, 0n, 2n])
+    })
+
     test('double voting', async () => {
       const { getVoter, bootstrap, vote } = await setupApp({ questionCounts: [2] })
       await bootstrap()
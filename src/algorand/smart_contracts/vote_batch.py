@@ -0,0 +1,253 @@
+"""Batches several voters' votes into one group that shares its opcode budget.
+
+On its own, each `vote` makes OpUp calls (inner app calls, each paid for by the
+voter) to raise its opcode budget to what the vote needs, mostly for the
+Ed25519 verify of a snapshot signature. The opcode budget of the app calls in a
+group is pooled though, so a relay submitting several voters' ballots in one
+group can add calls to `pool_budget`, which does nothing but add its 700 to the
+pool, until the pool covers every vote in the group and none of them need OpUp
+calls. The relay pays the fee for the whole group on its first `pool_budget`
+call, so the voters' payments and vote calls have no fee:
+
+    atc = AtomicTransactionComposer()
+    add_vote_batch(atc, vote_batch, ballots)
+    atc.execute(algod_client, 4)
+
+Each voter still signs their own payment and vote call, and since that has to
+happen once the group is composed a relay's `signer` for a ballot would be one
+that asks the voter to sign the transactions it's given.
+"""
+
+import itertools
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from algosdk import abi, encoding, logic, transaction
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    TransactionSigner,
+    TransactionWithSigner,
+)
+
+from smart_contracts.budget import (
+    APP_CALL_BUDGET,
+    POOL_BUDGET_CALL_COST,
+    VOTE_CALL_COST,
+    vote_budget,
+)
+from smart_contracts.constants import (
+    ASSET_MIN_BALANCE,
+    BOX_BYTE_MIN_BALANCE,
+    BOX_FLAT_MIN_BALANCE,
+    MIN_TXN_FEE,
+    PACKED_VOTE_BOX_OVERHEAD,
+    TALLY_SHARD_SIZE,
+    VOTE_BOX_OVERHEAD,
+)
+
+MAX_GROUP_SIZE = 16
+
+
+@dataclass
+class Ballot:
+    """A voter's vote, with the signer for their payment and vote call"""
+
+    sender: str
+    signer: TransactionSigner
+    answer_ids: list[int]
+    signature: bytes = b""
+    weighting: int = 0
+    answer_weights: list[int] = field(default_factory=list)
+
+
+@dataclass
+class VoteBatch:
+    """The round the votes are for and the relay submitting them"""
+
+    app_id: int
+    opup_app_id: int
+    contract: abi.Contract
+    vote_type: int
+    relay: str
+    relay_signer: TransactionSigner
+    params: transaction.SuggestedParams
+    #: Whether the app only supports `vote_type`, i.e. is one of the
+    #: VotingRoundApp{vote type} variants, which need less budget per question
+    fixed_vote_type: bool = False
+    tally_bytes: int = 8
+    #: The round's option counts if the app packs ballots, i.e. is
+    #: VotingRoundAppPackedBallots, which size the voters' boxes
+    packed_option_counts: list[int] | None = None
+    #: The round's option counts if the app shards its tallies, i.e. is
+    #: VotingRoundAppSharded, which say which tally boxes a vote references
+    sharded_option_counts: list[int] | None = None
+
+
+def packed_ballot_size(option_counts: Sequence[int]) -> int:
+    """The bytes a packed ballot takes, each answer taking the bits of its
+    question's option count less one, and at least a byte"""
+    bits = sum((count - 1).bit_length() for count in option_counts)
+    return max(1, (bits + 7) // 8)
+
+
+def pack_answers(answer_ids: Sequence[int], option_counts: Sequence[int]) -> bytes:
+    """A ballot as VotingRoundAppPackedBallots stores it"""
+    packed = 0
+    for answer, count in zip(answer_ids, option_counts, strict=True):
+        packed = packed << (count - 1).bit_length() | answer
+    return packed.to_bytes(packed_ballot_size(option_counts), "big")
+
+
+def tally_shard_names(
+    answer_ids: Sequence[int], option_counts: Sequence[int]
+) -> list[bytes]:
+    """The names of the VotingRoundAppSharded tally boxes a ballot's answers
+    are counted in, i.e. "V" followed by the shard's index as a byte"""
+    offsets = itertools.accumulate(option_counts[:-1], initial=0)
+    shards = {
+        (offset + answer) // TALLY_SHARD_SIZE
+        for offset, answer in zip(offsets, answer_ids, strict=True)
+    }
+    return [b"V" + bytes([shard]) for shard in sorted(shards)]
+
+
+def bootstrap_min_balance(
+    option_counts: Sequence[int], tally_bytes: int = 8, *, sharded_tallies: bool = False
+) -> int:
+    """The payment `bootstrap` requires: the app account's and the result NFT's
+    min balance, the OpUp app's, the NFT's creation fee and the tally box, or
+    with `sharded_tallies` the offsets box and a box per shard"""
+    min_balance = 3 * ASSET_MIN_BALANCE + MIN_TXN_FEE
+    total_options = sum(option_counts)
+    if not sharded_tallies:
+        return (
+            min_balance
+            + BOX_FLAT_MIN_BALANCE
+            + BOX_BYTE_MIN_BALANCE * (1 + tally_bytes * total_options)
+        )
+    shards = -(-total_options // TALLY_SHARD_SIZE)
+    return (
+        min_balance
+        + BOX_FLAT_MIN_BALANCE
+        + BOX_BYTE_MIN_BALANCE * (1 + 2 * (len(option_counts) + 1))
+        + shards * (BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * 2)
+        + BOX_BYTE_MIN_BALANCE * tally_bytes * total_options
+    )
+
+
+def vote_min_balance(
+    questions_count: int, packed_option_counts: Sequence[int] | None = None
+) -> int:
+    """The payment `vote` requires to fund the voter's box, which holds their
+    ABI encoded answers unless `packed_option_counts` are given"""
+    if packed_option_counts is not None:
+        return BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (
+            PACKED_VOTE_BOX_OVERHEAD + packed_ballot_size(packed_option_counts)
+        )
+    return BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (
+        VOTE_BOX_OVERHEAD + questions_count
+    )
+
+
+def pool_budget_calls(budgets: Sequence[int]) -> int:
+    """The number of `pool_budget` calls a group of votes needing `budgets`
+    needs so none of them make OpUp calls, with at least one to pay the fees.
+
+    Each vote checks what's left of the pool when it runs, and uses less than
+    it checks for besides what it used before checking, so pooling the sum of
+    every vote's budget and that covers them all"""
+    shortfall = sum(budgets) + (VOTE_CALL_COST - APP_CALL_BUDGET) * len(budgets)
+    per_call = APP_CALL_BUDGET - POOL_BUDGET_CALL_COST
+    return max(1, -(-shortfall // per_call))
+
+
+def max_votes_per_group(budget: int) -> int:
+    """The most votes needing `budget` each that fit in a group along with the
+    `pool_budget` calls they need, which is 0 if even one vote doesn't"""
+    count = MAX_GROUP_SIZE // 2
+    while count and 2 * count + pool_budget_calls([budget] * count) > MAX_GROUP_SIZE:
+        count -= 1
+    return count
+
+
+def add_vote_batch(
+    atc: AtomicTransactionComposer, batch: VoteBatch, ballots: Sequence[Ballot]
+) -> int:
+    """Adds each ballot's payment and vote call followed by the `pool_budget`
+    calls that cover them to `atc`, returning the group's total fee"""
+    budgets = [
+        vote_budget(
+            batch.vote_type,
+            len(ballot.answer_ids),
+            fixed_vote_type=batch.fixed_vote_type,
+            tally_bytes=batch.tally_bytes,
+            packed_option_counts=batch.packed_option_counts,
+            sharded_tallies=batch.sharded_option_counts is not None,
+        )
+        for ballot in ballots
+    ]
+    calls = pool_budget_calls(budgets)
+    if 2 * len(ballots) + calls > MAX_GROUP_SIZE:
+        raise ValueError(
+            f"{len(ballots)} votes need {calls} pool_budget calls, which is more "
+            f"than fits in a group of {MAX_GROUP_SIZE}"
+        )
+    fee = MIN_TXN_FEE * (2 * len(ballots) + calls)
+    app_address = logic.get_application_address(batch.app_id)
+    vote = batch.contract.get_method_by_name("vote")
+    for ballot in ballots:
+        tally_boxes = (
+            [b"O", *tally_shard_names(ballot.answer_ids, batch.sharded_option_counts)]
+            if batch.sharded_option_counts is not None
+            else [b"V"]
+        )
+        payment = transaction.PaymentTxn(
+            ballot.sender,
+            _with_fee(batch.params, 0),
+            app_address,
+            vote_min_balance(len(ballot.answer_ids), batch.packed_option_counts),
+        )
+        atc.add_method_call(
+            app_id=batch.app_id,
+            method=vote,
+            sender=ballot.sender,
+            sp=_with_fee(batch.params, 0),
+            signer=ballot.signer,
+            method_args=[
+                TransactionWithSigner(payment, ballot.signer),
+                ballot.signature,
+                ballot.weighting,
+                ballot.answer_ids,
+                ballot.answer_weights,
+                batch.opup_app_id,
+            ],
+            boxes=[
+                *((batch.app_id, name) for name in tally_boxes),
+                (batch.app_id, encoding.decode_address(ballot.sender)),
+            ],
+        )
+    pool_budget = batch.contract.get_method_by_name("pool_budget")
+    for index in range(calls):
+        atc.add_method_call(
+            app_id=batch.app_id,
+            method=pool_budget,
+            sender=batch.relay,
+            sp=_with_fee(batch.params, fee if index == 0 else 0),
+            signer=batch.relay_signer,
+            # make each call unique, since they'd otherwise be identical
+            note=index.to_bytes(1, "big"),
+        )
+    return fee
+
+
+def _with_fee(
+    params: transaction.SuggestedParams, fee: int
+) -> transaction.SuggestedParams:
+    return transaction.SuggestedParams(
+        fee=fee,
+        first=params.first,
+        last=params.last,
+        gh=params.gh,
+        gen=params.gen,
+        flat_fee=True,
+    )
@@ -2,12 +2,22 @@ from typing import Literal, TypeAlias
 
 import beaker
 import beaker.lib.storage as storage
-from beaker.lib.strings import Itoa
 import pyteal as pt
 from pyteal.types import require_type
 
 from .op_up import OpUpState, op_up_blueprint
 
+from smart_contracts import constants
+from smart_contracts.budget import (
+    CLOSE_BUDGET,
+    PACKED_ANSWER_BUDGET,
+    RENDER_TALLY_BUDGET,
+    SCAN_QUESTION_BUDGET,
+    SIGNATURE_BUDGET,
+    VOTE_BUDGET,
+    max_questions,
+    question_budgets,
+)
 from smart_contracts.helpers.deployment_standard import deploy_time_permanence_control
 
 VoteIndexBytes: TypeAlias = Literal[8]
@@ -16,10 +26,10 @@ VoteCount: TypeAlias = pt.abi.Uint64
 VoteIndexArray: TypeAlias = pt.abi.DynamicArray[VoteIndex]
 VoteWeightArray: TypeAlias = pt.abi.DynamicArray[VoteCount]
 
-TYPE_NO_SNAPSHOT = pt.Int(0)
-TYPE_NO_WEIGHTING = pt.Int(1)
-TYPE_WEIGHTING = pt.Int(2)
-TYPE_PARTITIONED_WEIGHTING = pt.Int(3)
+TYPE_NO_SNAPSHOT = pt.Int(constants.TYPE_NO_SNAPSHOT)
+TYPE_NO_WEIGHTING = pt.Int(constants.TYPE_NO_WEIGHTING)
+TYPE_WEIGHTING = pt.Int(constants.TYPE_WEIGHTING)
+TYPE_PARTITIONED_WEIGHTING = pt.Int(constants.TYPE_PARTITIONED_WEIGHTING)
 
 
 class UInt64ScratchVar(pt.ScratchVar):
@@ -35,6 +45,18 @@ class StringScratchVar(pt.ScratchVar):
 ZERO = pt.Int(0)
 ONE = pt.Int(1)
 
+# Holds the tallies rendered so far when closing over several calls, see close_chunk
+RESULT_BOX_KEY = pt.Bytes("R")
+
+# Sharded tallies are split over boxes of up to 1KB, the reads and writes a box
+# reference allows, so a vote only references the shards its answers are in
+TALLY_SHARD_BYTES = 8 * constants.TALLY_SHARD_SIZE
+# A vote references the OpUp app, the voter's box, the offsets box and at most
+# every tally shard, which is up to 5 shards in a transaction's 8 references
+MAX_TALLY_SHARDS = constants.MAX_SHARDED_OPTIONS // constants.TALLY_SHARD_SIZE
+# Holds a uint16 offset per question and the total, which is well within 1KB
+OFFSETS_BOX_KEY = pt.Bytes("O")
+
 
 def ForRange(  # noqa: N802
     idx: pt.ScratchVar,
@@ -50,11 +72,53 @@ def ForRange(  # noqa: N802
     )
 
 
+# The decimal digits, and "00" to "99" so that a number's digits can be looked up
+# two at a time
+DIGITS = pt.Bytes("0123456789")
+DIGIT_PAIRS = pt.Bytes("".join(f"{pair:02d}" for pair in range(100)))
+
+
+def itoa(value: pt.Expr) -> pt.Expr:
+    """Renders a uint64 in decimal. Rather than recursing per digit like
+    beaker's Itoa its digits are looked up two at a time, from the last"""
+    return pt.If(
+        value < pt.Int(10),
+        pt.Extract(DIGITS, value, ONE),
+        pt.Seq(
+            (remaining := UInt64ScratchVar()).store(value),
+            (digits := StringScratchVar()).store(pt.Bytes("")),
+            pt.While(remaining.load() >= pt.Int(100)).Do(
+                digits.store(
+                    pt.Concat(
+                        pt.Extract(
+                            DIGIT_PAIRS,
+                            remaining.load() % pt.Int(100) * pt.Int(2),
+                            pt.Int(2),
+                        ),
+                        digits.load(),
+                    )
+                ),
+                remaining.store(remaining.load() / pt.Int(100)),
+            ),
+            # the first digit or two
+            pt.Concat(
+                pt.If(
+                    remaining.load() < pt.Int(10),
+                    pt.Extract(DIGITS, remaining.load(), ONE),
+                    pt.Extract(DIGIT_PAIRS, remaining.load() * pt.Int(2), pt.Int(2)),
+                ),
+                digits.load(),
+            ),
+        ),
+    )
+
+
 class TallyBox:
     def __init__(self, key: pt.Expr, vote_type: pt.abi.Uint):
         require_type(key, pt.TealType.bytes)
         self.key = key
-        self.element_size = pt.Int(vote_type.type_spec().byte_length_static())
+        self.byte_length = vote_type.type_spec().byte_length_static()
+        self.element_size = pt.Int(self.byte_length)
 
     @property
     def exists(self) -> pt.Expr:
@@ -69,38 +133,192 @@ class TallyBox:
             )
         )
 
-    def get_vote(self, index: pt.Expr, into: UInt64ScratchVar) -> pt.Expr:
+    def read(self, into: StringScratchVar) -> pt.Expr:
+        # read every tally in one go so a ballot (or the results) can be worked on
+        # in scratch space rather than with a box read / write per question
+        return pt.Seq(
+            contents := pt.BoxGet(self.key),
+            pt.Assert(contents.hasValue(), comment="Tally box not created"),
+            into.store(contents.value()),
+        )
+
+    def write(self, tallies: StringScratchVar) -> pt.Expr:
+        return pt.BoxPut(self.key, tallies.load())
+
+    def get_vote(self, tallies: StringScratchVar, index: pt.Expr) -> pt.Expr:
+        return self._extract(tallies.load(), self.element_size * index)
+
+    def _extract(self, tallies: pt.Expr, offset: pt.Expr) -> pt.Expr:
+        match self.byte_length:
+            case 2:
+                return pt.ExtractUint16(tallies, offset)
+            case 4:
+                return pt.ExtractUint32(tallies, offset)
+            case _:
+                return pt.ExtractUint64(tallies, offset)
+
+    def _encode(self, count: pt.Expr) -> pt.Expr:
+        if self.byte_length == 8:
+            return pt.Itob(count)
+        return pt.Seq(
+            (checked := UInt64ScratchVar()).store(count),
+            pt.Assert(
+                checked.load() < pt.Int(2 ** (8 * self.byte_length)),
+                comment="Tally overflow",
+            ),
+            pt.Extract(
+                pt.Itob(checked.load()),
+                pt.Int(8 - self.byte_length),
+                self.element_size,
+            ),
+        )
+
+    def increment_vote(
+        self, tallies: StringScratchVar, index: pt.Expr, increment_by: pt.Expr
+    ) -> pt.Expr:
         return pt.Seq(
             (offset := UInt64ScratchVar()).store(self.element_size * index),
-            into.store(
-                pt.Btoi(
-                    pt.BoxExtract(
-                        self.key,
-                        offset.load(),
-                        self.element_size,
-                    )
+            # patch the tally in the copy of the box held in scratch space, the
+            # caller writes it back to the box once all increments are applied
+            tallies.store(
+                pt.Replace(
+                    tallies.load(),
+                    offset.load(),
+                    self._encode(
+                        self._extract(tallies.load(), offset.load()) + increment_by
+                    ),
                 )
             ),
         )
 
-    def increment_vote(self, index: pt.Expr, increment_by: pt.Expr) -> pt.Expr:
+
+class ShardedTallyBox(TallyBox):
+    """Tallies split over several boxes of up to TALLY_SHARD_BYTES each, named by
+    the key followed by the shard's index as a byte. Each tally is read and
+    written in its shard, so the cost of a vote doesn't grow with the number of
+    options; `read` and `write` do nothing and the scratch var is unused"""
+
+    def __init__(self, key: bytes, vote_type: pt.abi.Uint):
+        super().__init__(pt.Bytes(key), vote_type)
+        self.shard_size = TALLY_SHARD_BYTES // self.byte_length
+        self.shard_key = pt.Bytes(key + b"\x00")
+
+    @property
+    def exists(self) -> pt.Expr:
+        return pt.Seq(maybe := pt.BoxLen(self.key_of(ZERO)), maybe.hasValue())
+
+    def key_of(self, index: pt.Expr) -> pt.Expr:
+        """The key of the shard holding tally `index`"""
+        return pt.SetByte(self.shard_key, ONE, index / pt.Int(self.shard_size))
+
+    def shards_count(self, total_options_count: pt.Expr) -> pt.Expr:
+        return (total_options_count + pt.Int(self.shard_size - 1)) / pt.Int(
+            self.shard_size
+        )
+
+    def create(self, total_options_count: pt.Expr) -> pt.Expr:
         return pt.Seq(
-            (offset := UInt64ScratchVar()).store(self.element_size * index),
-            # load the current value from the tally box
-            (current_vote_tally := UInt64ScratchVar()).store(
-                pt.Btoi(
-                    pt.BoxExtract(
-                        self.key,
-                        offset.load(),
-                        self.element_size,
+            (remaining := UInt64ScratchVar()).store(total_options_count),
+            (index := UInt64ScratchVar()).store(ZERO),
+            pt.While(remaining.load()).Do(
+                (size := UInt64ScratchVar()).store(
+                    pt.If(
+                        remaining.load() < pt.Int(self.shard_size),
+                        remaining.load(),
+                        pt.Int(self.shard_size),
                     )
-                )
+                ),
+                pt.Pop(
+                    pt.BoxCreate(
+                        self.key_of(index.load()), size.load() * self.element_size
+                    )
+                ),
+                index.store(index.load() + size.load()),
+                remaining.store(remaining.load() - size.load()),
             ),
-            # increment and store the tally
+        )
+
+    def min_balance(self, total_options_count: pt.Expr) -> pt.Expr:
+        return self.shards_count(total_options_count) * pt.Int(
+            beaker.consts.BOX_FLAT_MIN_BALANCE + 2 * beaker.consts.BOX_BYTE_MIN_BALANCE
+        ) + total_options_count * pt.Int(
+            self.byte_length * beaker.consts.BOX_BYTE_MIN_BALANCE
+        )
+
+    def read(self, into: StringScratchVar) -> pt.Expr:
+        return pt.Seq()
+
+    def write(self, tallies: StringScratchVar) -> pt.Expr:
+        return pt.Seq()
+
+    def _offset(self, index: pt.Expr) -> pt.Expr:
+        return index % pt.Int(self.shard_size) * self.element_size
+
+    def get_vote(self, tallies: StringScratchVar, index: pt.Expr) -> pt.Expr:
+        return pt.Btoi(
+            pt.BoxExtract(self.key_of(index), self._offset(index), self.element_size)
+        )
+
+    def increment_vote(
+        self, tallies: StringScratchVar, index: pt.Expr, increment_by: pt.Expr
+    ) -> pt.Expr:
+        return pt.Seq(
+            (key := StringScratchVar()).store(self.key_of(index)),
+            (offset := UInt64ScratchVar()).store(self._offset(index)),
             pt.BoxReplace(
-                self.key,
+                key.load(),
                 offset.load(),
-                pt.Itob(current_vote_tally.load() + increment_by),
+                self._encode(
+                    pt.Btoi(pt.BoxExtract(key.load(), offset.load(), self.element_size))
+                    + increment_by
+                ),
+            ),
+        )
+
+
+class PackedBallot:
+    """A voter's answers packed into as few bits as each question's option count
+    needs, first question in the most significant bits, which are built up in
+    two uint64s and encoded as the fewest whole bytes that hold them"""
+
+    def __init__(self) -> None:
+        self.high = UInt64ScratchVar()
+        self.low = UInt64ScratchVar()
+        self.bit_length = UInt64ScratchVar()
+
+    def clear(self) -> pt.Expr:
+        return pt.Seq(
+            self.high.store(ZERO),
+            self.low.store(ZERO),
+            self.bit_length.store(ZERO),
+        )
+
+    def append(self, answer: pt.Expr, option_count: pt.Expr) -> pt.Expr:
+        return pt.Seq(
+            # questions with a single option take no bits
+            (bits := UInt64ScratchVar()).store(pt.BitLen(option_count - ONE)),
+            pt.If(bits.load()).Then(
+                self.high.store(
+                    pt.ShiftLeft(self.high.load(), bits.load())
+                    | pt.ShiftRight(self.low.load(), pt.Int(64) - bits.load())
+                ),
+                self.low.store(pt.ShiftLeft(self.low.load(), bits.load()) | answer),
+                self.bit_length.store(self.bit_length.load() + bits.load()),
+            ),
+        )
+
+    def encode(self) -> pt.Expr:
+        return pt.Seq(
+            # a box can't be empty, so a ballot takes at least a byte
+            (byte_length := UInt64ScratchVar()).store(
+                pt.If(self.bit_length.load())
+                .Then((self.bit_length.load() + pt.Int(7)) / pt.Int(8))
+                .Else(ONE)
+            ),
+            pt.Extract(
+                pt.Concat(pt.Itob(self.high.load()), pt.Itob(self.low.load())),
+                pt.Int(16) - byte_length.load(),
+                byte_length.load(),
             ),
         )
 
@@ -173,15 +391,23 @@ class VotingState(OpUpState):
     option_counts = beaker.GlobalStateValue(
         pt.TealType.bytes, static=True, descr="The number of options for each question"
     )
-    tallies = TallyBox(key=pt.Bytes("V"), vote_type=VoteCount())
-
+    tallies_rendered = beaker.GlobalStateValue(
+        pt.TealType.uint64,
+        descr="The number of tallies rendered into the result box by close_chunk",
+    )
+    option_offsets = beaker.GlobalStateValue(
+        pt.TealType.bytes,
+        static=True,
+        descr="The tally index of the first option of each question followed by the "
+        "total number of options, one byte each",
+    )
     votes = storage.BoxMapping(
         key_type=pt.abi.Address,
         value_type=pt.abi.DynamicArray[pt.abi.StaticBytes[VoteIndexBytes]],
     )
 
-    def load_option_counts(self, into: VoteIndexArray) -> pt.Expr:
-        return into.decode(self.option_counts)
+    def __init__(self, tally_type: type[pt.abi.Uint] = VoteCount):
+        self.tallies = TallyBox(key=pt.Bytes("V"), vote_type=pt.abi.make(tally_type))
 
     def store_option_counts(self, data: VoteIndexArray) -> pt.Expr:
         return pt.Seq(
@@ -191,438 +417,958 @@ class VotingState(OpUpState):
             ),
             # option_counts won't fit with ABI encoding if length is > 112
             pt.Assert(
-                data.length() <= pt.Int(112),
-                comment="Can't have more than 112 questions",
+                data.length() <= pt.Int(constants.MAX_QUESTIONS),
+                comment=f"Can't have more than {constants.MAX_QUESTIONS} questions",
             ),
             self.option_counts.set(data.encode()),
-            (total_options := UInt64ScratchVar()).store(
-                self.calculate_total_options_count()
+            self.option_offsets.set(self.calculate_option_offsets(data)),
+            self.total_options.set(
+                pt.GetByte(self.option_offsets.get(), data.length())
             ),
-            # Need to have a reasonable limit, plus this ensures the results should fit
-            # into the 1000 byte limit for the transaction note of the result NFT and
-            # the 128 byte limit for global storage
+        )
+
+    def calculate_option_offsets(self, data: VoteIndexArray) -> pt.Expr:
+        return pt.Seq(
+            # work on the encoded array directly: a 2 byte length then a byte per count
+            (option_counts := StringScratchVar()).store(data.encode()),
+            (total := UInt64ScratchVar()).store(ZERO),
+            (questions_count := UInt64ScratchVar()).store(data.length()),
+            (offsets := StringScratchVar()).store(
+                pt.BytesZero(questions_count.load() + ONE)
+            ),
+            # This is called during create where the app has no MBR so we need to
+            # use the in-built op_up that creates and deletes the app in one go (no
+            # MBR needed); each question costs ~27 opcodes and the rest of create
+            # ~130, which needs to fit in the 4 inner transactions the dapps pay for
+            pt.OpUp(pt.OpUpMode.OnCall).ensure_budget(
+                questions_count.load() * pt.Int(27) + pt.Int(130),
+                pt.OpUpFeeSource.GroupCredit,
+            ),
+            ForRange(question_idx := UInt64ScratchVar(), stop=questions_count).Do(
+                total.store(
+                    total.load()
+                    + pt.GetByte(option_counts.load(), question_idx.load() + pt.Int(2))
+                ),
+                # Need to have a reasonable limit, plus this ensures the results
+                # should fit into the 1000 byte limit for the transaction note of
+                # the result NFT, the 128 byte limit for global storage and a
+                # byte per offset. Checked per question, before setbyte would fail
+                # on a total over 255
+                pt.Assert(
+                    total.load() <= pt.Int(constants.MAX_OPTIONS),
+                    comment=(
+                        f"Can't have more than {constants.MAX_OPTIONS} vote options"
+                    ),
+                ),
+                offsets.store(
+                    pt.SetByte(offsets.load(), question_idx.load() + ONE, total.load())
+                ),
+            ),
+            offsets.load(),
+        )
+
+
+class ShardedVotingState(VotingState):
+    """The state of a round with sharded tallies, whose option counts can be too
+    many for global state. create only keeps their hash, and bootstrap (which
+    can create boxes) is passed them again to store their offsets in a box"""
+
+    # in the offsets box instead
+    option_counts = None  # type: ignore[assignment]
+    option_offsets = None  # type: ignore[assignment]
+    option_counts_hash = beaker.GlobalStateValue(
+        pt.TealType.bytes,
+        static=True,
+        descr="The SHA-256 hash of the ABI encoded option counts the round was "
+        "created with",
+    )
+    result_box_count = beaker.GlobalStateValue(
+        pt.TealType.uint64,
+        descr="The number of result boxes the tallies have been rendered into",
+    )
+
+    tallies: ShardedTallyBox
+
+    def __init__(self, tally_type: type[pt.abi.Uint] = VoteCount):
+        self.tallies = ShardedTallyBox(key=b"V", vote_type=pt.abi.make(tally_type))
+
+    def store_option_counts(self, data: VoteIndexArray) -> pt.Expr:
+        return pt.Seq(
             pt.Assert(
-                total_options.load() <= pt.Int(128),
-                comment="Can't have more than 128 vote options",
+                data.length(),
+                comment="option_counts should be non-empty",
             ),
-            self.total_options.set(total_options.load()),
+            self.option_counts_hash.set(pt.Sha256(data.encode())),
         )
 
-    def calculate_total_options_count(self) -> pt.Expr:
+    def store_option_offsets(self, data: VoteIndexArray) -> pt.Expr:
         return pt.Seq(
-            self.load_option_counts(
-                into=(option_counts := pt.abi.make(VoteIndexArray))
+            pt.Assert(
+                pt.Sha256(data.encode()) == self.option_counts_hash.get(),
+                comment="option_counts should be the ones the round was created with",
             ),
-            pt.Seq(
-                (total := UInt64ScratchVar()).store(ZERO),
-                (questions_count := UInt64ScratchVar()).store(option_counts.length()),
-                ForRange(question_idx := UInt64ScratchVar(), stop=questions_count).Do(
-                    pt.If(
-                        pt.Global.opcode_budget() < pt.Int(100),
-                        # This is called during create where the app has no MBR
-                        # so we need to use the in-built op_up that creates and deletes
-                        # the app in one go (no MBR needed)
-                        pt.OpUp(pt.OpUpMode.OnCall).ensure_budget(
-                            pt.Int(600), pt.OpUpFeeSource.GroupCredit
-                        ),
-                    ),
-                    option_counts[question_idx.load()].use(
-                        lambda count: total.store(total.load() + count.get())
-                    ),
+            (offsets := StringScratchVar()).store(self.calculate_option_offsets(data)),
+            pt.BoxPut(OFFSETS_BOX_KEY, offsets.load()),
+            self.total_options.set(
+                pt.ExtractUint16(offsets.load(), data.length() * pt.Int(2))
+            ),
+        )
+
+    def calculate_option_offsets(self, data: VoteIndexArray) -> pt.Expr:
+        max_options = MAX_TALLY_SHARDS * self.tallies.shard_size
+        return pt.Seq(
+            (option_counts := StringScratchVar()).store(data.encode()),
+            (total := UInt64ScratchVar()).store(ZERO),
+            (questions_count := UInt64ScratchVar()).store(data.length()),
+            # a uint16 per offset, as there can be more than 255 options
+            (offsets := StringScratchVar()).store(
+                pt.BytesZero((questions_count.load() + ONE) * pt.Int(2))
+            ),
+            # bootstrap hasn't created the OpUp app yet, see VotingState
+            pt.OpUp(pt.OpUpMode.OnCall).ensure_budget(
+                questions_count.load() * pt.Int(30) + pt.Int(100),
+                pt.OpUpFeeSource.GroupCredit,
+            ),
+            ForRange(question_idx := UInt64ScratchVar(), stop=questions_count).Do(
+                total.store(
+                    total.load()
+                    + pt.GetByte(option_counts.load(), question_idx.load() + pt.Int(2))
+                ),
+                offsets.store(
+                    pt.Replace(
+                        offsets.load(),
+                        (question_idx.load() + ONE) * pt.Int(2),
+                        pt.Extract(pt.Itob(total.load()), pt.Int(6), pt.Int(2)),
+                    )
                 ),
-                total.load(),
             ),
+            pt.Assert(
+                total.load() <= pt.Int(max_options),
+                comment=f"Can't have more than {max_options} vote options",
+            ),
+            offsets.load(),
         )
 
 
-app = beaker.Application("VotingRoundApp", state=VotingState()).apply(
-    # Disallow a voting round app to be deleted in MainNet
-    # but allow deletion during local development
-    deploy_time_permanence_control,
-)
+class VotingPreconditions(pt.abi.NamedTuple):
+    is_voting_open: pt.abi.Field[pt.abi.Uint64]
+    is_allowed_to_vote: pt.abi.Field[pt.abi.Uint64]
+    has_already_voted: pt.abi.Field[pt.abi.Uint64]
+    current_time: pt.abi.Field[pt.abi.Uint64]
 
-# Allow for opup while only needing to create an app once
-(create_opup, call_opup) = op_up_blueprint(app)
-
-
-@app.create()
-def create(
-    vote_id: pt.abi.String,
-    vote_type: pt.abi.Uint8,
-    snapshot_public_key: pt.abi.DynamicBytes,
-    metadata_ipfs_cid: pt.abi.String,
-    start_time: pt.abi.Uint64,
-    end_time: pt.abi.Uint64,
-    option_counts: VoteIndexArray,
-    quorum: pt.abi.Uint64,
-    nft_image_url: pt.abi.String,
-) -> pt.Expr:
-    return pt.Seq(
-        pt.Assert(
-            # Technically this should be < but having <= makes automated testing easier
-            # since it's not possible to control time yet
-            start_time.get() <= end_time.get(),
-            comment="End time should be after start time",
-        ),
-        pt.Assert(
-            end_time.get() >= pt.Global.latest_timestamp(),
-            comment="End time should be in the future",
-        ),
-        pt.Assert(vote_type.get() <= pt.Int(3), comment="Vote type should be <= 3"),
-        app.state.vote_id.set(vote_id.get()),
-        app.state.vote_type.set(vote_type.get()),
-        app.state.snapshot_public_key.set(snapshot_public_key.get()),
-        app.state.metadata_ipfs_cid.set(metadata_ipfs_cid.get()),
-        app.state.start_time.set(start_time.get()),
-        app.state.end_time.set(end_time.get()),
-        app.state.quorum.set(quorum.get()),
-        app.state.is_bootstrapped.set(pt.Int(0)),
-        app.state.voter_count.set(pt.Int(0)),
-        app.state.close_time.set(pt.Int(0)),
-        app.state.nft_image_url.set(nft_image_url.get()),
-        app.state.nft_asset_id.set(pt.Int(0)),
-        app.state.store_option_counts(option_counts),
+
+def voting_app(
+    name: str = "VotingRoundApp",
+    *,
+    tally_type: type[pt.abi.Uint] = VoteCount,
+    fixed_vote_type: pt.Int | None = None,
+    packed_ballots: bool = False,
+    sharded_tallies: bool = False,
+) -> beaker.Application[VotingState]:
+    """Defines a voting round app, `tally_type` sets the width of the per option
+    counters in the tally box; narrower counters shrink the box (and so the MBR
+    paid in bootstrap) but only suit rounds where each voter adds 1 per option.
+
+    If `fixed_vote_type` is given the app only supports that vote type and the
+    checks on the vote type are resolved when compiling rather than at runtime.
+
+    With `packed_ballots` each voter's box holds their answers packed into as
+    few bits as the question's option count needs, first question first, rather
+    than the ABI encoded `answer_ids`, which cuts the MBR each voter pays.
+
+    With `sharded_tallies` the tallies are split over several boxes and the
+    option offsets are kept in a box rather than global state, which allows
+    more questions and options (see ShardedVotingState). bootstrap is also
+    passed the option counts, and the results are rendered into result boxes
+    that the result NFT's note refers to rather than into the note itself"""
+    if sharded_tallies and packed_ballots:
+        raise ValueError("Packed ballots only hold up to 128 bits of answers")
+    sharded_state = ShardedVotingState(tally_type) if sharded_tallies else None
+    app = beaker.Application(
+        name, state=sharded_state or VotingState(tally_type)
+    ).apply(
+        # Disallow a voting round app to be deleted in MainNet
+        # but allow deletion during local development
+        deploy_time_permanence_control,
     )
 
+    # Allow for opup while only needing to create an app once
+    create_opup, call_opup = op_up_blueprint(app)
 
-@app.external(authorize=beaker.Authorize.only_creator())
-def bootstrap(
-    fund_min_bal_req: pt.abi.PaymentTransaction,
-) -> pt.Expr:
-    pt.ScratchVar(pt.TealType.uint64)
-    min_bal_req = pt.ScratchVar(pt.TealType.uint64)
-    return pt.Seq(
-        pt.Assert(
-            pt.Not(app.state.is_bootstrapped.get()), comment="Already bootstrapped"
-        ),
-        app.state.is_bootstrapped.set(pt.Int(1)),
-        min_bal_req.store(
-            pt.Int(
-                # minimum balance req for: ALGOs + Vote result NFT asset
-                beaker.consts.ASSET_MIN_BALANCE * 2
-                # Opup app
-                + beaker.consts.ASSET_MIN_BALANCE
-                #  Create NFT fee
-                + 1000
-                # Tally box
-                + beaker.consts.BOX_FLAT_MIN_BALANCE
-                # Tally box key "V"
-                + beaker.consts.BOX_BYTE_MIN_BALANCE
+    # A subroutine per app, since PyTeal keeps the scratch slots of a shared one
+    # between builds, so an app's TEAL would depend on what was built before it
+    render_uint = pt.Subroutine(pt.TealType.bytes)(itoa)
+
+    def if_vote_type(
+        vote_types: list[pt.Int], then: pt.Expr, otherwise: pt.Expr | None = None
+    ) -> pt.Expr:
+        if fixed_vote_type is not None:
+            if fixed_vote_type.value in [t.value for t in vote_types]:
+                return then
+            return otherwise if otherwise is not None else pt.Seq()
+        condition = (
+            pt.Or(*[app.state.vote_type == t for t in vote_types])
+            if len(vote_types) > 1
+            else app.state.vote_type == vote_types[0]
+        )
+        return (
+            pt.If(condition, then, otherwise) if otherwise else pt.If(condition, then)
+        )
+
+    # The option offsets are a uint16 each in the offsets box when tallies are
+    # sharded, or a byte each in global state
+    offset_bytes = 2 if sharded_tallies else 1
+
+    def option_offsets() -> pt.Expr:
+        if not sharded_tallies:
+            return app.state.option_offsets.get()
+        return pt.Seq(
+            offsets := pt.BoxGet(OFFSETS_BOX_KEY),
+            # bootstrap creates the box
+            pt.Assert(offsets.hasValue(), comment="Voting not open"),
+            offsets.value(),
+        )
+
+    def option_offset(offsets: StringScratchVar, index: pt.Expr) -> pt.Expr:
+        if not sharded_tallies:
+            return pt.GetByte(offsets.load(), index)
+        return pt.ExtractUint16(offsets.load(), index * pt.Int(2))
+
+    def offsets_count(offsets: StringScratchVar) -> pt.Expr:
+        if not sharded_tallies:
+            return pt.Len(offsets.load())
+        return pt.Len(offsets.load()) / pt.Int(2)
+
+    # The opcode budget model for vote, where recording each answer costs more
+    # when the tallies are narrower than a uint64 (so need an overflow check) and
+    # when the vote type is checked at runtime rather than at compile time
+    question_budget, partitioned_question_budget = question_budgets(
+        fixed_vote_type=fixed_vote_type is not None,
+        tally_bytes=app.state.tallies.byte_length,
+        packed_ballots=packed_ballots,
+        sharded_tallies=sharded_tallies,
+    )
+
+    def packed_answers_budget(questions_count: pt.Expr) -> pt.Expr:
+        # each question with more than one option adds at least one to
+        # total_options - questions_count, so that or the number of questions,
+        # whichever is smaller, bounds the number of answers taking bits
+        extra_options = app.state.total_options.get() - questions_count
+        return pt.Int(PACKED_ANSWER_BUDGET) * pt.If(
+            extra_options < questions_count, extra_options, questions_count
+        )
+
+    def vote_budget(questions_count: pt.Expr) -> pt.Expr:
+        budget = (
+            pt.Int(VOTE_BUDGET)
+            + if_vote_type([TYPE_NO_SNAPSHOT], ZERO, pt.Int(SIGNATURE_BUDGET))
+            + questions_count
+            * if_vote_type(
+                [TYPE_PARTITIONED_WEIGHTING],
+                pt.Int(partitioned_question_budget),
+                pt.Int(question_budget),
+            )
+        )
+        if packed_ballots:
+            budget = budget + packed_answers_budget(questions_count)
+        return budget
+
+    # The most questions vote's budget allows for each vote type (no snapshot,
+    # signed, partitioned) in the 16 OpUp calls the dapps' vote fee pays for, for
+    # the apps that could otherwise hold more: beyond 80 to 112 questions the
+    # costliest packed ballot (as many two option questions as the 128 options
+    # allow) doesn't fit, nor do 95 to 140 sharded questions
+    question_limits: tuple[int, ...] | None = None
+    question_limit_comment = "Too many questions for this vote type"
+    if packed_ballots or sharded_tallies:
+        question_limits = tuple(
+            max_questions(
+                vote_type,
+                fixed_vote_type=fixed_vote_type is not None,
+                tally_bytes=app.state.tallies.byte_length,
+                packed_ballots=packed_ballots,
+                sharded_tallies=sharded_tallies,
+            )
+            for vote_type in (
+                constants.TYPE_NO_SNAPSHOT,
+                constants.TYPE_NO_WEIGHTING,
+                constants.TYPE_PARTITIONED_WEIGHTING,
             )
-            + (
-                # Tally box value
-                app.state.total_options.get()
-                * (
-                    pt.Int(
-                        pt.abi.make(VoteCount).type_spec().byte_length_static()
-                        * beaker.consts.BOX_BYTE_MIN_BALANCE
+        )
+    if packed_ballots:
+        question_limit_comment = "Too many questions to pack for this vote type"
+
+    def check_question_limit(questions_count: pt.Expr, vote_type: pt.Expr) -> pt.Expr:
+        assert question_limits is not None
+        no_snapshot_limit, signed_limit, partitioned_limit = question_limits
+        return pt.Assert(
+            questions_count
+            <= pt.If(vote_type == TYPE_NO_SNAPSHOT)
+            .Then(pt.Int(no_snapshot_limit))
+            .ElseIf(vote_type == TYPE_PARTITIONED_WEIGHTING)
+            .Then(pt.Int(partitioned_limit))
+            .Else(pt.Int(signed_limit)),
+            comment=question_limit_comment,
+        )
+
+    @app.create()
+    def create(
+        vote_id: pt.abi.String,
+        vote_type: pt.abi.Uint8,
+        snapshot_public_key: pt.abi.DynamicBytes,
+        metadata_ipfs_cid: pt.abi.String,
+        start_time: pt.abi.Uint64,
+        end_time: pt.abi.Uint64,
+        option_counts: VoteIndexArray,
+        quorum: pt.abi.Uint64,
+        nft_image_url: pt.abi.String,
+    ) -> pt.Expr:
+        return pt.Seq(
+            pt.Assert(
+                # Technically this should be < but having <= makes automated testing
+                # easier since it's not possible to control time yet
+                start_time.get() <= end_time.get(),
+                comment="End time should be after start time",
+            ),
+            pt.Assert(
+                end_time.get() >= pt.Global.latest_timestamp(),
+                comment="End time should be in the future",
+            ),
+            pt.Assert(vote_type.get() <= pt.Int(3), comment="Vote type should be <= 3"),
+            *(
+                [
+                    pt.Assert(
+                        vote_type.get() == fixed_vote_type,
+                        comment=f"Vote type should be {fixed_vote_type.value}",
                     )
+                ]
+                if fixed_vote_type is not None
+                else []
+            ),
+            *(
+                [
+                    # weighted votes can add far more than 1 to a tally per voter
+                    pt.Assert(
+                        vote_type.get() <= TYPE_NO_WEIGHTING,
+                        comment="Vote type should be <= 1 for compact tallies",
+                    )
+                ]
+                if app.state.tallies.byte_length < 8
+                else []
+            ),
+            *(
+                [check_question_limit(option_counts.length(), vote_type.get())]
+                if question_limits is not None
+                else []
+            ),
+            app.state.vote_id.set(vote_id.get()),
+            app.state.vote_type.set(vote_type.get()),
+            app.state.snapshot_public_key.set(snapshot_public_key.get()),
+            app.state.metadata_ipfs_cid.set(metadata_ipfs_cid.get()),
+            app.state.start_time.set(start_time.get()),
+            app.state.end_time.set(end_time.get()),
+            app.state.quorum.set(quorum.get()),
+            app.state.is_bootstrapped.set(pt.Int(0)),
+            app.state.voter_count.set(pt.Int(0)),
+            app.state.close_time.set(pt.Int(0)),
+            app.state.nft_image_url.set(nft_image_url.get()),
+            app.state.nft_asset_id.set(pt.Int(0)),
+            app.state.tallies_rendered.set(pt.Int(0)),
+            app.state.store_option_counts(option_counts),
+        )
+
+    def bootstrap_round(
+        fund_min_bal_req: pt.abi.PaymentTransaction,
+        boxes_min_balance: pt.Expr,
+        *prepare: pt.Expr,
+    ) -> pt.Expr:
+        """Checks the payment is for the round's minimum balance requirement, the
+        boxes' part of which is `boxes_min_balance`, after `prepare` has run, then
+        creates the tally box and the OpUp app"""
+        min_bal_req = pt.ScratchVar(pt.TealType.uint64)
+        return pt.Seq(
+            pt.Assert(
+                pt.Not(app.state.is_bootstrapped.get()), comment="Already bootstrapped"
+            ),
+            app.state.is_bootstrapped.set(pt.Int(1)),
+            *prepare,
+            min_bal_req.store(boxes_min_balance),
+            pt.Assert(
+                fund_min_bal_req.get().receiver()
+                == pt.Global.current_application_address(),
+                comment="Payment must be to app address",
+            ),
+            pt.Log(pt.Itob(min_bal_req.load())),
+            pt.Assert(
+                fund_min_bal_req.get().amount() == min_bal_req.load(),
+                comment="Payment must be for the exact min balance requirement",
+            ),
+            app.state.tallies.create(app.state.total_options.get()),
+            create_opup(),
+        )
+
+    round_min_balance = (
+        # minimum balance req for: ALGOs + Vote result NFT asset
+        beaker.consts.ASSET_MIN_BALANCE * 2
+        # Opup app
+        + beaker.consts.ASSET_MIN_BALANCE
+        #  Create NFT fee
+        + 1000
+    )
+
+    if sharded_state is not None:
+
+        @app.external(authorize=beaker.Authorize.only_creator(), name="bootstrap")
+        def bootstrap_sharded(
+            fund_min_bal_req: pt.abi.PaymentTransaction,
+            option_counts: VoteIndexArray,
+        ) -> pt.Expr:
+            return bootstrap_round(
+                fund_min_bal_req,
+                pt.Int(
+                    round_min_balance
+                    # Offsets box, key "O" and the total
+                    + beaker.consts.BOX_FLAT_MIN_BALANCE
+                    + 3 * beaker.consts.BOX_BYTE_MIN_BALANCE
                 )
+                # An offset per question
+                + option_counts.length()
+                * pt.Int(2 * beaker.consts.BOX_BYTE_MIN_BALANCE)
+                + sharded_state.tallies.min_balance(app.state.total_options.get()),
+                sharded_state.store_option_offsets(option_counts),
             )
-        ),
-        pt.Assert(
-            fund_min_bal_req.get().receiver()
-            == pt.Global.current_application_address(),
-            comment="Payment must be to app address",
-        ),
-        pt.Log(pt.Itob(min_bal_req.load())),
-        pt.Assert(
-            fund_min_bal_req.get().amount() == min_bal_req.load(),
-            comment="Payment must be for the exact min balance requirement",
-        ),
-        app.state.tallies.create(app.state.total_options.get()),
-        create_opup(),
-    )
 
+    else:
 
-@app.external(authorize=beaker.Authorize.only_creator())
-def close(opup_app: pt.abi.Application = app.state.opup_app_id) -> pt.Expr:  # type: ignore[assignment]
-    return pt.Seq(
-        pt.Assert(
-            opup_app.application_id() == app.state.opup_app_id.get(),
-            comment="OpUp app ID not passed in",
-        ),
-        call_opup(20000),
-        pt.Assert(app.state.close_time == pt.Int(0), comment="Already closed"),
-        app.state.close_time.set(pt.Global.latest_timestamp()),
-        (note := StringScratchVar()).store(
-            pt.Concat(
-                pt.Bytes(
-                    '{"standard":"arc69","description":"This is a voting result NFT'
-                    " for voting round with ID "
+        @app.external(authorize=beaker.Authorize.only_creator())
+        def bootstrap(
+            fund_min_bal_req: pt.abi.PaymentTransaction,
+        ) -> pt.Expr:
+            return bootstrap_round(
+                fund_min_bal_req,
+                pt.Int(
+                    round_min_balance
+                    # Tally box
+                    + beaker.consts.BOX_FLAT_MIN_BALANCE
+                    # Tally box key "V"
+                    + beaker.consts.BOX_BYTE_MIN_BALANCE
+                )
+                + (
+                    # Tally box value
+                    app.state.total_options.get()
+                    * (
+                        pt.Int(
+                            app.state.tallies.byte_length
+                            * beaker.consts.BOX_BYTE_MIN_BALANCE
+                        )
+                    )
                 ),
-                app.state.vote_id.get(),
-                pt.Bytes('.","properties":{"metadata":"ipfs://'),
-                app.state.metadata_ipfs_cid.get(),
-                pt.Bytes('","id":"'),
-                app.state.vote_id.get(),
-                pt.Bytes('","quorum":'),
-                Itoa(app.state.quorum.get()),
-                pt.Bytes(',"voterCount":'),
-                Itoa(app.state.voter_count.get()),
-                pt.Bytes(',"tallies":['),
             )
+
+    @app.external(authorize=beaker.Authorize.only_creator())
+    def close(
+        opup_app: pt.abi.Application = (
+            app.state.opup_app_id  # type: ignore[assignment]
         ),
-        app.state.load_option_counts(
-            into=(option_counts := pt.abi.make(VoteIndexArray))
+    ) -> pt.Expr:
+        if sharded_state is not None:
+            # Render what close_chunk hasn't into a last result box, and refer to
+            # the result boxes from the note, which the tallies could outgrow
+            render_results: pt.Expr = pt.If(
+                app.state.tallies_rendered < app.state.total_options
+            ).Then(
+                write_result_box(
+                    app.state.tallies_rendered.get(), app.state.total_options.get()
+                )
+            )
+            tallies_note = [
+                pt.Bytes(',"talliesBoxes":{"appId":'),
+                render_uint(pt.Global.current_application_id()),
+                pt.Bytes(',"count":'),
+                render_uint(sharded_state.result_box_count.get()),
+                pt.Bytes("}}}"),
+            ]
+        else:
+            # Pick up from any tallies already rendered by close_chunk
+            render_results = (tallies_json := StringScratchVar()).store(
+                pt.Concat(
+                    read_rendered_tallies(),
+                    render_tallies(
+                        app.state.tallies_rendered.get(), app.state.total_options.get()
+                    ),
+                )
+            )
+            tallies_note = [
+                pt.Bytes(',"tallies":['),
+                tallies_json.load(),
+                pt.Bytes("]}}"),
+            ]
+        return pt.Seq(
+            pt.Assert(
+                opup_app.application_id() == app.state.opup_app_id.get(),
+                comment="OpUp app ID not passed in",
+            ),
+            begin_close(),
+            render_results,
+            call_opup(CLOSE_BUDGET),
+            pt.InnerTxnBuilder.Execute(
+                {
+                    pt.TxnField.type_enum: pt.TxnType.AssetConfig,
+                    pt.TxnField.config_asset_total: pt.Int(1),
+                    pt.TxnField.config_asset_decimals: pt.Int(0),
+                    pt.TxnField.config_asset_default_frozen: pt.Int(0),
+                    pt.TxnField.config_asset_name: pt.Concat(
+                        pt.Bytes("[VOTE RESULT] "), app.state.vote_id.get()
+                    ),
+                    pt.TxnField.config_asset_unit_name: pt.Bytes("VOTERSLT"),
+                    pt.TxnField.config_asset_url: app.state.nft_image_url.get(),
+                    pt.TxnField.note: pt.Concat(
+                        pt.Bytes(
+                            '{"standard":"arc69",'
+                            '"description":"This is a voting result NFT'
+                            " for voting round with ID "
+                        ),
+                        app.state.vote_id.get(),
+                        pt.Bytes('.","properties":{"metadata":"ipfs://'),
+                        app.state.metadata_ipfs_cid.get(),
+                        pt.Bytes('","id":"'),
+                        app.state.vote_id.get(),
+                        pt.Bytes('","quorum":'),
+                        render_uint(app.state.quorum.get()),
+                        pt.Bytes(',"voterCount":'),
+                        render_uint(app.state.voter_count.get()),
+                        *tallies_note,
+                    ),
+                }
+            ),
+            app.state.nft_asset_id.set(pt.InnerTxn.created_asset_id()),
+        )
+
+    @app.external(authorize=beaker.Authorize.only_creator())
+    def close_chunk(
+        count: pt.abi.Uint16,
+        opup_app: pt.abi.Application = (
+            app.state.opup_app_id  # type: ignore[assignment]
         ),
-        (questions_count := UInt64ScratchVar()).store(option_counts.length()),
-        (current_tally := UInt64ScratchVar()).store(ZERO),
-        (current_index := UInt64ScratchVar()).store(ZERO),
-        ForRange(question_index := UInt64ScratchVar(), stop=questions_count).Do(
-            # Load the number of vote options for this question
-            option_counts[question_index.load()].store_into(
-                options_count_temp := VoteIndex()
-            ),
-            (options_count := UInt64ScratchVar()).store(options_count_temp.get()),
-            ForRange(option_index := UInt64ScratchVar(), stop=options_count).Do(
-                app.state.tallies.get_vote(current_index.load(), current_tally),
-                note.store(
-                    pt.Concat(
-                        note.load(),
-                        pt.If(option_index.load() == ZERO, pt.Bytes("["), pt.Bytes("")),
-                        Itoa(current_tally.load()),
-                        pt.If(
-                            option_index.load() == (options_count.load() - ONE),
+        *,
+        output: pt.abi.Uint16,
+    ) -> pt.Expr:
+        """Closes voting and renders the next `count` tallies of the result into the
+        result box, returning how many are left for the final call to `close`.
+
+        The app account needs to be funded for the result box's minimum balance
+        before the first call; it's freed again by `close`. With sharded tallies
+        each call renders into a result box of its own, which are kept as the
+        results the result NFT refers to, so need funding for good"""
+        return pt.Seq(
+            pt.Assert(
+                opup_app.application_id() == app.state.opup_app_id.get(),
+                comment="OpUp app ID not passed in",
+            ),
+            begin_close(),
+            (start := UInt64ScratchVar()).store(app.state.tallies_rendered.get()),
+            (stop := UInt64ScratchVar()).store(start.load() + count.get()),
+            pt.If(stop.load() > app.state.total_options.get()).Then(
+                stop.store(app.state.total_options.get())
+            ),
+            *(
+                [
+                    pt.If(stop.load() > start.load()).Then(
+                        write_result_box(start.load(), stop.load())
+                    )
+                ]
+                if sharded_tallies
+                else [
+                    pt.If(stop.load() > start.load()).Then(
+                        (tallies_json := StringScratchVar()).store(
                             pt.Concat(
-                                pt.Bytes("]"),
-                                pt.If(
-                                    question_index.load()
-                                    == (questions_count.load() - ONE),
-                                    pt.Bytes(""),
-                                    pt.Bytes(","),
-                                ),
-                            ),
-                            pt.Bytes(","),
+                                read_rendered_tallies(),
+                                render_tallies(start.load(), stop.load()),
+                            )
                         ),
+                        pt.BoxPut(RESULT_BOX_KEY, tallies_json.load()),
+                        app.state.tallies_rendered.set(stop.load()),
                     )
-                ),
-                current_index.store(current_index.load() + ONE),
+                ]
             ),
-        ),
-        pt.InnerTxnBuilder.Execute(
-            {
-                pt.TxnField.type_enum: pt.TxnType.AssetConfig,
-                pt.TxnField.config_asset_total: pt.Int(1),
-                pt.TxnField.config_asset_decimals: pt.Int(0),
-                pt.TxnField.config_asset_default_frozen: pt.Int(0),
-                pt.TxnField.config_asset_name: pt.Concat(
-                    pt.Bytes("[VOTE RESULT] "), app.state.vote_id.get()
-                ),
-                pt.TxnField.config_asset_unit_name: pt.Bytes("VOTERSLT"),
-                pt.TxnField.config_asset_url: app.state.nft_image_url.get(),
-                pt.TxnField.note: pt.Concat(note.load(), pt.Bytes("]}}")),
-            }
-        ),
-        app.state.nft_asset_id.set(pt.InnerTxn.created_asset_id()),
-    )
+            output.set(app.state.total_options.get() - stop.load()),
+        )
+
+    @pt.Subroutine(pt.TealType.none)
+    def begin_close() -> pt.Expr:
+        return pt.Seq(
+            pt.Assert(app.state.nft_asset_id == pt.Int(0), comment="Already closed"),
+            # Stop voting as soon as closing starts so tallies can't change between
+            # calls to close_chunk
+            pt.If(app.state.close_time == pt.Int(0)).Then(
+                app.state.close_time.set(pt.Global.latest_timestamp())
+            ),
+        )
 
+    @pt.Subroutine(pt.TealType.bytes)
+    def read_rendered_tallies() -> pt.Expr:
+        """Returns (and removes) the tallies rendered by close_chunk so far"""
+        return pt.Seq(
+            rendered := pt.BoxGet(RESULT_BOX_KEY),
+            pt.If(
+                rendered.hasValue(),
+                pt.Seq(pt.Pop(pt.BoxDelete(RESULT_BOX_KEY)), rendered.value()),
+                pt.Bytes(""),
+            ),
+        )
 
-# Helpers
+    @pt.Subroutine(pt.TealType.none)
+    def write_result_box(start: pt.Expr, stop: pt.Expr) -> pt.Expr:
+        """Renders tallies `start` to `stop` (exclusive) into the next result box,
+        named "R" followed by its index as a uint16, for sharded tallies"""
+        assert sharded_state is not None
+        result_box_count = sharded_state.result_box_count
+        return pt.Seq(
+            pt.BoxPut(
+                pt.Concat(
+                    pt.Bytes("R"),
+                    pt.Extract(pt.Itob(result_box_count.get()), pt.Int(6), pt.Int(2)),
+                ),
+                render_tallies(start, stop),
+            ),
+            # rather than fail creating the result NFT, which bootstrap paid for
+            pt.Assert(
+                pt.Balance(pt.Global.current_application_address())
+                >= pt.MinBalance(pt.Global.current_application_address())
+                + pt.Int(beaker.consts.ASSET_MIN_BALANCE + 1000),
+                comment="The app account should be funded for the result box",
+            ),
+            result_box_count.set(result_box_count.get() + ONE),
+            app.state.tallies_rendered.set(stop),
+        )
 
+    @pt.Subroutine(pt.TealType.bytes)
+    def render_tallies(start: pt.Expr, stop: pt.Expr) -> pt.Expr:
+        """Renders tallies `start` to `stop` (exclusive) of the ARC-69 tallies array,
+        i.e. a JSON array of counts per question with commas between questions.
 
-@pt.Subroutine(pt.TealType.uint64)
-def allowed_to_vote(
-    signature: pt.Expr, weighting: pt.Expr, opup_app: pt.abi.Application
-) -> pt.Expr:
-    return pt.Seq(
-        pt.If(
-            app.state.vote_type == TYPE_NO_SNAPSHOT,
-            pt.Int(1),
-            pt.Seq(
-                pt.Assert(
-                    opup_app.application_id() == app.state.opup_app_id.get(),
-                    comment="OpUp app ID not passed in",
+        A question's opening bracket is rendered along with the closing one of
+        the question before it, so the only check per tally is whether it's the
+        last of its question"""
+        return pt.Seq(
+            # all 1s marks the end so moving past the last question stops by itself
+            (offsets := StringScratchVar()).store(
+                pt.Concat(option_offsets(), pt.Bytes("base16", "ff" * offset_bytes))
+            ),
+            app.state.tallies.read(into=(tallies := StringScratchVar())),
+            (rendered := StringScratchVar()).store(
+                pt.If(pt.And(start == ZERO, stop > ZERO), pt.Bytes("["), pt.Bytes(""))
+            ),
+            (question_index := UInt64ScratchVar()).store(ZERO),
+            # Find the question the first tally belongs to
+            pt.If(start > ZERO).Then(
+                call_opup(offsets_count(offsets) * pt.Int(SCAN_QUESTION_BUDGET))
+            ),
+            pt.While(option_offset(offsets, question_index.load() + ONE) <= start).Do(
+                question_index.store(question_index.load() + ONE)
+            ),
+            (question_end := UInt64ScratchVar()).store(
+                option_offset(offsets, question_index.load() + ONE)
+            ),
+            (tally_index := UInt64ScratchVar()).store(start),
+            pt.While(tally_index.load() < stop).Do(
+                # only spend OpUp calls on the tallies that are actually rendered
+                call_opup(RENDER_TALLY_BUDGET),
+                rendered.store(
+                    pt.Concat(
+                        rendered.load(),
+                        render_uint(
+                            app.state.tallies.get_vote(tallies, tally_index.load())
+                        ),
+                    )
                 ),
-                call_opup(2000),
+                tally_index.store(tally_index.load() + ONE),
+                pt.If(tally_index.load() == question_end.load())
+                .Then(
+                    rendered.store(
+                        pt.Concat(
+                            rendered.load(),
+                            pt.If(
+                                tally_index.load() == app.state.total_options.get(),
+                                pt.Bytes("]"),
+                                pt.Bytes("],["),
+                            ),
+                        )
+                    ),
+                    # Move on to the next question with any options
+                    question_index.store(question_index.load() + ONE),
+                    pt.While(
+                        option_offset(offsets, question_index.load() + ONE)
+                        <= tally_index.load()
+                    ).Do(question_index.store(question_index.load() + ONE)),
+                    question_end.store(
+                        option_offset(offsets, question_index.load() + ONE)
+                    ),
+                )
+                .Else(rendered.store(pt.Concat(rendered.load(), pt.Bytes(",")))),
+            ),
+            rendered.load(),
+        )
+
+    # Helpers
+
+    @pt.Subroutine(pt.TealType.uint64)
+    def allowed_to_vote(signature: pt.Expr, weighting: pt.Expr) -> pt.Expr:
+        """Checks the snapshot signature, the caller needs to have made sure
+        there's the budget for it, which vote does along with the rest of its
+        budget"""
+        return pt.Seq(
+            if_vote_type(
+                [TYPE_NO_SNAPSHOT],
+                pt.Int(1),
                 pt.Ed25519Verify_Bare(
-                    pt.If(
-                        app.state.vote_type == TYPE_NO_WEIGHTING,
+                    if_vote_type(
+                        [TYPE_NO_WEIGHTING],
                         pt.Txn.sender(),
                         pt.Concat(pt.Txn.sender(), pt.Itob(weighting)),
                     ),
                     signature,
                     app.state.snapshot_public_key.get(),
                 ),
-            ),
+            )
         )
-    )
-
-
-@pt.Subroutine(pt.TealType.uint64)
-def voting_open() -> pt.Expr:
-    return pt.And(
-        pt.Eq(app.state.is_bootstrapped.get(), pt.Int(1)),
-        pt.Eq(app.state.close_time.get(), pt.Int(0)),
-        pt.Global.latest_timestamp() >= app.state.start_time,
-        pt.Global.latest_timestamp() < app.state.end_time,
-    )
-
-
-@pt.Subroutine(pt.TealType.uint64)
-def already_voted() -> pt.Expr:
-    return pt.Seq(
-        (voter := pt.abi.Address()).set(pt.Txn.sender()),
-        app.state.votes[voter].exists(),
-    )
-
-
-# Readonly data methods
 
+    @pt.Subroutine(pt.TealType.uint64)
+    def voting_open() -> pt.Expr:
+        return pt.And(
+            pt.Eq(app.state.is_bootstrapped.get(), pt.Int(1)),
+            pt.Eq(app.state.close_time.get(), pt.Int(0)),
+            pt.Global.latest_timestamp() >= app.state.start_time,
+            pt.Global.latest_timestamp() < app.state.end_time,
+        )
 
-class VotingPreconditions(pt.abi.NamedTuple):
-    is_voting_open: pt.abi.Field[pt.abi.Uint64]
-    is_allowed_to_vote: pt.abi.Field[pt.abi.Uint64]
-    has_already_voted: pt.abi.Field[pt.abi.Uint64]
-    current_time: pt.abi.Field[pt.abi.Uint64]
+    @pt.Subroutine(pt.TealType.uint64)
+    def already_voted() -> pt.Expr:
+        return pt.Seq(
+            (voter := pt.abi.Address()).set(pt.Txn.sender()),
+            app.state.votes[voter].exists(),
+        )
 
+    # Readonly data methods
 
-@app.external(read_only=True)
-def get_preconditions(
-    signature: pt.abi.DynamicBytes,
-    weighting: pt.abi.Uint64,
-    opup_app: pt.abi.Application = app.state.opup_app_id,  # type: ignore[assignment]
-    *,
-    output: VotingPreconditions,
-) -> pt.Expr:
-    return pt.Seq(
-        (is_voting_open := pt.abi.Uint64()).set(voting_open()),
-        (is_allowed_to_vote := pt.abi.Uint64()).set(
-            allowed_to_vote(signature.get(), weighting.get(), opup_app)
+    @app.external(read_only=True)
+    def get_preconditions(
+        signature: pt.abi.DynamicBytes,
+        weighting: pt.abi.Uint64,
+        opup_app: pt.abi.Application = (
+            app.state.opup_app_id  # type: ignore[assignment]
         ),
-        (has_already_voted := pt.abi.Uint64()).set(already_voted()),
-        (current_time := pt.abi.Uint64()).set(pt.Global.latest_timestamp()),
-        output.set(is_voting_open, is_allowed_to_vote, has_already_voted, current_time),
-    )
-
-
-# Actions
+        *,
+        output: VotingPreconditions,
+    ) -> pt.Expr:
+        return pt.Seq(
+            if_vote_type(
+                [TYPE_NO_SNAPSHOT],
+                pt.Seq(),
+                pt.Seq(
+                    pt.Assert(
+                        opup_app.application_id() == app.state.opup_app_id.get(),
+                        comment="OpUp app ID not passed in",
+                    ),
+                    call_opup(SIGNATURE_BUDGET, batch=True),
+                ),
+            ),
+            (is_voting_open := pt.abi.Uint64()).set(voting_open()),
+            (is_allowed_to_vote := pt.abi.Uint64()).set(
+                allowed_to_vote(signature.get(), weighting.get())
+            ),
+            (has_already_voted := pt.abi.Uint64()).set(already_voted()),
+            (current_time := pt.abi.Uint64()).set(pt.Global.latest_timestamp()),
+            output.set(
+                is_voting_open, is_allowed_to_vote, has_already_voted, current_time
+            ),
+        )
 
+    # Actions
 
-@app.external()
-def vote(
-    fund_min_bal_req: pt.abi.PaymentTransaction,
-    signature: pt.abi.DynamicBytes,
-    weighting: pt.abi.Uint64,
-    answer_ids: VoteIndexArray,
-    answer_weights: VoteWeightArray,
-    opup_app: pt.abi.Application = app.state.opup_app_id,  # type: ignore[assignment]
-) -> pt.Expr:
-    return pt.Seq(
-        pt.Assert(
-            opup_app.application_id() == app.state.opup_app_id.get(),
-            comment="OpUp app ID not passed in",
-        ),
-        # Check voting preconditions
-        pt.Assert(
-            allowed_to_vote(signature.get(), weighting.get(), opup_app),
-            comment="Not allowed to vote",
+    @app.external()
+    def vote(
+        fund_min_bal_req: pt.abi.PaymentTransaction,
+        signature: pt.abi.DynamicBytes,
+        weighting: pt.abi.Uint64,
+        answer_ids: VoteIndexArray,
+        answer_weights: VoteWeightArray,
+        opup_app: pt.abi.Application = (
+            app.state.opup_app_id  # type: ignore[assignment]
         ),
-        pt.Assert(voting_open(), comment="Voting not open"),
-        pt.Assert(pt.Not(already_voted()), comment="Already voted"),
-        # Check vote array looks valid
-        app.state.load_option_counts(
-            into=(option_counts := pt.abi.make(VoteIndexArray))
-        ),
-        (questions_count := UInt64ScratchVar()).store(option_counts.length()),
-        pt.Assert(
-            answer_ids.length() == questions_count.load(),
-            comment="Number of answers incorrect",
-        ),
-        pt.If(
-            app.state.vote_type == TYPE_PARTITIONED_WEIGHTING,
+    ) -> pt.Expr:
+        ballot = PackedBallot()
+        return pt.Seq(
             pt.Assert(
-                answer_weights.length() == questions_count.load(),
-                comment="Number of answer weights incorrect, should match number "
-                "of questions since this vote uses partitioned weighting",
+                opup_app.application_id() == app.state.opup_app_id.get(),
+                comment="OpUp app ID not passed in",
             ),
+            (offsets := StringScratchVar()).store(option_offsets()),
+            (questions_count := UInt64ScratchVar()).store(offsets_count(offsets) - ONE),
+            # Get all the budget the vote needs in one go
+            call_opup(vote_budget(questions_count.load()), batch=True),
+            # Check voting preconditions
             pt.Assert(
-                answer_weights.length() == pt.Int(0),
-                comment="Number of answer weights should be 0 since this vote "
-                "doesn't use partitioned weighting",
+                allowed_to_vote(signature.get(), weighting.get()),
+                comment="Not allowed to vote",
             ),
-        ),
-        # Check voter box is funded
-        (min_bal_req := UInt64ScratchVar()).store(
-            pt.Int(beaker.consts.BOX_FLAT_MIN_BALANCE)
-            + (
-                pt.Int(32 + 2)
-                + pt.Int(VoteIndex().type_spec().byte_length_static())
-                * answer_ids.length()
-            )
-            * pt.Int(beaker.consts.BOX_BYTE_MIN_BALANCE)
-        ),
-        pt.Assert(
-            fund_min_bal_req.get().receiver()
-            == pt.Global.current_application_address(),
-            comment="Payment must be to app address",
-        ),
-        pt.Log(pt.Itob(min_bal_req.load())),
-        pt.Assert(
-            fund_min_bal_req.get().amount() == min_bal_req.load(),
-            comment="Payment must be the exact min balance requirement",
-        ),
-        # Record the vote for each question
-        (cumulative_offset := UInt64ScratchVar()).store(ZERO),
-        (weight_total := UInt64ScratchVar()).store(ZERO),
-        ForRange(question_index := UInt64ScratchVar(), stop=questions_count).Do(
-            pt.If(
-                pt.Global.opcode_budget() < pt.Int(100),
-                call_opup(680),
+            pt.Assert(voting_open(), comment="Voting not open"),
+            pt.Assert(pt.Not(already_voted()), comment="Already voted"),
+            # Check vote array looks valid
+            pt.Assert(
+                answer_ids.length() == questions_count.load(),
+                comment="Number of answers incorrect",
             ),
-            # Load the user's vote for this question
-            answer_ids[question_index.load()].store_into(
-                answer_option_index := VoteIndex()
+            if_vote_type(
+                [TYPE_PARTITIONED_WEIGHTING],
+                pt.Assert(
+                    answer_weights.length() == questions_count.load(),
+                    comment="Number of answer weights incorrect, should match number "
+                    "of questions since this vote uses partitioned weighting",
+                ),
+                pt.Assert(
+                    answer_weights.length() == pt.Int(0),
+                    comment="Number of answer weights should be 0 since this vote "
+                    "doesn't use partitioned weighting",
+                ),
             ),
-            # Load the user's weight for this question
-            (answer_weight := VoteCount()).set(pt.Int(0)),
-            pt.If(
-                app.state.vote_type == TYPE_PARTITIONED_WEIGHTING,
-                answer_weights[question_index.load()].store_into(answer_weight),
+            # Check voter box is funded
+            pt.Assert(
+                fund_min_bal_req.get().receiver()
+                == pt.Global.current_application_address(),
+                comment="Payment must be to app address",
             ),
-            # Load the number of vote options for this question
-            option_counts[question_index.load()].store_into(
-                options_count := VoteIndex()
+            # the size of a packed ballot is only known once it's packed
+            *(
+                [ballot.clear()]
+                if packed_ballots
+                else [check_vote_payment(fund_min_bal_req, answer_ids.length())]
             ),
-            # Validate option index
-            pt.Assert(
-                answer_option_index.get() < options_count.get(),
-                comment="Answer option index invalid",
-            ),
-            # Increment the tally: the index into the tally is the cumulative option
-            # count from all the questions so far + the vote option for this question
-            app.state.tallies.increment_vote(
-                index=cumulative_offset.load() + answer_option_index.get(),
-                increment_by=pt.If(
-                    pt.Or(
-                        app.state.vote_type == TYPE_NO_SNAPSHOT,
-                        app.state.vote_type == TYPE_NO_WEIGHTING,
-                    ),
-                    ONE,
-                    pt.If(
-                        app.state.vote_type == TYPE_WEIGHTING,
-                        weighting.get(),
-                        # TYPE_PARTITIONED_WEIGHTING
+            # Record the vote for each question
+            app.state.tallies.read(into=(tallies := StringScratchVar())),
+            # Unless the weighting is partitioned, each question's tally is incremented
+            # by the same amount so work it out once rather than per question
+            (vote_weight := UInt64ScratchVar()).store(
+                if_vote_type(
+                    [TYPE_NO_SNAPSHOT, TYPE_NO_WEIGHTING], ONE, weighting.get()
+                )
+            ),
+            (weight_total := UInt64ScratchVar()).store(ZERO),
+            ForRange(question_index := UInt64ScratchVar(), stop=questions_count).Do(
+                # Load the user's vote for this question
+                answer_ids[question_index.load()].store_into(
+                    answer_option_index := VoteIndex()
+                ),
+                # Load the user's weight for this question
+                (answer_weight := VoteCount()).set(pt.Int(0)),
+                if_vote_type(
+                    [TYPE_PARTITIONED_WEIGHTING],
+                    answer_weights[question_index.load()].store_into(answer_weight),
+                ),
+                # The index into the tally is the offset of this question's first
+                # option + the vote option for this question, which has to fall
+                # before the next question's first option
+                (tally_index := UInt64ScratchVar()).store(
+                    option_offset(offsets, question_index.load())
+                    + answer_option_index.get()
+                ),
+                pt.Assert(
+                    tally_index.load()
+                    < option_offset(offsets, question_index.load() + ONE),
+                    comment="Answer option index invalid",
+                ),
+                app.state.tallies.increment_vote(
+                    tallies,
+                    index=tally_index.load(),
+                    increment_by=if_vote_type(
+                        [TYPE_PARTITIONED_WEIGHTING],
                         answer_weight.get(),
+                        vote_weight.load(),
                     ),
                 ),
+                # Increment weight total
+                if_vote_type(
+                    [TYPE_PARTITIONED_WEIGHTING],
+                    weight_total.store(weight_total.load() + answer_weight.get()),
+                ),
+                *(
+                    [
+                        ballot.append(
+                            answer_option_index.get(),
+                            option_count=pt.GetByte(
+                                offsets.load(), question_index.load() + ONE
+                            )
+                            - pt.GetByte(offsets.load(), question_index.load()),
+                        )
+                    ]
+                    if packed_ballots
+                    else []
+                ),
             ),
-            # compute offset for start of next question
-            cumulative_offset.store(cumulative_offset.load() + options_count.get()),
-            # Increment weight total
-            pt.If(
-                app.state.vote_type == TYPE_PARTITIONED_WEIGHTING,
-                weight_total.store(weight_total.load() + answer_weight.get()),
+            if_vote_type(
+                [TYPE_PARTITIONED_WEIGHTING],
+                pt.Assert(
+                    weight_total.load() == weighting.get(),
+                    comment="Didn't partition exact voting weight across questions",
+                ),
             ),
-        ),
-        pt.If(
-            app.state.vote_type == TYPE_PARTITIONED_WEIGHTING,
+            app.state.tallies.write(tallies),
+            (voter := pt.abi.Address()).set(pt.Txn.sender()),
+            *(
+                [
+                    (packed := StringScratchVar()).store(ballot.encode()),
+                    check_vote_payment(fund_min_bal_req, pt.Len(packed.load())),
+                    app.state.votes[voter].set(packed.load()),
+                ]
+                if packed_ballots
+                else [app.state.votes[voter].set(answer_ids.encode())]
+            ),
+            app.state.voter_count.set(app.state.voter_count.get() + ONE),
+        )
+
+    def check_vote_payment(
+        payment: pt.abi.PaymentTransaction, ballot_length: pt.Expr
+    ) -> pt.Expr:
+        """Checks the payment covers the MBR of the voter's box, which holds a
+        ballot of `ballot_length` bytes, after a 2 byte length unless ballots
+        are packed"""
+        return pt.Seq(
+            (min_bal_req := UInt64ScratchVar()).store(
+                pt.Int(beaker.consts.BOX_FLAT_MIN_BALANCE)
+                + (pt.Int(32 if packed_ballots else 32 + 2) + ballot_length)
+                * pt.Int(beaker.consts.BOX_BYTE_MIN_BALANCE)
+            ),
+            pt.Log(pt.Itob(min_bal_req.load())),
             pt.Assert(
-                weight_total.load() == weighting.get(),
-                comment="Didn't partition exact voting weight across questions",
+                payment.get().amount() == min_bal_req.load(),
+                comment="Payment must be the exact min balance requirement",
             ),
-        ),
-        (voter := pt.abi.Address()).set(pt.Txn.sender()),
-        app.state.votes[voter].set(answer_ids.encode()),
-        app.state.voter_count.set(app.state.voter_count.get() + ONE),
-    )
+        )
+
+    return app
+
+
+app = voting_app()
+# For unweighted rounds, where a tally can't exceed the number of voters
+compact_tallies_app = voting_app("VotingRoundAppCompact", tally_type=pt.abi.Uint32)
+# Packs each voter's answers into as few bits as the option counts allow
+packed_ballots_app = voting_app("VotingRoundAppPackedBallots", packed_ballots=True)
+# Specialised to a single vote type, saving the vote type checks on every vote
+no_snapshot_app = voting_app(
+    "VotingRoundAppNoSnapshot", fixed_vote_type=TYPE_NO_SNAPSHOT
+)
+no_weighting_app = voting_app(
+    "VotingRoundAppNoWeighting", fixed_vote_type=TYPE_NO_WEIGHTING
+)
+weighting_app = voting_app("VotingRoundAppWeighting", fixed_vote_type=TYPE_WEIGHTING)
+partitioned_weighting_app = voting_app(
+    "VotingRoundAppPartitionedWeighting", fixed_vote_type=TYPE_PARTITIONED_WEIGHTING
+)
+vote_type_apps = [
+    no_snapshot_app,
+    no_weighting_app,
+    weighting_app,
+    partitioned_weighting_app,
+]
+# For rounds with more questions or options than fit in global state and a box
+sharded_tallies_app = voting_app("VotingRoundAppSharded", sharded_tallies=True)
@@ -0,0 +1,287 @@
+import json
+import os
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import nacl.signing
+import pytest
+
+from smart_contracts.constants import TALLY_SHARD_SIZE
+from smart_contracts.helpers.avm import MIN_TXN_FEE, Ledger, Transaction
+from smart_contracts.helpers.avm_client import AppClient, CallResult
+from smart_contracts.vote_batch import bootstrap_min_balance, vote_min_balance
+
+artifact_path = Path(__file__).parent.parent / "smart_contracts" / "artifacts"
+
+NO_SNAPSHOT = 0
+NO_WEIGHTING = 1
+WEIGHTING = 2
+PARTITIONED_WEIGHTING = 3
+
+# The fees the dapps pay, so tests fail if a method needs more inner transactions
+CREATE_FEE = 1_000 + 4 * 1_000
+BOOTSTRAP_FEE = 2_000
+# VotingRoundAppSharded works out the option offsets in bootstrap, with OpUp calls
+# for up to its 140 questions
+SHARDED_BOOTSTRAP_FEE = BOOTSTRAP_FEE + 6 * 1_000
+VOTE_FEE = 1_000 + 16 * 1_000
+CLOSE_FEE = 1_000 + 30 * 1_000
+
+
+def load_app_spec(app_name: str) -> dict:
+    return dict(json.loads((artifact_path / app_name / "application.json").read_text()))
+
+
+@dataclass
+class Voter:
+    address: bytes
+    signature: bytes
+    weighting: int
+
+
+@dataclass
+class VotingRound:
+    """A voting round deployed to an in-process Ledger, with helpers mirroring
+    how the dapps call it"""
+
+    ledger: Ledger
+    client: AppClient
+    creator: bytes
+    signing_key: nacl.signing.SigningKey
+    vote_type: int
+    option_counts: list[int]
+    vote_id: str = "V1"
+    quorum: int = 10
+    tally_bytes: int = 8
+    packed_ballots: bool = False
+    sharded_tallies: bool = False
+    opup_app_id: int = 0
+    _voters: int = field(default=0, repr=False)
+
+    @property
+    def total_options(self) -> int:
+        return sum(self.option_counts)
+
+    @property
+    def global_state(self) -> dict[bytes, Any]:
+        return self.ledger.apps[self.client.app_id].global_state
+
+    @property
+    def boxes(self) -> dict[bytes, bytearray]:
+        return self.ledger.apps[self.client.app_id].boxes
+
+    def tally_boxes(self, start: int = 0, stop: int | None = None) -> list[bytes]:
+        """The names of the boxes holding tallies `start` to `stop` (exclusive),
+        one box unless the tallies are sharded"""
+        if not self.sharded_tallies:
+            return [b"V"]
+        stop = self.total_options if stop is None else stop
+        shards = range(start // TALLY_SHARD_SIZE, -(-stop // TALLY_SHARD_SIZE))
+        return [b"O", *(b"V" + bytes([shard]) for shard in shards)]
+
+    def result_boxes(self) -> list[bytes]:
+        """The name of the box close and close_chunk render the tallies into next"""
+        if not self.sharded_tallies:
+            return [b"R"]
+        count = self.global_state.get(b"result_box_count", 0)
+        return [b"R" + count.to_bytes(2, "big")]
+
+    def bootstrap(self) -> CallResult:
+        min_balance = bootstrap_min_balance(
+            self.option_counts, self.tally_bytes, sharded_tallies=self.sharded_tallies
+        )
+        # the sharded app is passed the option counts again
+        args = [self.option_counts] if self.sharded_tallies else []
+        result = self.client.call(
+            self.creator,
+            "bootstrap",
+            Transaction.payment(
+                self.creator, self.client.address, min_balance, MIN_TXN_FEE
+            ),
+            *args,
+            boxes=[(0, name) for name in self.tally_boxes()],
+            fee=SHARDED_BOOTSTRAP_FEE if self.sharded_tallies else BOOTSTRAP_FEE,
+        )
+        self.opup_app_id = self.global_state[b"ouaid"]
+        return result
+
+    def get_voter(self, weighting: int = 0) -> Voter:
+        self._voters += 1
+        address = self._voters.to_bytes(32, "big")
+        self.ledger.fund(address, 2_000_000)
+        if self.vote_type == NO_SNAPSHOT:
+            signature = b""
+        elif self.vote_type == NO_WEIGHTING:
+            signature = self.signing_key.sign(address).signature
+        else:
+            message = address + weighting.to_bytes(8, "big")
+            signature = self.signing_key.sign(message).signature
+        return Voter(address, signature, weighting)
+
+    def vote(
+        self,
+        voter: Voter,
+        answer_ids: list[int] | None = None,
+        answer_weights: list[int] | None = None,
+        *,
+        payment: int | None = None,
+    ) -> CallResult:
+        if answer_ids is None:
+            answer_ids = [count - 1 for count in self.option_counts]
+        if answer_weights is None:
+            answer_weights = []
+            if self.vote_type == PARTITIONED_WEIGHTING:
+                questions = len(self.option_counts)
+                answer_weights = [1] * questions
+                answer_weights[-1] = voter.weighting - questions + 1
+        if payment is None:
+            payment = vote_min_balance(
+                len(answer_ids), self.option_counts if self.packed_ballots else None
+            )
+        tally_boxes = [b"V"]
+        if self.sharded_tallies:
+            # only the shards the answers are counted in, like the dapps
+            tallies = {
+                sum(self.option_counts[:index]) + answer
+                for index, answer in enumerate(answer_ids)
+            }
+            tally_boxes = sorted(
+                {
+                    name
+                    for tally in tallies
+                    for name in self.tally_boxes(tally, tally + 1)
+                }
+            )
+        return self.client.call(
+            voter.address,
+            "vote",
+            Transaction.payment(
+                voter.address, self.client.address, payment, MIN_TXN_FEE
+            ),
+            voter.signature,
+            voter.weighting,
+            answer_ids,
+            answer_weights,
+            self.opup_app_id,
+            boxes=[(0, name) for name in (*tally_boxes, voter.address)],
+            fee=VOTE_FEE,
+        )
+
+    def get_preconditions(self, voter: Voter) -> tuple[int, int, int, int]:
+        result, _, _ = self.client.call(
+            voter.address,
+            "get_preconditions",
+            voter.signature,
+            voter.weighting,
+            self.opup_app_id,
+            boxes=[(0, voter.address)],
+            fee=VOTE_FEE,
+        )
+        return tuple(result)
+
+    def close(self, fee: int = CLOSE_FEE) -> CallResult:
+        return self.client.call(
+            self.creator,
+            "close",
+            self.opup_app_id,
+            boxes=self.close_boxes(self.total_options),
+            fee=fee,
+        )
+
+    def close_chunk(self, count: int, fee: int = VOTE_FEE) -> CallResult:
+        return self.client.call(
+            self.creator,
+            "close_chunk",
+            count,
+            self.opup_app_id,
+            boxes=self.close_boxes(count),
+            fee=fee,
+        )
+
+    def close_boxes(self, count: int) -> list[tuple[int, bytes]]:
+        """The boxes rendering the next `count` tallies references"""
+        start = self.global_state.get(b"tallies_rendered", 0)
+        stop = min(start + count, self.total_options)
+        names = [*self.tally_boxes(start, stop), *self.result_boxes()]
+        return [(0, name) for name in names]
+
+    def tallies(self) -> list[int]:
+        if self.sharded_tallies:
+            shards = sorted(name for name in self.boxes if name[:1] == b"V")
+            box = b"".join(bytes(self.boxes[name]) for name in shards)
+        else:
+            box = bytes(self.boxes[b"V"])
+        width = self.tally_bytes
+        return [
+            int.from_bytes(box[i : i + width], "big") for i in range(0, len(box), width)
+        ]
+
+    def result_note(self, close_result: CallResult) -> dict:
+        _, call_result, _ = close_result
+        note = call_result.inner_transactions[-1].transaction.fields["Note"]
+        return dict(json.loads(note))
+
+
+@pytest.fixture(scope="session")
+def opup_spec() -> dict:
+    return load_app_spec("OpUpApp")
+
+
+@pytest.fixture()
+def ledger(opup_spec: dict) -> Ledger:
+    ledger = Ledger()
+    # the OpUp app is created by an inner transaction in bootstrap
+    AppClient(ledger, opup_spec).register_programs()
+    return ledger
+
+
+@pytest.fixture()
+def create_round(ledger: Ledger) -> Callable[..., VotingRound]:
+    """Creates a voting round, by default an unweighted snapshot round of the
+    generic app that opens now and closes in 1000 seconds"""
+
+    def create(
+        option_counts: list[int],
+        vote_type: int = NO_WEIGHTING,
+        *,
+        app_name: str = "VotingRoundApp",
+        start: int | None = None,
+        end: int | None = None,
+    ) -> VotingRound:
+        creator = b"C" * 32
+        ledger.fund(creator, 10**12)
+        signing_key = nacl.signing.SigningKey(os.urandom(32))
+        client = AppClient(ledger, load_app_spec(app_name), {"DELETABLE": 1})
+        start = ledger.timestamp if start is None else start
+        end = start + 1000 if end is None else end
+        voting_round = VotingRound(
+            ledger,
+            client,
+            creator,
+            signing_key,
+            vote_type,
+            option_counts,
+            tally_bytes=4 if app_name == "VotingRoundAppCompact" else 8,
+            packed_ballots=app_name == "VotingRoundAppPackedBallots",
+            sharded_tallies=app_name == "VotingRoundAppSharded",
+        )
+        client.call(
+            creator,
+            "create",
+            voting_round.vote_id,
+            vote_type,
+            bytes(signing_key.verify_key) if vote_type != NO_SNAPSHOT else b"",
+            "CID",
+            start,
+            end,
+            option_counts,
+            voting_round.quorum,
+            "ipfs://cid",
+            fee=CREATE_FEE,
+            create=True,
+        )
+        return voting_round
+
+    return create
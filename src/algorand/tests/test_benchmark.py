@@ -0,0 +1,49 @@
+from smart_contracts import config
+from smart_contracts.benchmark import APPS, Measurement, find_regressions
+
+
+def test_find_regressions() -> None:
+    baseline = {
+        "vote/5q-9o/weighting": {
+            "opcode_cost": 1000,
+            "inner_transactions": 2,
+            "fee": 4000,
+        }
+    }
+
+    within = find_regressions(
+        {
+            "vote/5q-9o/weighting": Measurement(1050, 2, 3000),
+            "close/5q-9o/weighting": Measurement(5000, 8, 10000),
+        },
+        baseline,
+        0.05,
+    )
+    beyond = find_regressions(
+        {"vote/5q-9o/weighting": Measurement(1051, 3, 4000)}, baseline, 0.05
+    )
+
+    assert within == []
+    assert beyond == [
+        "vote/5q-9o/weighting opcode_cost: 1051 > 1000 (+5%)",
+        "vote/5q-9o/weighting inner_transactions: 3 > 2 (+5%)",
+    ]
+
+
+def test_find_regressions_reports_missing_results() -> None:
+    measurement = {"opcode_cost": 1000, "inner_transactions": 2, "fee": 4000}
+    baseline = {
+        "vote/5q-9o/weighting": measurement,
+        "close/5q-9o/weighting": measurement,
+    }
+
+    regressions = find_regressions(
+        {"vote/5q-9o/weighting": Measurement(1000, 2, 4000)}, baseline, 0.05
+    )
+
+    assert regressions == ["close/5q-9o/weighting: missing from the results"]
+
+
+def test_apps_covers_every_voting_app() -> None:
+    # a new app needs declaring with how it's built to be benchmarked
+    assert set(APPS) == set(config.contracts) - {"OpUpApp"}
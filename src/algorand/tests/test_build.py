@@ -0,0 +1,132 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from smart_contracts import config
+from smart_contracts.helpers.assembler import TealAssemblyError, assemble
+from smart_contracts.helpers.build import build
+
+artifact_path = Path(__file__).parent.parent / "smart_contracts" / "artifacts"
+
+
+def test_assemble() -> None:
+    teal = """#pragma version 8
+intcblock 0 1 300
+bytecblock 0x68656c6c6f
+txn NumAppArgs
+intc_0 // 0
+==
+bnz main_l2
+bytec_0 // "hello"
+log
+intc_2 // 300
+pop
+main_l2:
+intc_1 // 1
+return
+"""
+    program = assemble(teal)
+
+    assert program.bytecode == bytes.fromhex(
+        "08"  # version
+        "20030001ac02"  # intcblock 0 1 300
+        "26010568656c6c6f"  # bytecblock "hello"
+        "311b"  # txn NumAppArgs
+        "2212"  # intc_0, ==
+        "400004"  # bnz over the next 4 bytes
+        "28b02448"  # bytec_0, log, intc_2, pop
+        "2343"  # intc_1, return
+    )
+    assert program.pc_to_line[0x13] == 7
+
+
+def test_assemble_reports_line() -> None:
+    with pytest.raises(TealAssemblyError, match="line 3: ") as error:
+        assemble("#pragma version 8\npushint 1\nnot_an_op\nreturn\n")
+
+    assert error.value.line == 3
+
+
+@pytest.fixture(scope="module")
+def built_app(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """VotingRoundApp built offline, once since PyTeal numbers scratch slots
+    differently when an app is built more than once in the same process"""
+    app = config.load_contract("VotingRoundApp")
+    output_dir = tmp_path_factory.mktemp("artifacts") / app.name
+    build(output_dir, app)
+    return output_dir
+
+
+def test_build_offline(built_app: Path) -> None:
+    built = sorted(built_app.glob("[!.]*"))
+
+    assert [path.name for path in built] == [
+        "application.json",
+        "approval.profile.json",
+        "approval.teal",
+        "clear.teal",
+        "contract.json",
+    ]
+    for path in built:
+        assert (
+            path.read_bytes()
+            == (artifact_path / built_app.name / path.name).read_bytes()
+        )
+
+
+def test_build_skips_unchanged(built_app: Path, tmp_path: Path) -> None:
+    app = config.load_contract("VotingRoundApp")
+    output_dir = tmp_path / app.name
+    shutil.copytree(built_app, output_dir)
+    contract = output_dir / "contract.json"
+    contract_mtime = contract.stat().st_mtime_ns
+    stale = output_dir / "stale.teal"
+    stale.write_text("")
+
+    build(output_dir, app)
+    skipped = stale.exists()
+    (output_dir / "clear.teal").write_text("")
+    build(output_dir, app, force=True)
+
+    assert skipped
+    assert not stale.exists()
+    assert (output_dir / "clear.teal").read_bytes() == (
+        built_app / "clear.teal"
+    ).read_bytes()
+    assert contract.stat().st_mtime_ns == contract_mtime
+
+
+def test_parallel_build(tmp_path: Path) -> None:
+    # in a new process, since PyTeal numbers scratch slots differently when an
+    # app is built more than once in the same process
+    script = (
+        "from pathlib import Path\n"
+        "from smart_contracts import __main__ as cli\n"
+        f"cli.artifact_path = Path({str(tmp_path)!r})\n"
+        "cli.main(['build', '--jobs', '2'])\n"
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=artifact_path.parent.parent,
+        capture_output=True,
+        check=True,
+    )
+
+    for name in config.contracts:
+        output_dir = tmp_path / name
+        # no temporary files are left behind by the atomic writes
+        assert sorted(path.name for path in output_dir.iterdir()) == [
+            ".build_hash",
+            "application.json",
+            "approval.profile.json",
+            "approval.teal",
+            "clear.teal",
+            "contract.json",
+        ]
+        for path in output_dir.glob("[!.]*"):
+            expected = artifact_path / name / path.name
+            assert path.read_bytes() == expected.read_bytes()
@@ -0,0 +1,127 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from smart_contracts import config
+from smart_contracts.__main__ import main
+
+package_path = Path(__file__).parent.parent
+
+
+@pytest.mark.parametrize("command", [["list"], ["inspect", "VotingRoundApp"]])
+def test_command_does_not_import_pyteal(command: list[str]) -> None:
+    script = (
+        "import sys\n"
+        "from smart_contracts.__main__ import main\n"
+        f"main({command!r})\n"
+        "print(sorted({'pyteal', 'beaker', 'algokit_utils'} & set(sys.modules)))\n"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=package_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+def test_list(capsys: pytest.CaptureFixture[str]) -> None:
+    assert main(["list"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines] == list(config.contracts)
+
+
+def test_inspect(capsys: pytest.CaptureFixture[str]) -> None:
+    assert main(["inspect", "VotingRoundApp"]) == 0
+
+    out = capsys.readouterr().out
+    assert "global state: 11 uints, 6 byte slices" in out
+    assert "vote(pay,byte[],uint64,uint8[],uint64[],application)void" in out
+    assert "read-only" in out
+
+
+def test_registered_contracts_load() -> None:
+    for name in config.contracts:
+        assert config.load_contract(name).name == name
+
+
+def test_profile_program() -> None:
+    from smart_contracts.helpers.teal_profile import diff_profiles, profile_program
+
+    teal = """#pragma version 8
+intcblock 0 1
+txn NumAppArgs
+intc_0 // 0
+==
+bnz main_l2
+callsub count_0
+return
+main_l2:
+intc_1 // 1
+return
+
+// count to 3
+count_0:
+proto 0 1
+intc_0 // 0
+count_0_l1:
+dup
+pushint 3 // 3
+<
+bz count_0_l2
+intc_1 // 1
++
+b count_0_l1
+count_0_l2:
+retsub
+"""
+    profile = profile_program(teal, {"count": "counter.py:7"})
+    sections = {section["name"]: section for section in profile["sections"]}
+
+    assert list(sections) == ["constants", "router", "count"]
+    assert sum(section["bytes"] for section in sections.values()) == profile["bytes"]
+    assert sections["router"]["calls"] == ["count"]
+    assert sections["count"]["kind"] == "subroutine"
+    assert sections["count"]["source"] == "counter.py:7"
+    assert sections["count"]["ops"] == 10
+    assert sections["count"]["loops"] == [
+        {"label": "count_0_l1", "line": 18, "ops": 7, "cost": 7, "calls": []}
+    ]
+    assert diff_profiles(profile, profile) == []
+    smaller = profile_program(teal.replace("pushint 3 // 3\n<", "intc_1 // 1\n<"))
+    assert diff_profiles(profile, smaller) == [
+        "count: bytes 16 (-1), ops 10 (+0), cost 10 (+0)",
+        "program: bytes 34 (-1)",
+    ]
+
+
+def test_python_functions_prefer_earlier_files(tmp_path: Path) -> None:
+    from smart_contracts.helpers.teal_profile import python_functions
+
+    package = tmp_path / "voting.py"
+    package.write_text(
+        "def itoa():\n    pass\n\n\n@subroutine\ndef count():\n    pass\n"
+    )
+    library = tmp_path / "strings.py"
+    library.write_text(
+        "def count():\n    pass\n\n\n@subroutine\ndef Itoa():\n    pass\n"
+    )
+
+    functions = python_functions([package, library])
+
+    assert functions == {"itoa": "voting.py:1", "count": "voting.py:6"}
+
+
+def test_inspect_profile(capsys: pytest.CaptureFixture[str]) -> None:
+    assert main(["inspect", "VotingRoundApp", "--profile"]) == 0
+
+    rows = capsys.readouterr().out.splitlines()
+    vote = next(row for row in rows if row.startswith("vote "))
+    assert "voting.py:" in vote
+    assert rows[rows.index(vote) + 1].lstrip().startswith("loop at vote_")
@@ -0,0 +1,413 @@
+"""Checks the off-chain tooling agrees with the contract it mirrors"""
+
+import subprocess
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pytest
+from algosdk import encoding
+from conftest import (
+    NO_SNAPSHOT,
+    NO_WEIGHTING,
+    PARTITIONED_WEIGHTING,
+    WEIGHTING,
+    Voter,
+    VotingRound,
+    load_app_spec,
+)
+
+from smart_contracts import preconditions, snapshot
+from smart_contracts.ballots import Rejection, validate_ballots
+from smart_contracts.helpers.avm import LogicError
+from smart_contracts.helpers.avm_client import LedgerAlgodClient
+from smart_contracts.preconditions import PreconditionsCache, RoundState
+from smart_contracts.recount import SnapshotWeights, recount
+from smart_contracts.results import (
+    decode_option_counts,
+    decode_option_offsets,
+    decode_result_boxes,
+    decode_tallies,
+    decode_votes,
+    join_tally_boxes,
+)
+
+CreateRound = Callable[..., VotingRound]
+
+
+@pytest.mark.parametrize("vote_type", [NO_WEIGHTING, WEIGHTING])
+def test_snapshot_signatures_are_accepted(
+    create_round: CreateRound, tmp_path: Path, vote_type: int
+) -> None:
+    voting_round = create_round([2], vote_type)
+    voting_round.bootstrap()
+    rows = [(voting_round.get_voter().address, weight) for weight in (5, 7, 9)]
+    path = tmp_path / "snapshot.bin"
+    entries = snapshot.sign_entries(
+        voting_round.signing_key,
+        rows,
+        weighted=vote_type == WEIGHTING,
+        jobs=2,
+        chunk_size=2,
+    )
+    snapshot.write_snapshot(
+        path,
+        bytes(voting_round.signing_key.verify_key),
+        entries,
+        weighted=vote_type == WEIGHTING,
+    )
+
+    with snapshot.SnapshotReader(path) as reader:
+        found = [reader.get(address) for address, _ in rows]
+        missing = reader.get(bytes(32))
+    for entry in found:
+        assert entry is not None
+        voting_round.vote(Voter(entry.address, entry.signature, entry.weight), [1])
+
+    assert missing is None
+    expected = 3 if vote_type == NO_WEIGHTING else 5 + 7 + 9
+    assert voting_round.tallies() == [0, expected]
+
+
+def test_snapshot_rejects_duplicates(tmp_path: Path) -> None:
+    entries = [bytes(104), bytes(104)]
+
+    with pytest.raises(ValueError, match="more than once"):
+        snapshot.write_snapshot(tmp_path / "s.bin", bytes(32), entries, weighted=False)
+
+
+def test_snapshot_cli_signs_with_jobs(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    addresses = [encoding.encode_address(bytes([i]) * 32) for i in range(1, 4)]
+    csv_path = tmp_path / "holders.csv"
+    csv_path.write_text(
+        "address,weight\n" + "".join(f"{address},5\n" for address in addresses)
+    )
+    path = tmp_path / "snapshot.bin"
+
+    assert (
+        snapshot.main(
+            ["sign", str(csv_path), str(path), "--jobs", "1", "--chunk-size", "2"]
+        )
+        == 0
+    )
+
+    assert "snapshot_public_key" in capsys.readouterr().out
+    with snapshot.SnapshotReader(path) as reader:
+        assert all(address in reader for address in addresses)
+        assert encoding.decode_address(addresses[0]) in reader
+        assert encoding.encode_address(bytes(32)) not in reader
+        assert 1 not in reader
+
+
+@pytest.mark.parametrize("module", ["snapshot", "vote_batch", "budget"])
+def test_module_does_not_import_pyteal(module: str) -> None:
+    script = (
+        "import sys\n"
+        f"import smart_contracts.{module}\n"
+        "print(sorted({'pyteal', 'beaker', 'algokit_utils'} & set(sys.modules)))\n"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+@pytest.mark.parametrize(
+    "vote_type", [NO_SNAPSHOT, NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING]
+)
+def test_preconditions_match_contract(
+    create_round: CreateRound, vote_type: int
+) -> None:
+    voting_round = create_round([2, 2], vote_type)
+    voting_round.bootstrap()
+    algod = LedgerAlgodClient(voting_round.ledger)
+    cache = PreconditionsCache(
+        algod,  # type: ignore[arg-type]
+        current_time=lambda: voting_round.ledger.timestamp,
+    )
+    voter = voting_round.get_voter(weighting=10)
+    impostor = Voter(voter.address, bytes(64), voter.weighting)
+    app_id = voting_round.client.app_id
+
+    def check(checked_voter: Voter) -> None:
+        expected = voting_round.get_preconditions(checked_voter)
+        actual = cache.get_preconditions(
+            app_id, checked_voter.address, checked_voter.signature, voter.weighting
+        )
+        assert (
+            actual.is_voting_open,
+            actual.is_allowed_to_vote,
+            actual.has_already_voted,
+        ) == tuple(bool(value) for value in expected[:3])
+
+    check(voter)
+    check(impostor)
+    voting_round.vote(voter)
+    cache.mark_voted(app_id, voter.address)
+    check(voter)
+    requests = algod.request_count
+    check(voter)
+    assert algod.request_count == requests
+
+
+def test_preconditions_signature_checks_outlive_ttl(
+    create_round: CreateRound, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    voting_round = create_round([2], WEIGHTING)
+    voting_round.bootstrap()
+    now = [0.0]
+    cache = PreconditionsCache(
+        LedgerAlgodClient(voting_round.ledger),  # type: ignore[arg-type]
+        clock=lambda: now[0],
+        current_time=lambda: voting_round.ledger.timestamp,
+    )
+    checks: list[int] = []
+    is_allowed_to_vote = preconditions.is_allowed_to_vote
+
+    def counted(
+        state: RoundState, sender: bytes, signature: bytes, weighting: int
+    ) -> bool:
+        checks.append(weighting)
+        return is_allowed_to_vote(state, sender, signature, weighting)
+
+    monkeypatch.setattr(preconditions, "is_allowed_to_vote", counted)
+    voter = voting_round.get_voter(weighting=10)
+    app_id = voting_round.client.app_id
+
+    def allowed(weighting: int) -> bool:
+        return cache.get_preconditions(
+            app_id, voter.address, voter.signature, weighting
+        ).is_allowed_to_vote
+
+    assert allowed(10)
+    now[0] += 2 * preconditions.DEFAULT_TTL
+    assert allowed(10)
+    assert not allowed(11)
+
+    assert checks == [10, 11]
+
+
+def test_ballot_validation_matches_contract(create_round: CreateRound) -> None:
+    option_counts = [3, 1, 2]
+    ballots = [
+        ([2, 0, 1], [1, 1, 8], Rejection.NONE),
+        ([2, 0], [1, 1, 8], Rejection.ANSWER_COUNT),
+        ([2, 0, 1], [1, 9], Rejection.ANSWER_WEIGHT_COUNT),
+        ([3, 0, 1], [1, 1, 8], Rejection.ANSWER_INDEX),
+        ([2, 0, 1], [1, 1, 9], Rejection.PARTITION_SUM),
+    ]
+    rejections = validate_ballots(
+        option_counts,
+        PARTITIONED_WEIGHTING,
+        [answer_ids for answer_ids, _, _ in ballots],
+        [answer_weights for _, answer_weights, _ in ballots],
+        weightings=np.full(len(ballots), 10),
+    )
+
+    assert list(rejections) == [expected for _, _, expected in ballots]
+    for (answer_ids, answer_weights, _), rejection in zip(
+        ballots, rejections, strict=True
+    ):
+        voting_round = create_round(option_counts, PARTITIONED_WEIGHTING)
+        voting_round.bootstrap()
+        voter = voting_round.get_voter(weighting=10)
+        if rejection == Rejection.NONE:
+            voting_round.vote(voter, answer_ids, answer_weights)
+        else:
+            with pytest.raises(LogicError):
+                voting_round.vote(voter, answer_ids, answer_weights)
+
+
+@pytest.mark.parametrize("app_name", ["VotingRoundApp", "VotingRoundAppCompact"])
+def test_results_decode_boxes(create_round: CreateRound, app_name: str) -> None:
+    voting_round = create_round([3, 1, 2], app_name=app_name)
+    voting_round.bootstrap()
+    voters = [voting_round.get_voter() for _ in range(2)]
+    for voter, answer_ids in zip(voters, ([0, 0, 1], [2, 0, 1]), strict=True):
+        voting_round.vote(voter, answer_ids)
+    boxes = {name: bytes(value) for name, value in voting_round.boxes.items()}
+
+    option_counts = decode_option_counts(voting_round.global_state[b"option_counts"])
+    tallies = decode_tallies(boxes[b"V"], option_counts, voting_round.tally_bytes)
+    addresses, answers = decode_votes(boxes, len(option_counts))
+
+    assert option_counts == [3, 1, 2]
+    assert [list(question) for question in tallies] == [[1, 0, 1], [2], [0, 2]]
+    votes = {
+        bytes(address): list(answer)
+        for address, answer in zip(addresses, answers, strict=True)
+    }
+    assert votes == {voters[0].address: [0, 0, 1], voters[1].address: [2, 0, 1]}
+
+
+def test_packed_ballot_validation_checks_payment_last(
+    create_round: CreateRound,
+) -> None:
+    voting_round = create_round(
+        [3, 1, 2], NO_SNAPSHOT, app_name="VotingRoundAppPackedBallots"
+    )
+    voting_round.bootstrap()
+    payments = [2_500 + 400 * 33, 2_500 + 400 * 37, 2_500 + 400 * 37]
+    rejections = validate_ballots(
+        [3, 1, 2],
+        NO_SNAPSHOT,
+        [[2, 0, 1], [2, 0, 1], [3, 0, 1]],
+        payments=payments,
+        packed_ballots=True,
+    )
+
+    assert list(rejections) == [
+        Rejection.NONE,
+        Rejection.PAYMENT_AMOUNT,
+        Rejection.ANSWER_INDEX,
+    ]
+    with pytest.raises(LogicError, match="Answer option index invalid"):
+        voting_round.vote(voting_round.get_voter(), [3, 0, 1], payment=payments[2])
+    with pytest.raises(LogicError, match="exact min balance requirement"):
+        voting_round.vote(voting_round.get_voter(), [2, 0, 1], payment=payments[1])
+    voting_round.vote(voting_round.get_voter(), [2, 0, 1], payment=payments[0])
+
+
+@pytest.mark.parametrize(
+    "app_name",
+    [
+        "VotingRoundApp",
+        "VotingRoundAppCompact",
+        "VotingRoundAppPackedBallots",
+        "VotingRoundAppSharded",
+    ],
+)
+def test_recount_matches_tally_box(create_round: CreateRound, app_name: str) -> None:
+    voting_round = create_round([3, 1, 2], app_name=app_name)
+    voting_round.bootstrap()
+    for answer_ids in ([0, 0, 1], [2, 0, 1], [2, 0, 0]):
+        voting_round.vote(voting_round.get_voter(), answer_ids)
+
+    def boxes() -> list[tuple[bytes, bytes]]:
+        return [(name, bytes(value)) for name, value in voting_round.boxes.items()]
+
+    result = recount(
+        boxes(),
+        [3, 1, 2],
+        NO_WEIGHTING,
+        tally_bytes=voting_round.tally_bytes,
+        packed_ballots=voting_round.packed_ballots,
+    )
+    voting_round.boxes[b"V\x00" if voting_round.sharded_tallies else b"V"][0] ^= 1
+    tampered = recount(
+        boxes(),
+        [3, 1, 2],
+        NO_WEIGHTING,
+        tally_bytes=voting_round.tally_bytes,
+        packed_ballots=voting_round.packed_ballots,
+    )
+
+    assert result.voter_count == 3
+    assert list(result.tallies) == [1, 0, 2, 3, 1, 2]
+    assert result.mismatches == []
+    assert len(tampered.mismatches) == 1
+
+
+@pytest.mark.parametrize("vote_type", [WEIGHTING, PARTITIONED_WEIGHTING])
+def test_recount_weighs_votes_from_snapshot(
+    create_round: CreateRound, tmp_path: Path, vote_type: int
+) -> None:
+    voting_round = create_round([3, 1, 2], vote_type)
+    voting_round.bootstrap()
+    voters = [voting_round.get_voter(weighting) for weighting in (5, 7, 9)]
+    for voter, answer_ids in zip(
+        voters, ([0, 0, 1], [2, 0, 1], [2, 0, 0]), strict=True
+    ):
+        voting_round.vote(voter, answer_ids)
+
+    def weights(voters: list[Voter]) -> SnapshotWeights:
+        path = tmp_path / f"{len(voters)}.bin"
+        rows = [(voter.address, voter.weighting) for voter in voters]
+        entries = snapshot.sign_entries(voting_round.signing_key, rows, weighted=True)
+        public_key = bytes(voting_round.signing_key.verify_key)
+        snapshot.write_snapshot(path, public_key, entries, weighted=True)
+        return SnapshotWeights(snapshot.SnapshotReader(path))
+
+    def boxes() -> list[tuple[bytes, bytes]]:
+        return [(name, bytes(value)) for name, value in voting_round.boxes.items()]
+
+    result = recount(boxes(), [3, 1, 2], vote_type, weights=weights(voters))
+    voting_round.boxes[b"V"][0] ^= 1
+    tampered = recount(boxes(), [3, 1, 2], vote_type, weights=weights(voters))
+
+    assert result.voter_count == 3
+    assert result.mismatches == []
+    if vote_type == WEIGHTING:
+        assert list(result.tallies) == [5, 0, 16, 21, 9, 12]
+        assert [(m.question, m.option) for m in tampered.mismatches] == [(0, 0)]
+    else:
+        assert not result.tallies.any()
+        assert [(m.question, m.recount) for m in tampered.mismatches] == [(None, 21)]
+    for snapshot_voters in (voters[:2], []):
+        with pytest.raises(ValueError, match="isn't in the snapshot"):
+            recount(boxes(), [3, 1, 2], vote_type, weights=weights(snapshot_voters))
+
+
+def test_decode_sharded_results(create_round: CreateRound) -> None:
+    voting_round = create_round([200, 3], app_name="VotingRoundAppSharded")
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter(), [150, 1])
+    voting_round.ledger.fund(voting_round.client.address, 1_000_000)
+    voting_round.close_chunk(100)
+    voting_round.close()
+    boxes = {name: bytes(value) for name, value in voting_round.boxes.items()}
+
+    option_counts = decode_option_offsets(boxes[b"O"])
+    tallies = decode_tallies(join_tally_boxes(boxes), option_counts)
+
+    assert option_counts == [200, 3]
+    assert decode_result_boxes(boxes) == [question.tolist() for question in tallies]
+    assert tallies[0][150] == tallies[1][1] == 1
+
+
+@pytest.mark.parametrize(
+    "vote_type", [NO_SNAPSHOT, NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING]
+)
+def test_load_test_reports_rejections(vote_type: int) -> None:
+    from smart_contracts.benchmark import APPS
+    from smart_contracts.load_test import AvmTarget, run_load_test
+
+    report = run_load_test(
+        AvmTarget(),
+        load_app_spec("VotingRoundApp"),
+        APPS["VotingRoundApp"],
+        [3, 1, 2],
+        vote_type,
+        voter_count=20,
+        concurrency=4,
+        invalid=0.25,
+        seed=1,
+    )
+
+    assert report.submitted == len(report.latencies) == 20
+    assert 0 < report.accepted < 20
+    assert report.rejections == {"Answer option index invalid": 20 - report.accepted}
+
+
+def test_load_test_runs_the_vote_types_of_the_app(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    from smart_contracts.load_test import main
+
+    app = ["--app", "VotingRoundAppNoWeighting"]
+    assert main([*app, "--voters", "4", "--concurrency", "2"]) == 0
+
+    rows = capsys.readouterr().out.splitlines()[1:]
+    assert [row.split()[0] for row in rows] == ["no-weighting"]
+    with pytest.raises(SystemExit):
+        main([*app, "--vote-type", "2"])
+    assert "only supports vote types 1" in capsys.readouterr().err
@@ -0,0 +1,686 @@
+import json
+from collections.abc import Callable
+
+import algosdk.constants
+import beaker.consts
+import pytest
+from algosdk import encoding
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    EmptySigner,
+)
+from conftest import (
+    NO_SNAPSHOT,
+    NO_WEIGHTING,
+    PARTITIONED_WEIGHTING,
+    VOTE_FEE,
+    WEIGHTING,
+    VotingRound,
+)
+
+from smart_contracts import constants
+from smart_contracts.budget import max_questions, vote_budget
+from smart_contracts.helpers.avm import LogicError
+from smart_contracts.helpers.avm_client import suggested_params, to_avm_transaction
+from smart_contracts.vote_batch import (
+    Ballot,
+    VoteBatch,
+    add_vote_batch,
+    max_votes_per_group,
+    pack_answers,
+)
+
+CreateRound = Callable[..., VotingRound]
+
+#: The apps that accept each vote type
+APPS = {
+    NO_SNAPSHOT: [
+        "VotingRoundApp",
+        "VotingRoundAppCompact",
+        "VotingRoundAppNoSnapshot",
+        "VotingRoundAppPackedBallots",
+        "VotingRoundAppSharded",
+    ],
+    NO_WEIGHTING: [
+        "VotingRoundApp",
+        "VotingRoundAppCompact",
+        "VotingRoundAppNoWeighting",
+        "VotingRoundAppPackedBallots",
+        "VotingRoundAppSharded",
+    ],
+    WEIGHTING: [
+        "VotingRoundApp",
+        "VotingRoundAppWeighting",
+        "VotingRoundAppPackedBallots",
+        "VotingRoundAppSharded",
+    ],
+    PARTITIONED_WEIGHTING: [
+        "VotingRoundApp",
+        "VotingRoundAppPartitionedWeighting",
+        "VotingRoundAppPackedBallots",
+        "VotingRoundAppSharded",
+    ],
+}
+APP_VOTE_TYPES = [
+    (app_name, vote_type) for vote_type, names in APPS.items() for app_name in names
+]
+
+
+def test_create(create_round: CreateRound) -> None:
+    voting_round = create_round([3, 1, 4])
+
+    state = voting_round.global_state
+    assert state[b"vote_id"] == b"V1"
+    assert state[b"vote_type"] == NO_WEIGHTING
+    assert state[b"total_options"] == 8
+    assert state[b"option_offsets"] == bytes([0, 3, 4, 8])
+    assert state[b"is_bootstrapped"] == 0
+
+
+@pytest.mark.parametrize("option_counts", [[64, 65], [200, 100], [1] * 100 + [29]])
+def test_create_option_limit(
+    create_round: CreateRound, option_counts: list[int]
+) -> None:
+    with pytest.raises(LogicError, match="Can't have more than 128 vote options"):
+        create_round(option_counts)
+
+
+def test_bootstrap(create_round: CreateRound) -> None:
+    voting_round = create_round([3, 1, 4])
+
+    voting_round.bootstrap()
+
+    assert voting_round.global_state[b"is_bootstrapped"] == 1
+    assert voting_round.opup_app_id
+    assert voting_round.tallies() == [0] * 8
+
+
+def test_double_bootstrap(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+
+    with pytest.raises(LogicError):
+        voting_round.bootstrap()
+
+
+def test_get_preconditions(create_round: CreateRound) -> None:
+    voting_round = create_round([2])
+    voting_round.bootstrap()
+    voter = voting_round.get_voter()
+
+    before = voting_round.get_preconditions(voter)
+    voting_round.vote(voter)
+    after = voting_round.get_preconditions(voter)
+
+    assert before == (1, 1, 0, voting_round.ledger.timestamp)
+    assert after == (1, 1, 1, voting_round.ledger.timestamp)
+
+
+@pytest.mark.parametrize(("app_name", "vote_type"), APP_VOTE_TYPES)
+def test_vote(create_round: CreateRound, app_name: str, vote_type: int) -> None:
+    voting_round = create_round([3, 3, 3], vote_type, app_name=app_name)
+    voting_round.bootstrap()
+    voter = voting_round.get_voter(weighting=20)
+
+    voting_round.vote(voter, [0, 1, 2])
+
+    # partitioned votes put a weight of 1 on each question and the rest on the last
+    weights = {
+        NO_SNAPSHOT: [1, 1, 1],
+        NO_WEIGHTING: [1, 1, 1],
+        WEIGHTING: [20, 20, 20],
+        PARTITIONED_WEIGHTING: [1, 1, 18],
+    }[vote_type]
+    assert voting_round.tallies() == [
+        weights[0],
+        0,
+        0,
+        0,
+        weights[1],
+        0,
+        0,
+        0,
+        weights[2],
+    ]
+    assert voting_round.boxes[voter.address] == (
+        pack_answers([0, 1, 2], [3, 3, 3])
+        if voting_round.packed_ballots
+        else bytes([0, 3, 0, 1, 2])
+    )
+    assert voting_round.global_state[b"voter_count"] == 1
+
+
+@pytest.mark.parametrize("vote_type", [WEIGHTING, PARTITIONED_WEIGHTING])
+def test_compact_rejects_weighted_rounds(
+    create_round: CreateRound, vote_type: int
+) -> None:
+    with pytest.raises(LogicError, match="Vote type should be <= 1"):
+        create_round([1], vote_type, app_name="VotingRoundAppCompact")
+
+
+@pytest.mark.parametrize(
+    ("app_name", "vote_type"),
+    [
+        ("VotingRoundAppNoSnapshot", NO_WEIGHTING),
+        ("VotingRoundAppNoWeighting", WEIGHTING),
+        ("VotingRoundAppWeighting", PARTITIONED_WEIGHTING),
+        ("VotingRoundAppPartitionedWeighting", NO_SNAPSHOT),
+    ],
+)
+def test_variant_rejects_other_vote_types(
+    create_round: CreateRound, app_name: str, vote_type: int
+) -> None:
+    with pytest.raises(LogicError, match=r"Vote type should be \d\)"):
+        create_round([1], vote_type, app_name=app_name)
+
+
+def max_ballot(app_name: str, vote_type: int) -> list[int]:
+    """The option counts of the costliest ballot an app allows for a vote type:
+    the most questions, with as many of them taking bits in a packed ballot as
+    the 128 options allow, or spread over the sharded app's 640 options"""
+    if app_name == "VotingRoundAppSharded":
+        questions = max_questions(vote_type, sharded_tallies=True)
+        return [640 // questions + (i < 640 % questions) for i in range(questions)]
+    questions = max_questions(
+        vote_type, packed_ballots=app_name == "VotingRoundAppPackedBallots"
+    )
+    two_option_questions = min(128 - questions, questions)
+    return [2] * two_option_questions + [1] * (questions - two_option_questions)
+
+
+@pytest.mark.parametrize(("app_name", "vote_type"), APP_VOTE_TYPES)
+def test_vote_max_budget(
+    create_round: CreateRound, app_name: str, vote_type: int
+) -> None:
+    # the vote fee pays for 16 OpUp calls, which must cover the largest ballot
+    voting_round = create_round(
+        max_ballot(app_name, vote_type), vote_type, app_name=app_name
+    )
+    voting_round.bootstrap()
+
+    voting_round.vote(voting_round.get_voter(weighting=200))
+
+    assert voting_round.global_state[b"voter_count"] == 1
+
+
+@pytest.mark.parametrize(
+    "vote_type", [NO_SNAPSHOT, NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING]
+)
+@pytest.mark.parametrize(
+    "app_name", ["VotingRoundAppPackedBallots", "VotingRoundAppSharded"]
+)
+def test_question_limit(
+    create_round: CreateRound, app_name: str, vote_type: int
+) -> None:
+    # the app's limits have to match the budget model's
+    questions = max_questions(
+        vote_type,
+        packed_ballots=app_name == "VotingRoundAppPackedBallots",
+        sharded_tallies=app_name == "VotingRoundAppSharded",
+    )
+    create_round([1] * questions, vote_type, app_name=app_name)
+
+    with pytest.raises(LogicError, match="Too many questions"):
+        create_round([1] * (questions + 1), vote_type, app_name=app_name)
+
+
+@pytest.mark.parametrize(
+    ("option_counts", "answer_ids", "expected"),
+    [
+        ([1], [0], b"\x00"),
+        ([2, 1, 4], [1, 0, 3], bytes([0b111])),
+        ([3] * 5, [2, 1, 0, 1, 2], (0b1001000110).to_bytes(2, "big")),
+        ([16] + [1] * 20, [15] + [0] * 20, b"\x0f"),
+    ],
+)
+def test_vote_packed_ballot(
+    create_round: CreateRound,
+    option_counts: list[int],
+    answer_ids: list[int],
+    expected: bytes,
+) -> None:
+    voting_round = create_round(
+        option_counts, NO_SNAPSHOT, app_name="VotingRoundAppPackedBallots"
+    )
+    voting_round.bootstrap()
+    voter = voting_round.get_voter()
+
+    # the payment has to cover the packed ballot's box rather than the ABI one
+    with pytest.raises(LogicError, match="exact min balance requirement"):
+        voting_round.vote(
+            voter, answer_ids, payment=2_500 + 400 * (32 + 2 + len(answer_ids))
+        )
+    voting_round.vote(voter, answer_ids)
+
+    assert voting_round.boxes[voter.address] == expected
+    assert pack_answers(answer_ids, option_counts) == expected
+
+
+@pytest.mark.parametrize(
+    ("option_counts", "answer_ids", "expected"),
+    [
+        ([4], [0], [1, 0, 0, 0]),
+        ([4], [3], [0, 0, 0, 1]),
+        ([4, 4], [0, 0], [1, 0, 0, 0, 1, 0, 0, 0]),
+        ([4, 4], [3, 3], [0, 0, 0, 1, 0, 0, 0, 1]),
+    ],
+)
+def test_vote_option_bounds(
+    create_round: CreateRound,
+    option_counts: list[int],
+    answer_ids: list[int],
+    expected: list[int],
+) -> None:
+    voting_round = create_round(option_counts)
+    voting_round.bootstrap()
+
+    voting_round.vote(voting_round.get_voter(), answer_ids)
+
+    assert voting_round.tallies() == expected
+
+
+@pytest.mark.parametrize(
+    "vote_type", [NO_SNAPSHOT, NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING]
+)
+@pytest.mark.parametrize("option_counts", [[3, 1, 2], [2] * 20], ids=["3q", "20q"])
+@pytest.mark.parametrize(
+    "app_name",
+    ["VotingRoundApp", "VotingRoundAppPackedBallots", "VotingRoundAppSharded"],
+)
+def test_vote_batch(
+    create_round: CreateRound, vote_type: int, option_counts: list[int], app_name: str
+) -> None:
+    voting_round = create_round(option_counts, vote_type, app_name=app_name)
+    voting_round.bootstrap()
+    questions = len(option_counts)
+    packed_option_counts = option_counts if voting_round.packed_ballots else None
+    sharded_option_counts = option_counts if voting_round.sharded_tallies else None
+    count = max_votes_per_group(
+        vote_budget(
+            vote_type,
+            questions,
+            packed_option_counts=packed_option_counts,
+            sharded_tallies=voting_round.sharded_tallies,
+        )
+    )
+    voters = [voting_round.get_voter(weighting=questions) for _ in range(count)]
+    batch = VoteBatch(
+        voting_round.client.app_id,
+        voting_round.opup_app_id,
+        voting_round.client.contract,
+        vote_type,
+        encoding.encode_address(voting_round.creator),
+        EmptySigner(),
+        suggested_params(voting_round.ledger),
+        packed_option_counts=packed_option_counts,
+        sharded_option_counts=sharded_option_counts,
+    )
+    atc = AtomicTransactionComposer()
+    fee = add_vote_batch(
+        atc,
+        batch,
+        [
+            Ballot(
+                encoding.encode_address(voter.address),
+                EmptySigner(),
+                [0] * questions,
+                voter.signature,
+                voter.weighting,
+                [1] * questions if vote_type == PARTITIONED_WEIGHTING else [],
+            )
+            for voter in voters
+        ],
+    )
+
+    result = voting_round.ledger.execute(
+        [to_avm_transaction(txn.txn) for txn in atc.build_group()]
+    )
+
+    assert count > 1
+    assert all(txn.inner_transaction_count == 0 for txn in result.transactions)
+    assert result.total_fee == fee
+    assert voting_round.global_state[b"voter_count"] == count
+    # weighted votes have the weighting on every question, partitioned ones 1
+    weight = questions if vote_type == WEIGHTING else 1
+    assert voting_round.tallies()[0] == count * weight
+
+
+@pytest.mark.parametrize("vote_type", [NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING])
+def test_vote_with_invalid_signature(create_round: CreateRound, vote_type: int) -> None:
+    voting_round = create_round([1], vote_type)
+    voting_round.bootstrap()
+    voter = voting_round.get_voter(weighting=20)
+    other = voting_round.get_voter(weighting=20)
+    voter.signature = other.signature
+
+    with pytest.raises(LogicError, match="Not allowed to vote"):
+        voting_round.vote(voter, [0])
+
+
+def test_vote_with_other_weighting(create_round: CreateRound) -> None:
+    voting_round = create_round([1], WEIGHTING)
+    voting_round.bootstrap()
+    voter = voting_round.get_voter(weighting=20)
+    voter.weighting = 21
+
+    with pytest.raises(LogicError, match="Not allowed to vote"):
+        voting_round.vote(voter, [0])
+
+
+@pytest.mark.parametrize(
+    "answer_weights", [[20, 20, 20], [18, 1, 2], [10, 10], [2**64 - 1, 2, 19]]
+)
+def test_vote_with_invalid_partition(
+    create_round: CreateRound, answer_weights: list[int]
+) -> None:
+    voting_round = create_round([3, 3, 3], PARTITIONED_WEIGHTING)
+    voting_round.bootstrap()
+    voter = voting_round.get_voter(weighting=20)
+
+    with pytest.raises(LogicError):
+        voting_round.vote(voter, [0, 1, 2], answer_weights)
+
+
+def test_double_vote(create_round: CreateRound) -> None:
+    voting_round = create_round([2])
+    voting_round.bootstrap()
+    voter = voting_round.get_voter()
+    voting_round.vote(voter, [0])
+
+    with pytest.raises(LogicError, match="Already voted"):
+        voting_round.vote(voter, [1])
+
+
+def test_vote_before_bootstrap(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+
+    with pytest.raises(LogicError):
+        voting_round.vote(voting_round.get_voter(), [0])
+
+
+def test_vote_before_start(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+    voting_round.ledger.timestamp -= 1
+
+    with pytest.raises(LogicError, match="Voting not open"):
+        voting_round.vote(voting_round.get_voter(), [0])
+
+
+def test_vote_after_end(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+    voting_round.ledger.timestamp += 1000
+
+    with pytest.raises(LogicError, match="Voting not open"):
+        voting_round.vote(voting_round.get_voter(), [0])
+
+
+@pytest.mark.parametrize(
+    ("answer_ids", "message"),
+    [([1], "Answer option index invalid"), ([0, 0], "Number of answers incorrect")],
+)
+def test_vote_with_invalid_answers(
+    create_round: CreateRound, answer_ids: list[int], message: str
+) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+
+    with pytest.raises(LogicError, match=message):
+        voting_round.vote(
+            voting_round.get_voter(), answer_ids, payment=2_500 + 400 * 35
+        )
+
+
+def test_vote_with_wrong_payment(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+
+    with pytest.raises(LogicError, match="exact min balance requirement"):
+        voting_round.vote(voting_round.get_voter(), [0], payment=2_500 + 400 * 36)
+
+
+@pytest.mark.parametrize("app_name", ["VotingRoundApp", "VotingRoundAppCompact"])
+def test_close(create_round: CreateRound, app_name: str) -> None:
+    voting_round = create_round([3, 1, 1, 1, 3], app_name=app_name)
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    voting_round.vote(voting_round.get_voter())
+
+    result = voting_round.close()
+
+    state = voting_round.global_state
+    assert state[b"close_time"] == voting_round.ledger.timestamp
+    assert state[b"nft_asset_id"] == result[1].inner_transactions[-1].created_asset_id
+    assert voting_round.result_note(result) == {
+        "standard": "arc69",
+        "description": "This is a voting result NFT for voting round with ID V1.",
+        "properties": {
+            "metadata": "ipfs://CID",
+            "id": "V1",
+            "quorum": 10,
+            "voterCount": 2,
+            "tallies": [[0, 0, 2], [2], [2], [2], [0, 0, 2]],
+        },
+    }
+
+
+def test_double_close(create_round: CreateRound) -> None:
+    voting_round = create_round([1])
+    voting_round.bootstrap()
+    voting_round.close()
+
+    with pytest.raises(LogicError, match="Already closed"):
+        voting_round.close()
+
+
+def test_close_in_chunks(create_round: CreateRound) -> None:
+    voting_round = create_round([3, 1, 1, 1, 3])
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    # the result box needs funding for its min balance while closing
+    voting_round.ledger.fund(voting_round.client.address, 2_500 + 400 * (1 + 100))
+
+    first, _, _ = voting_round.close_chunk(4)
+    with pytest.raises(LogicError, match="Voting not open"):
+        voting_round.vote(voting_round.get_voter())
+    second, _, _ = voting_round.close_chunk(4)
+    result = voting_round.close()
+
+    assert (first, second) == (5, 1)
+    assert voting_round.result_note(result)["properties"]["tallies"] == [
+        [0, 0, 1],
+        [1],
+        [1],
+        [1],
+        [0, 0, 1],
+    ]
+    assert b"R" not in voting_round.boxes
+
+
+def test_close_chunk_of_nothing(create_round: CreateRound) -> None:
+    voting_round = create_round([3, 1])
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    voting_round.ledger.fund(voting_round.client.address, 2_500 + 400 * (1 + 100))
+
+    first, _, _ = voting_round.close_chunk(0)
+    second, _, _ = voting_round.close_chunk(2)
+    result = voting_round.close()
+
+    assert (first, second) == (4, 2)
+    assert voting_round.result_note(result)["properties"]["tallies"] == [[0, 0, 1], [1]]
+    assert b"R" not in voting_round.boxes
+
+
+def test_close_renders_large_tallies(create_round: CreateRound) -> None:
+    voting_round = create_round([3, 2], WEIGHTING)
+    voting_round.bootstrap()
+    for weighting, answer_ids in [(7, [0, 0]), (12345, [1, 0]), (2**64 - 8, [0, 1])]:
+        voting_round.vote(voting_round.get_voter(weighting=weighting), answer_ids)
+
+    result = voting_round.close()
+
+    # tallies of 1, 5 and 20 digits, which is as long as a uint64 gets
+    assert voting_round.result_note(result)["properties"]["tallies"] == [
+        [2**64 - 1, 12345, 0],
+        [7 + 12345, 2**64 - 8],
+    ]
+
+
+def test_sharded_vote_cost_is_flat(create_round: CreateRound) -> None:
+    costs = []
+    for option_counts in ([2, 2, 2], [255, 255, 130]):
+        voting_round = create_round(
+            option_counts, WEIGHTING, app_name="VotingRoundAppSharded"
+        )
+        voting_round.bootstrap()
+        _, result, _ = voting_round.vote(voting_round.get_voter(weighting=5))
+        costs.append(result.opcode_cost)
+
+    # 640 options take 5 shards of 128 tallies, the answers are in 3 of them
+    assert costs[0] == costs[1]
+    assert [len(voting_round.boxes[b"V" + bytes([i])]) for i in range(5)] == [1024] * 5
+    tallies = voting_round.tallies()
+    assert [i for i, tally in enumerate(tallies) if tally] == [254, 509, 639]
+
+
+def test_sharded_vote_references(create_round: CreateRound) -> None:
+    voting_round = create_round([128] * 5, app_name="VotingRoundAppSharded")
+    voting_round.bootstrap()
+    voter = voting_round.get_voter()
+
+    # a vote counted in every shard references them, the offsets box, the voter's
+    # box and the OpUp app, which are all 8 references a transaction can have
+    voting_round.vote(voter)
+    with pytest.raises(LogicError, match="too many references"):
+        voting_round.client.call(
+            voter.address,
+            "get_preconditions",
+            voter.signature,
+            voter.weighting,
+            voting_round.opup_app_id,
+            boxes=[(0, b"V" + bytes([shard])) for shard in range(8)],
+            fee=VOTE_FEE,
+        )
+
+    assert voting_round.tallies()[127::128] == [1] * 5
+
+
+def test_sharded_limits(create_round: CreateRound) -> None:
+    voting_round = create_round([255, 255, 131], app_name="VotingRoundAppSharded")
+    with pytest.raises(LogicError, match="Can't have more than 640 vote options"):
+        voting_round.bootstrap()
+    voting_round = create_round([3, 3], app_name="VotingRoundAppSharded")
+    voting_round.option_counts = [3, 2]
+    with pytest.raises(LogicError, match="should be the ones the round was created"):
+        voting_round.bootstrap()
+
+    voting_round = create_round(
+        [5] * 128, NO_SNAPSHOT, app_name="VotingRoundAppSharded"
+    )
+    voting_round.bootstrap()
+    assert voting_round.global_state[b"total_options"] == 640
+
+
+def test_close_sharded(create_round: CreateRound) -> None:
+    voting_round = create_round([200, 200, 3], app_name="VotingRoundAppSharded")
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    voting_round.vote(voting_round.get_voter(), [0, 1, 2])
+    # the result boxes are kept as the results, so need funding
+    voting_round.ledger.fund(voting_round.client.address, 1_000_000)
+
+    remaining, _, _ = voting_round.close_chunk(150)
+    result = voting_round.close()
+
+    properties = voting_round.result_note(result)["properties"]
+    assert remaining == 253
+    assert "tallies" not in properties
+    assert properties["talliesBoxes"] == {
+        "appId": voting_round.client.app_id,
+        "count": 2,
+    }
+    result_boxes = [bytes(voting_round.boxes[b"R" + bytes([0, i])]) for i in range(2)]
+    tallies = json.loads(b"[" + b"".join(result_boxes) + b"]")
+    assert tallies == [
+        [1] + [0] * 198 + [1],
+        [0, 1] + [0] * 197 + [1],
+        [0, 0, 2],
+    ]
+
+
+def test_close_sharded_in_chunks(create_round: CreateRound) -> None:
+    voting_round = create_round([200, 200, 200], app_name="VotingRoundAppSharded")
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    voting_round.vote(voting_round.get_voter(), [0, 1, 2])
+    with pytest.raises(LogicError, match="should be funded for the result box"):
+        voting_round.close_chunk(100)
+    voting_round.ledger.fund(voting_round.client.address, 1_000_000)
+
+    remaining = [voting_round.close_chunk(100)[0] for _ in range(6)]
+    result = voting_round.close()
+
+    assert remaining == [500, 400, 300, 200, 100, 0]
+    properties = voting_round.result_note(result)["properties"]
+    assert properties["talliesBoxes"]["count"] == 6
+    result_boxes = [bytes(voting_round.boxes[b"R" + bytes([0, i])]) for i in range(6)]
+    tallies = json.loads(b"[" + b"".join(result_boxes) + b"]")
+    assert tallies == [
+        [1] + [0] * 198 + [1],
+        [0, 1] + [0] * 197 + [1],
+        [0, 0, 1] + [0] * 196 + [1],
+    ]
+
+
+def test_close_chunk_box_io_budget(create_round: CreateRound) -> None:
+    voting_round = create_round([200, 56], WEIGHTING, app_name="VotingRoundAppSharded")
+    voting_round.bootstrap()
+    # tallies of 20 digits, so each renders to 21 bytes of a result box
+    for shard in (b"V\x00", b"V\x01"):
+        voting_round.boxes[shard][:] = b"\xff" * len(voting_round.boxes[shard])
+    voting_round.ledger.fund(voting_round.client.address, 10_000_000)
+
+    # a shard, 2KB of results and the offsets box are more than the 3KB its 3 box
+    # references allow, whatever the fee pays for
+    fee = 1_000 + 100 * 1_000
+    with pytest.raises(LogicError, match="box I/O budget exceeded"):
+        voting_round.close_chunk(100, fee)
+    remaining, _, _ = voting_round.close_chunk(40, fee)
+
+    assert remaining == 216
+
+
+@pytest.mark.parametrize(
+    "option_counts", [[16] + [1] * 111, [2] * 64, [128]], ids=["112q", "64q", "1q"]
+)
+def test_close_max_budget(create_round: CreateRound, option_counts: list[int]) -> None:
+    voting_round = create_round(option_counts)
+    voting_round.bootstrap()
+    voting_round.vote(voting_round.get_voter())
+    voting_round.vote(voting_round.get_voter())
+
+    result = voting_round.close()
+
+    tallies = voting_round.result_note(result)["properties"]["tallies"]
+    assert [len(question) for question in tallies] == option_counts
+
+
+def test_constants_match_contract() -> None:
+    assert [
+        constants.TYPE_NO_SNAPSHOT,
+        constants.TYPE_NO_WEIGHTING,
+        constants.TYPE_WEIGHTING,
+        constants.TYPE_PARTITIONED_WEIGHTING,
+    ] == [NO_SNAPSHOT, NO_WEIGHTING, WEIGHTING, PARTITIONED_WEIGHTING]
+    assert constants.MIN_TXN_FEE == algosdk.constants.MIN_TXN_FEE
+    assert (
+        constants.BOX_FLAT_MIN_BALANCE,
+        constants.BOX_BYTE_MIN_BALANCE,
+        constants.ASSET_MIN_BALANCE,
+    ) == (
+        beaker.consts.BOX_FLAT_MIN_BALANCE,
+        beaker.consts.BOX_BYTE_MIN_BALANCE,
+        beaker.consts.ASSET_MIN_BALANCE,
+    )